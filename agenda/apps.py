@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.conf import settings
+
+from webapp_pochita.procesos import es_proceso_servidor
 
 
 class AgendaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'agenda'
+
+    def ready(self):
+        # Registra las señales que mantienen la proyeccion de franjas libres.
+        from . import signals  # noqa: F401
+
+        intervalo = getattr(settings, "AGENDA_EXPIRACION_INTERVALO", 0)
+        if intervalo and es_proceso_servidor():
+            from .expiracion import iniciar_expiracion_periodica
+
+            iniciar_expiracion_periodica(intervalo)
@@ -0,0 +1,78 @@
+"""
+Carga de la disponibilidad libre de varios veterinarios en una sola pasada.
+
+Lee la proyeccion FranjaLibre de un rango de fechas con una consulta por
+rango indexado y arma, por (veterinario, fecha), los slots libres de cada
+bloque usando DiaSlots.
+"""
+
+from datetime import timedelta
+
+from veterinarios.models import DisponibilidadVeterinario
+
+from .models import FranjaLibre
+from .slots import DiaSlots, a_minutos
+
+
+def cargar_libres(desde, hasta, veterinario_ids=None, excluir_veterinario_ids=None):
+    """
+    Slots libres por bloque entre ``desde`` y ``hasta`` (ambos inclusive).
+
+    Devuelve ``{(veterinario_id, fecha): [(bloque_id, DiaSlots), ...]}`` con
+    los bloques en orden de hora de inicio. Los dias bloqueados no aparecen.
+    """
+    franjas = FranjaLibre.objects.filter(
+        fecha__range=(desde, hasta), estado=DisponibilidadVeterinario.Estado.DISPONIBLE
+    )
+    if veterinario_ids is not None:
+        franjas = franjas.filter(veterinario_id__in=veterinario_ids)
+    if excluir_veterinario_ids:
+        franjas = franjas.exclude(veterinario_id__in=excluir_veterinario_ids)
+
+    libres = {}
+    vacio = DiaSlots()
+    for bloque_id, vet_id, fecha, inicio, fin in franjas.order_by(
+        "fecha", "hora_inicio"
+    ).values_list("bloque_id", "veterinario_id", "fecha", "hora_inicio", "hora_fin"):
+        bloques = libres.setdefault((vet_id, fecha), {})
+        bloques[bloque_id] = bloques.get(bloque_id, vacio) | DiaSlots.desde_rango(
+            a_minutos(inicio), a_minutos(fin)
+        )
+    return {key: list(bloques.items()) for key, bloques in libres.items()}
+
+
+def primeros_huecos(duracion_min, desde, hasta, limite, ahora=None):
+    """
+    Los ``limite`` inicios mas tempranos donde cabe una atencion de
+    ``duracion_min`` minutos, considerando a todos los veterinarios.
+
+    Devuelve tuplas ``(fecha, minuto_inicio, veterinario_id)`` ordenadas. Si se
+    entrega ``ahora`` (datetime local) se descartan los inicios ya pasados. El
+    rango se recorre en ventanas que duplican su largo, asi la busqueda corta
+    apenas se completa el limite sin cargar todo el horizonte.
+    """
+    resultados = []
+    inicio_ventana = desde
+    ventana_dias = 1
+    while inicio_ventana <= hasta and len(resultados) < limite:
+        fin_ventana = min(inicio_ventana + timedelta(days=ventana_dias - 1), hasta)
+        por_fecha = {}
+        for (vet_id, fecha), bloques in cargar_libres(inicio_ventana, fin_ventana).items():
+            por_fecha.setdefault(fecha, []).append((vet_id, bloques))
+        for fecha in sorted(por_fecha):
+            minimo = 0
+            if ahora is not None and fecha == ahora.date():
+                minimo = a_minutos(ahora) + 1
+            del_dia = []
+            for vet_id, bloques in por_fecha[fecha]:
+                for _bloque_id, slots in bloques:
+                    for minuto in slots.inicios_posibles(duracion_min).minutos_inicio():
+                        if minuto >= minimo:
+                            del_dia.append((fecha, minuto, vet_id))
+            del_dia.sort()
+            resultados.extend(del_dia[: limite - len(resultados)])
+            if len(resultados) >= limite:
+                break
+        inicio_ventana = fin_ventana + timedelta(days=1)
+        ventana_dias *= 2
+    return resultados
@@ -0,0 +1,182 @@
+"""
+Avisos en vivo de cambios de agenda para las pantallas abiertas.
+
+Cada cambio de citas, bloques o dias bloqueados se resume en un evento por
+(veterinario, fecha) que se entrega a dos canales: el del veterinario y el
+de recepcion. Las pantallas escuchan por Server-Sent Events y, al recibir
+un aviso, piden solo lo que cambio (``?since=<token>`` o la ventana del
+dia), en vez de recargar todo cada cierto tiempo.
+
+El Broker reparte los eventos entre las conexiones del proceso. Para
+llegar a todas las conexiones hay dos modos, segun
+``AGENDA_EVENTOS_MODO``:
+
+* ``"local"``: las escrituras publican directo en el broker al confirmar
+  su transaccion. Sirve con un solo proceso servidor.
+* ``"sondeo"``: cada proceso revisa la base cada
+  ``AGENDA_EVENTOS_INTERVALO`` segundos con el mismo registro de cambios
+  que usa la sincronizacion por token, y publica lo nuevo en su broker.
+  Reemplaza a un pub/sub externo cuando hay varios workers.
+"""
+
+import asyncio
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .sincronizacion import MARGEN_TOKEN, cambios_desde, emitir_token
+
+logger = logging.getLogger(__name__)
+
+CANAL_RECEPCION = "recepcion"
+MAX_EVENTOS_PENDIENTES = 100
+MODO_LOCAL = "local"
+MODO_SONDEO = "sondeo"
+EVENTO_REINICIO = {"tipo": "reinicio"}
+
+
+def canal_veterinario(veterinario_id):
+    return f"veterinario:{veterinario_id}"
+
+
+def _modo():
+    return getattr(settings, "AGENDA_EVENTOS_MODO", MODO_LOCAL)
+
+
+def _intervalo():
+    return getattr(settings, "AGENDA_EVENTOS_INTERVALO", 2)
+
+
+class Suscripcion:
+    """Cola de eventos de una conexion, atada al event loop que la creo."""
+
+    def __init__(self, canales):
+        self.canales = tuple(canales)
+        self.loop = asyncio.get_running_loop()
+        self.cola = asyncio.Queue(maxsize=MAX_EVENTOS_PENDIENTES)
+
+    def _entregar(self, evento):
+        try:
+            self.cola.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Cliente lento: se descarta lo pendiente y se le pide recargar.
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            self.cola.put_nowait(EVENTO_REINICIO)
+
+    def entregar(self, evento):
+        """Encola ``evento`` desde cualquier hilo."""
+        self.loop.call_soon_threadsafe(self._entregar, evento)
+
+    async def siguiente(self, espera):
+        """Proximo evento, o None si pasan ``espera`` segundos sin eventos."""
+        try:
+            return await asyncio.wait_for(self.cola.get(), espera)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Broker:
+    """Reparte eventos entre las suscripciones del proceso, por canal."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._canales = {}
+        self._sondeo = None
+
+    def suscribir(self, canales):
+        """Crea una suscripcion; se llama desde el event loop de la conexion."""
+        suscripcion = Suscripcion(canales)
+        with self._lock:
+            for canal in suscripcion.canales:
+                self._canales.setdefault(canal, set()).add(suscripcion)
+        if _modo() == MODO_SONDEO:
+            self._iniciar_sondeo()
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            for canal in suscripcion.canales:
+                suscritas = self._canales.get(canal)
+                if suscritas is not None:
+                    suscritas.discard(suscripcion)
+                    if not suscritas:
+                        del self._canales[canal]
+
+    def hay_suscripciones(self):
+        with self._lock:
+            return bool(self._canales)
+
+    def publicar(self, canales, evento):
+        """Entrega ``evento`` una vez a cada suscripcion de ``canales``."""
+        with self._lock:
+            destinos = set()
+            for canal in canales:
+                destinos |= self._canales.get(canal, set())
+        for suscripcion in destinos:
+            try:
+                suscripcion.entregar(evento)
+            except RuntimeError:
+                # El loop de esa conexion ya cerro.
+                self.cancelar(suscripcion)
+
+    def publicar_pares(self, pares, token=None):
+        token = token or emitir_token()
+        for veterinario_id, fecha in pares:
+            self.publicar(
+                [canal_veterinario(veterinario_id), CANAL_RECEPCION],
+                {
+                    "tipo": "agenda",
+                    "veterinario_id": veterinario_id,
+                    "fecha": fecha.isoformat(),
+                    "token": token,
+                },
+            )
+
+    def _iniciar_sondeo(self):
+        with self._lock:
+            if self._sondeo is not None and not self._sondeo.done():
+                return
+            self._sondeo = asyncio.get_running_loop().create_task(self._sondear())
+
+    async def _sondear(self):
+        """
+        Publica los cambios que escriben otros procesos mientras haya
+        conexiones en este. Cada vuelta relee el margen del token para no
+        perder transacciones lentas; ``vistos`` evita avisar dos veces el
+        mismo cambio.
+        """
+        instante = timezone.now() - MARGEN_TOKEN
+        vistos = set()
+        while self.hay_suscripciones():
+            await asyncio.sleep(_intervalo())
+            siguiente = timezone.now() - MARGEN_TOKEN
+            try:
+                cambios = await sync_to_async(cambios_desde)(instante)
+            except Exception:
+                logger.exception("Fallo el sondeo de eventos de agenda.")
+                continue
+            nuevos = {par for clave, par in cambios if clave not in vistos}
+            vistos = {clave for clave, _par in cambios}
+            instante = siguiente
+            if nuevos:
+                self.publicar_pares(nuevos)
+
+
+broker = Broker()
+
+
+def notificar_cambios(pares):
+    """
+    Avisa que cambio la agenda de los (veterinario, fecha) indicados, cuando
+    la transaccion en curso se confirme. En modo sondeo no hace nada: los
+    procesos leen los cambios desde la base.
+    """
+    pares = set(pares)
+    if not pares or _modo() != MODO_LOCAL:
+        return
+    transaction.on_commit(lambda: broker.publicar_pares(pares))
@@ -0,0 +1,105 @@
+"""
+Expiracion de citas vencidas.
+
+Las citas pendientes o confirmadas de dias pasados se marcan como canceladas
+con motivo "No atendida (expiró)". El proceso avanza por lotes cortos, cada
+uno en su propia transaccion, y guarda en MarcaExpiracion hasta que fecha ya
+reviso para que la siguiente ejecucion solo toque citas recien vencidas.
+"""
+
+import logging
+import threading
+import time
+
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .eventos import notificar_cambios
+from .franjas import recalcular_franjas
+from .models import Cita, MarcaExpiracion, ReservaSlot
+from .sincronizacion import purgar_eliminaciones
+
+logger = logging.getLogger(__name__)
+
+MOTIVO_EXPIRACION = "No atendida (expiró)"
+TAMANO_LOTE = 500
+
+
+def expirar_citas_vencidas(tamano_lote=TAMANO_LOTE, completo=False):
+    """
+    Expira las citas vencidas y devuelve cuantas proceso. Con ``completo``
+    ignora la marca y revisa todo el historial.
+    """
+    hoy = timezone.localdate()
+    marca, _ = MarcaExpiracion.objects.get_or_create(pk=1)
+    vencidas = Cita.objects.filter(
+        fecha__lt=hoy, estado__in=[Cita.Estado.PENDIENTE, Cita.Estado.CONFIRMADA]
+    )
+    if marca.procesado_hasta and not completo:
+        vencidas = vencidas.filter(fecha__gte=marca.procesado_hasta)
+
+    total = 0
+    while True:
+        with transaction.atomic():
+            lote = list(
+                vencidas.order_by("fecha", "id").values_list("id", "veterinario_id", "fecha")[
+                    :tamano_lote
+                ]
+            )
+            if not lote:
+                break
+            ids = [cita_id for cita_id, _, _ in lote]
+            Cita.objects.filter(id__in=ids).update(
+                estado=Cita.Estado.CANCELADA,
+                motivo_cancelacion=MOTIVO_EXPIRACION,
+                cancelado_por="sistema",
+                actualizado_en=timezone.now(),
+            )
+            # update() no dispara señales: se liberan reservas y se recalculan
+            # a mano los dias afectados
+            ReservaSlot.objects.filter(cita_id__in=ids).delete()
+            pares = {(vet_id, fecha) for _, vet_id, fecha in lote}
+            recalcular_franjas(pares)
+            notificar_cambios(pares)
+        total += len(lote)
+
+    marca.procesado_hasta = hoy
+    marca.citas_expiradas += total
+    marca.save(update_fields=["procesado_hasta", "citas_expiradas", "actualizado_en"])
+    return total
+
+
+def _ciclo_expiracion(intervalo):
+    while True:
+        time.sleep(intervalo)
+        close_old_connections()
+        try:
+            total = expirar_citas_vencidas()
+            purgar_eliminaciones()
+        except Exception:
+            logger.exception("Fallo la expiracion periodica de citas.")
+        else:
+            if total:
+                logger.info("Citas expiradas: %s", total)
+        finally:
+            close_old_connections()
+
+
+_hilo = None
+_hilo_lock = threading.Lock()
+
+
+def iniciar_expiracion_periodica(intervalo):
+    """
+    Lanza, una sola vez por proceso, un hilo que expira citas cada
+    ``intervalo`` segundos.
+    """
+    global _hilo
+    with _hilo_lock:
+        if _hilo is not None:
+            return _hilo
+        _hilo = threading.Thread(
+            target=_ciclo_expiracion, args=(intervalo,), name="expiracion-citas", daemon=True
+        )
+        _hilo.start()
+        return _hilo
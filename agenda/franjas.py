@@ -0,0 +1,120 @@
+"""
+Mantenimiento de la proyeccion FranjaLibre.
+
+La proyeccion se recalcula completa por cada (veterinario, fecha) afectado:
+un dia tiene pocos bloques y citas, asi que rehacerlo es barato y evita
+acumular errores de un calculo por diferencias.
+"""
+
+import math
+
+from django.db import transaction
+from django.db.models import Q
+
+from usuarios.models import Veterinario
+from veterinarios.models import DiaBloqueadoVeterinario, DisponibilidadVeterinario
+
+from .models import Cita, FranjaLibre
+from .slots import SLOT_MINUTES, DiaSlots, a_hora, a_minutos
+
+
+def fin_cita_min(hora, hora_fin, duracion_min):
+    if hora_fin:
+        return a_minutos(hora_fin)
+    return a_minutos(hora) + math.ceil((duracion_min or SLOT_MINUTES) / SLOT_MINUTES) * SLOT_MINUTES
+
+
+def construir_filas(bloques, citas, bloqueados):
+    """
+    Filas de la proyeccion a partir de tuplas ya leidas de la base:
+
+    - bloques: (id, veterinario_id, fecha, hora_inicio, hora_fin, estado),
+      ordenados por fecha y hora de inicio.
+    - citas activas: (veterinario_id, fecha, hora, hora_fin, duracion_min).
+    - dias bloqueados: (veterinario_id, fecha).
+
+    Devuelve diccionarios con los campos de FranjaLibre.
+    """
+    dias_bloqueados = set(bloqueados)
+    ocupados = {}
+    for vet_id, fecha, hora, hora_fin, duracion in citas:
+        ocupados.setdefault((vet_id, fecha), []).append(
+            (a_minutos(hora), fin_cita_min(hora, hora_fin, duracion))
+        )
+    ocupados = {key: DiaSlots.ocupados_por(intervalos) for key, intervalos in ocupados.items()}
+
+    filas = []
+    vacio = DiaSlots()
+    for bloque_id, vet_id, fecha, inicio, fin, estado in bloques:
+        key = (vet_id, fecha)
+        if key in dias_bloqueados:
+            continue
+        base = {"bloque_id": bloque_id, "veterinario_id": vet_id, "fecha": fecha, "estado": estado}
+        if estado != DisponibilidadVeterinario.Estado.DISPONIBLE:
+            filas.append({**base, "orden": 0, "hora_inicio": inicio, "hora_fin": fin})
+            continue
+        libres = DiaSlots.desde_rango(a_minutos(inicio), a_minutos(fin)) - ocupados.get(key, vacio)
+        for orden, (ini_min, fin_min) in enumerate(libres.intervalos()):
+            filas.append(
+                {**base, "orden": orden, "hora_inicio": a_hora(ini_min), "hora_fin": a_hora(fin_min)}
+            )
+    return filas
+
+
+def _filas_desde_origen(filtro):
+    bloques = (
+        DisponibilidadVeterinario.objects.filter(filtro)
+        .order_by("fecha", "hora_inicio")
+        .values_list("id", "veterinario_id", "fecha", "hora_inicio", "hora_fin", "estado")
+    )
+    citas = (
+        Cita.objects.filter(filtro)
+        .exclude(estado=Cita.Estado.CANCELADA)
+        .values_list("veterinario_id", "fecha", "hora", "hora_fin", "servicio__duracion_min")
+    )
+    bloqueados = DiaBloqueadoVeterinario.objects.filter(filtro).values_list("veterinario_id", "fecha")
+    return construir_filas(bloques, citas, bloqueados)
+
+
+def _reemplazar(filtro):
+    with transaction.atomic():
+        FranjaLibre.objects.filter(filtro).delete()
+        filas = _filas_desde_origen(filtro)
+        FranjaLibre.objects.bulk_create([FranjaLibre(**fila) for fila in filas])
+    return len(filas)
+
+
+def recalcular_franjas(pares):
+    """
+    Recalcula la proyeccion de los (veterinario_id, fecha) indicados. Devuelve
+    la cantidad de franjas escritas.
+    """
+    pares = {(vet_id, fecha) for vet_id, fecha in pares if vet_id and fecha}
+    if not pares:
+        return 0
+    # El filtro cubre el producto veterinarios x fechas; recalcular de mas es
+    # inocuo y mantiene la consulta en una sola condicion indexable.
+    return _reemplazar(
+        Q(
+            veterinario_id__in={vet_id for vet_id, _ in pares},
+            fecha__in={fecha for _, fecha in pares},
+        )
+    )
+
+
+def reconstruir_franjas(desde=None, hasta=None):
+    """
+    Rehace la proyeccion desde cero, opcionalmente acotada a un rango de
+    fechas. Procesa un veterinario a la vez para acotar la memoria.
+    """
+    rango = Q()
+    if desde:
+        rango &= Q(fecha__gte=desde)
+    if hasta:
+        rango &= Q(fecha__lte=hasta)
+    total = 0
+    with transaction.atomic():
+        FranjaLibre.objects.filter(rango).delete()
+        for vet_id in Veterinario.objects.values_list("id", flat=True):
+            total += _reemplazar(rango & Q(veterinario_id=vet_id))
+    return total
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from agenda.expiracion import TAMANO_LOTE, expirar_citas_vencidas
+
+
+class Command(BaseCommand):
+    help = 'Marca como "No atendida (expiró)" las citas pendientes o confirmadas de dias pasados.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lote", type=int, default=TAMANO_LOTE, help="Citas por transaccion."
+        )
+        parser.add_argument(
+            "--completo",
+            action="store_true",
+            help="Ignora la marca de avance y revisa todo el historial.",
+        )
+
+    def handle(self, *args, **options):
+        total = expirar_citas_vencidas(options["lote"], completo=options["completo"])
+        self.stdout.write(self.style.SUCCESS(f"Citas expiradas: {total}"))
@@ -0,0 +1,27 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from agenda.franjas import reconstruir_franjas
+
+
+def _fecha(valor):
+    try:
+        return datetime.strptime(valor, "%Y-%m-%d").date()
+    except ValueError:
+        raise CommandError(f"Fecha invalida: {valor} (usar AAAA-MM-DD).")
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye la tabla de franjas libres desde bloques, dias bloqueados "
+        "y citas. Sirve para reparar desvios de la proyeccion."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", type=_fecha, help="Fecha inicial (AAAA-MM-DD).")
+        parser.add_argument("--hasta", type=_fecha, help="Fecha final (AAAA-MM-DD).")
+
+    def handle(self, *args, **options):
+        total = reconstruir_franjas(options["desde"], options["hasta"])
+        self.stdout.write(self.style.SUCCESS(f"Franjas reconstruidas: {total}"))
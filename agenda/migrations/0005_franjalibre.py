@@ -0,0 +1,106 @@
+# Generated by Django 5.2.8 on 2026-10-17 14:57
+
+import datetime
+import math
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Copia congelada del calculo de agenda.franjas y agenda.slots a la fecha de
+# esta migracion: los cambios futuros a esos modulos no deben alterarla.
+SLOT_MINUTES = 15
+
+
+def _minutos(t):
+    return t.hour * 60 + t.minute
+
+
+def _hora(minutos):
+    return datetime.time(*divmod(minutos, 60))
+
+
+def _fin_cita(hora, hora_fin, duracion_min):
+    if hora_fin:
+        return _minutos(hora_fin)
+    return _minutos(hora) + math.ceil((duracion_min or SLOT_MINUTES) / SLOT_MINUTES) * SLOT_MINUTES
+
+
+def _tramos_libres(inicio, fin, ocupados):
+    """Tramos en minutos de los slots completos de [inicio, fin) que no estan ocupados."""
+    tramos = []
+    for slot in range(-(-inicio // SLOT_MINUTES), fin // SLOT_MINUTES):
+        if slot in ocupados:
+            continue
+        if tramos and tramos[-1][1] == slot * SLOT_MINUTES:
+            tramos[-1][1] += SLOT_MINUTES
+        else:
+            tramos.append([slot * SLOT_MINUTES, (slot + 1) * SLOT_MINUTES])
+    return tramos
+
+
+def poblar_franjas(apps, schema_editor):
+    Bloque = apps.get_model("veterinarios", "DisponibilidadVeterinario")
+    DiaBloqueado = apps.get_model("veterinarios", "DiaBloqueadoVeterinario")
+    Cita = apps.get_model("agenda", "Cita")
+    FranjaLibre = apps.get_model("agenda", "FranjaLibre")
+
+    dias_bloqueados = set(DiaBloqueado.objects.values_list("veterinario_id", "fecha"))
+    ocupados = {}
+    for vet_id, fecha, hora, hora_fin, duracion in Cita.objects.exclude(
+        estado="cancelada"
+    ).values_list("veterinario_id", "fecha", "hora", "hora_fin", "servicio__duracion_min"):
+        inicio = _minutos(hora)
+        fin = _fin_cita(hora, hora_fin, duracion)
+        ocupados.setdefault((vet_id, fecha), set()).update(
+            range(inicio // SLOT_MINUTES, -(-fin // SLOT_MINUTES))
+        )
+
+    franjas = []
+    for bloque_id, vet_id, fecha, inicio, fin, estado in Bloque.objects.order_by(
+        "fecha", "hora_inicio"
+    ).values_list("id", "veterinario_id", "fecha", "hora_inicio", "hora_fin", "estado"):
+        if (vet_id, fecha) in dias_bloqueados:
+            continue
+        base = {"bloque_id": bloque_id, "veterinario_id": vet_id, "fecha": fecha, "estado": estado}
+        if estado != "disponible":
+            franjas.append(FranjaLibre(**base, orden=0, hora_inicio=inicio, hora_fin=fin))
+            continue
+        tramos = _tramos_libres(_minutos(inicio), _minutos(fin), ocupados.get((vet_id, fecha), ()))
+        for orden, (ini_min, fin_min) in enumerate(tramos):
+            franjas.append(
+                FranjaLibre(**base, orden=orden, hora_inicio=_hora(ini_min), hora_fin=_hora(fin_min))
+            )
+    FranjaLibre.objects.bulk_create(franjas, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0004_cita_cancelado_por'),
+        ('usuarios', '0012_servicio_duracion_min'),
+        ('veterinarios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FranjaLibre',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('orden', models.PositiveSmallIntegerField(default=0)),
+                ('hora_inicio', models.TimeField()),
+                ('hora_fin', models.TimeField()),
+                ('estado', models.CharField(choices=[('disponible', 'Disponible'), ('no_disponible', 'No disponible'), ('bloqueado', 'Bloqueado')], max_length=20)),
+                ('bloque', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='franjas_libres', to='veterinarios.disponibilidadveterinario')),
+                ('veterinario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='franjas_libres', to='usuarios.veterinario')),
+            ],
+            options={
+                'verbose_name': 'Franja libre',
+                'verbose_name_plural': 'Franjas libres',
+                'ordering': ['fecha', 'hora_inicio'],
+                'indexes': [models.Index(fields=['fecha', 'hora_inicio'], name='agenda_franja_fecha_idx'), models.Index(fields=['veterinario', 'fecha', 'hora_inicio'], name='agenda_franja_vet_fecha_idx')],
+            },
+        ),
+        migrations.RunPython(poblar_franjas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-17 14:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0005_franjalibre'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcaExpiracion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('procesado_hasta', models.DateField(blank=True, null=True)),
+                ('citas_expiradas', models.PositiveIntegerField(default=0)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Marca de expiracion',
+                'verbose_name_plural': 'Marcas de expiracion',
+            },
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.8 on 2026-10-17 14:59
+
+import math
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Copia congelada de agenda.reservas.slots_de_cita a la fecha de esta
+# migracion: los cambios futuros a ese modulo no deben alterarla.
+SLOT_MINUTES = 15
+SLOTS_POR_DIA = 24 * 60 // SLOT_MINUTES
+
+
+def _minutos(t):
+    return t.hour * 60 + t.minute
+
+
+def _slots_de_cita(hora, hora_fin, duracion_min):
+    inicio = _minutos(hora)
+    if hora_fin:
+        fin = _minutos(hora_fin)
+    else:
+        fin = inicio + math.ceil((duracion_min or SLOT_MINUTES) / SLOT_MINUTES) * SLOT_MINUTES
+    if fin <= inicio:
+        return range(0)
+    return range(inicio // SLOT_MINUTES, min(-(-fin // SLOT_MINUTES), SLOTS_POR_DIA))
+
+
+def reservar_citas_activas(apps, schema_editor):
+    Cita = apps.get_model("agenda", "Cita")
+    ReservaSlot = apps.get_model("agenda", "ReservaSlot")
+    reservas = []
+    citas = Cita.objects.exclude(estado="cancelada").order_by("creado_en", "id").values_list(
+        "id", "veterinario_id", "fecha", "hora", "hora_fin", "servicio__duracion_min"
+    )
+    for cita_id, vet_id, fecha, hora, hora_fin, duracion in citas:
+        reservas.extend(
+            ReservaSlot(veterinario_id=vet_id, fecha=fecha, slot=slot, cita_id=cita_id)
+            for slot in _slots_de_cita(hora, hora_fin, duracion)
+        )
+    # Si ya existian citas traslapadas se conserva la reserva de la mas antigua.
+    ReservaSlot.objects.bulk_create(reservas, batch_size=500, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0006_marcaexpiracion'),
+        ('usuarios', '0012_servicio_duracion_min'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('slot', models.PositiveSmallIntegerField()),
+                ('cita', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_slot', to='agenda.cita')),
+                ('veterinario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_slot', to='usuarios.veterinario')),
+            ],
+            options={
+                'verbose_name': 'Reserva de slot',
+                'verbose_name_plural': 'Reservas de slot',
+                'constraints': [models.UniqueConstraint(fields=('veterinario', 'fecha', 'slot'), name='agenda_reserva_slot_unica')],
+            },
+        ),
+        migrations.RunPython(reservar_citas_activas, migrations.RunPython.noop),
+    ]
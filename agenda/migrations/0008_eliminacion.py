@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0007_reservaslot'),
+        ('usuarios', '0012_servicio_duracion_min'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Eliminacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(choices=[('cita', 'Cita'), ('bloque', 'Bloque de disponibilidad'), ('dia_bloqueado', 'Dia bloqueado')], max_length=20)),
+                ('objeto_id', models.PositiveBigIntegerField()),
+                ('fecha', models.DateField()),
+                ('eliminado_en', models.DateTimeField(auto_now_add=True)),
+                ('veterinario', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='usuarios.veterinario')),
+            ],
+            options={
+                'verbose_name': 'Eliminacion',
+                'verbose_name_plural': 'Eliminaciones',
+                'indexes': [models.Index(fields=['eliminado_en'], name='agenda_eliminacion_en_idx')],
+            },
+        ),
+    ]
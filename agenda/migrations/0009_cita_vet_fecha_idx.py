@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0008_eliminacion'),
+        ('usuarios', '0014_rut_telefono_normalizado'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['veterinario', 'fecha', 'hora'], name='agenda_cita_vet_fecha_idx'),
+        ),
+    ]
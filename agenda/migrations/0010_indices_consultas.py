@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agenda', '0009_cita_vet_fecha_idx'),
+        ('usuarios', '0014_rut_telefono_normalizado'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['fecha', 'hora'], name='agenda_cita_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['cliente', 'fecha', 'hora'], name='agenda_cita_cliente_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['estado', 'fecha'], name='agenda_cita_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['actualizado_en'], name='agenda_cita_actualizado_idx'),
+        ),
+    ]
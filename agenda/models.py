@@ -5,6 +5,7 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 
 from usuarios.models import Cliente, Mascota, Servicio, Veterinario
+from veterinarios.models import DisponibilidadVeterinario
 
 
 class Cita(models.Model):
@@ -58,6 +59,136 @@ class Cita(models.Model):
         verbose_name = "Cita"
         verbose_name_plural = "Citas"
         ordering = ["fecha", "hora"]
+        indexes = [
+            models.Index(fields=["veterinario", "fecha", "hora"], name="agenda_cita_vet_fecha_idx"),
+            # Agenda de recepcion y rangos sin veterinario.
+            models.Index(fields=["fecha", "hora"], name="agenda_cita_fecha_idx"),
+            # Historial y proximas citas del cliente.
+            models.Index(fields=["cliente", "fecha", "hora"], name="agenda_cita_cliente_fecha_idx"),
+            # Expiracion de pendientes y confirmadas vencidas.
+            models.Index(fields=["estado", "fecha"], name="agenda_cita_estado_fecha_idx"),
+            # Cambios desde un token y cancelaciones recientes.
+            models.Index(fields=["actualizado_en"], name="agenda_cita_actualizado_idx"),
+        ]
 
     def __str__(self):
         return f"Cita {self.fecha} {self.hora} - {self.mascota} ({self.estado})"
+
+
+class FranjaLibre(models.Model):
+    """
+    Proyeccion persistida de la disponibilidad por (veterinario, fecha): los
+    tramos libres de cada bloque disponible, descontadas las citas activas, y
+    los bloques no disponibles tal cual. Se recalcula por dia desde
+    agenda.signals y se puede reconstruir con ``manage.py reconstruir_franjas``.
+    """
+
+    veterinario = models.ForeignKey(
+        Veterinario, on_delete=models.CASCADE, related_name="franjas_libres"
+    )
+    bloque = models.ForeignKey(
+        DisponibilidadVeterinario, on_delete=models.CASCADE, related_name="franjas_libres"
+    )
+    fecha = models.DateField()
+    orden = models.PositiveSmallIntegerField(default=0)
+    hora_inicio = models.TimeField()
+    hora_fin = models.TimeField()
+    estado = models.CharField(max_length=20, choices=DisponibilidadVeterinario.Estado.choices)
+
+    class Meta:
+        verbose_name = "Franja libre"
+        verbose_name_plural = "Franjas libres"
+        ordering = ["fecha", "hora_inicio"]
+        indexes = [
+            models.Index(fields=["fecha", "hora_inicio"], name="agenda_franja_fecha_idx"),
+            models.Index(
+                fields=["veterinario", "fecha", "hora_inicio"], name="agenda_franja_vet_fecha_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.veterinario} {self.fecha} {self.hora_inicio}-{self.hora_fin} ({self.estado})"
+
+
+class MarcaExpiracion(models.Model):
+    """
+    Avance del proceso que marca como no atendidas las citas vencidas: todas
+    las citas con fecha anterior a ``procesado_hasta`` ya fueron revisadas.
+    Se usa una sola fila.
+    """
+
+    procesado_hasta = models.DateField(blank=True, null=True)
+    citas_expiradas = models.PositiveIntegerField(default=0)
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Marca de expiracion"
+        verbose_name_plural = "Marcas de expiracion"
+
+    def __str__(self):
+        return f"Expiracion procesada hasta {self.procesado_hasta}"
+
+
+class ReservaSlot(models.Model):
+    """
+    Slot de SLOT_MINUTES minutos tomado por una cita activa. La restriccion
+    unica sobre (veterinario, fecha, slot) hace que dos citas no puedan tomar
+    el mismo horario aunque se agenden al mismo tiempo. Las filas se mantienen
+    desde agenda.signals.
+    """
+
+    veterinario = models.ForeignKey(
+        Veterinario, on_delete=models.CASCADE, related_name="reservas_slot"
+    )
+    fecha = models.DateField()
+    slot = models.PositiveSmallIntegerField()
+    cita = models.ForeignKey(Cita, on_delete=models.CASCADE, related_name="reservas_slot")
+
+    class Meta:
+        verbose_name = "Reserva de slot"
+        verbose_name_plural = "Reservas de slot"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["veterinario", "fecha", "slot"], name="agenda_reserva_slot_unica"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.veterinario} {self.fecha} slot {self.slot} (cita {self.cita_id})"
+
+
+class Eliminacion(models.Model):
+    """
+    Lapida de una cita, bloque de disponibilidad o dia bloqueado eliminado, o
+    que se movio a otro (veterinario, fecha). Permite que la sincronizacion
+    por token (agenda.sincronizacion) informe bajas ademas de altas y
+    cambios. Se registran desde agenda.signals.
+    """
+
+    class Modelo(models.TextChoices):
+        CITA = "cita", "Cita"
+        BLOQUE = "bloque", "Bloque de disponibilidad"
+        DIA_BLOQUEADO = "dia_bloqueado", "Dia bloqueado"
+
+    modelo = models.CharField(max_length=20, choices=Modelo.choices)
+    objeto_id = models.PositiveBigIntegerField()
+    # Sin restriccion de clave foranea: la lapida debe sobrevivir al borrado
+    # en cascada del propio veterinario.
+    veterinario = models.ForeignKey(
+        Veterinario,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="+",
+    )
+    fecha = models.DateField()
+    eliminado_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Eliminacion"
+        verbose_name_plural = "Eliminaciones"
+        indexes = [
+            models.Index(fields=["eliminado_en"], name="agenda_eliminacion_en_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.modelo} {self.objeto_id} eliminado {self.eliminado_en}"
@@ -0,0 +1,182 @@
+"""
+Replanificacion en lote de las citas de un veterinario que deja de atender.
+
+Las citas activas del rango se reasignan en una sola pasada: la
+disponibilidad libre de todos los veterinarios se carga una vez desde la
+proyeccion FranjaLibre y cada asignacion descuenta sus slots en memoria, asi
+las citas siguientes del lote ya no los consideran. Para cada cita se busca
+primero el mismo dia con otro veterinario y luego los dias siguientes, dentro
+de cada dia el inicio mas cercano a la hora original.
+"""
+
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .disponibilidad import cargar_libres
+from .eventos import notificar_cambios
+from .franjas import fin_cita_min, recalcular_franjas
+from .models import Cita, ReservaSlot
+from .reservas import SlotOcupado, choca_con_reserva, slots_de_cita
+from .slots import DiaSlots, a_hora, a_minutos
+
+HORIZONTE_DIAS = 14
+MOTIVO_REPLANIFICACION = "Replanificada: veterinario no disponible"
+
+
+def _duracion_cita(cita):
+    duracion = cita.servicio.duracion_min if cita.servicio_id else None
+    return fin_cita_min(cita.hora, cita.hora_fin, duracion) - a_minutos(cita.hora)
+
+
+def _mejor_inicio(candidatos, duracion, original, minimo):
+    """
+    (distancia, minuto, vet_id, bloques, indice) del inicio posible mas
+    cercano a ``original`` entre los bloques de un dia; None si no cabe.
+    """
+    mejor = None
+    for vet_id, bloques in candidatos:
+        for indice, (_bloque_id, slots) in enumerate(bloques):
+            for minuto in slots.inicios_posibles(duracion).minutos_inicio():
+                if minuto < minimo:
+                    continue
+                clave = (abs(minuto - original), minuto, vet_id)
+                if mejor is None or clave < mejor[:3]:
+                    mejor = (*clave, bloques, indice)
+    return mejor
+
+
+def proponer_replanificacion(veterinario_id, desde, hasta, horizonte_dias=HORIZONTE_DIAS, ahora=None):
+    """
+    Propone un nuevo horario para cada cita activa del veterinario entre
+    ``desde`` y ``hasta`` (ambos inclusive), buscando hasta ``horizonte_dias``
+    despues de ``hasta``. El propio veterinario no recibe citas dentro del
+    rango que se libera. Las citas de hoy que ya empezaron no se mueven.
+
+    Devuelve una lista de diccionarios con ``cita`` y, si hubo lugar,
+    ``veterinario_id``, ``fecha``, ``hora`` y ``hora_fin``; sin lugar esos
+    campos quedan en None. No escribe nada.
+    """
+    ahora = ahora or timezone.localtime()
+    hoy = ahora.date()
+    citas = list(
+        Cita.objects.filter(
+            Q(fecha__gt=hoy) | Q(fecha=hoy, hora__gt=ahora.time()),
+            veterinario_id=veterinario_id,
+            fecha__range=(max(desde, hoy), hasta),
+        )
+        .exclude(estado=Cita.Estado.CANCELADA)
+        .select_related("servicio")
+        .order_by("fecha", "hora", "id")
+    )
+    if not citas:
+        return []
+
+    por_fecha = {}
+    libres = cargar_libres(citas[0].fecha, hasta + timedelta(days=horizonte_dias))
+    for (vet_id, fecha), bloques in libres.items():
+        if vet_id == veterinario_id and desde <= fecha <= hasta:
+            continue
+        por_fecha.setdefault(fecha, []).append((vet_id, bloques))
+    fechas = sorted(por_fecha)
+
+    propuestas = []
+    for cita in citas:
+        duracion = _duracion_cita(cita)
+        original = a_minutos(cita.hora)
+        propuesta = {"cita": cita, "veterinario_id": None, "fecha": None, "hora": None, "hora_fin": None}
+        for fecha in fechas:
+            if fecha < cita.fecha:
+                continue
+            minimo = a_minutos(ahora) + 1 if fecha == ahora.date() else 0
+            mejor = _mejor_inicio(por_fecha[fecha], duracion, original, minimo)
+            if mejor is None:
+                continue
+            _distancia, minuto, vet_id, bloques, indice = mejor
+            # Se descuenta en memoria para que el resto del lote no lo reuse.
+            bloque_id, slots = bloques[indice]
+            bloques[indice] = (bloque_id, slots - DiaSlots.ocupados_por([(minuto, minuto + duracion)]))
+            propuesta.update(
+                veterinario_id=vet_id,
+                fecha=fecha,
+                hora=a_hora(minuto),
+                hora_fin=a_hora(minuto + duracion),
+            )
+            break
+        propuestas.append(propuesta)
+    return propuestas
+
+
+def aplicar_replanificacion(propuestas, motivo=MOTIVO_REPLANIFICACION):
+    """
+    Escribe en una sola transaccion las propuestas con destino: cancela cada
+    cita original como "replanificada" y crea la nueva cita pendiente. Las
+    propuestas sin destino no se tocan. Agrega la cita creada en ``nueva`` y
+    devuelve la lista de citas nuevas.
+
+    Lanza SlotOcupado si algun horario fue tomado despues de proponer; en ese
+    caso no queda nada escrito.
+    """
+    asignadas = [p for p in propuestas if p["veterinario_id"]]
+    if not asignadas:
+        return []
+    ids = [p["cita"].id for p in asignadas]
+    with transaction.atomic():
+        # Dentro de la transaccion: esperar el lock de escritura puede tomar
+        # mas que MARGEN_TOKEN y un actualizado_en anterior quedaria fuera
+        # de los ?since= emitidos mientras tanto.
+        ahora = timezone.now()
+        Cita.objects.filter(id__in=ids).update(
+            estado=Cita.Estado.CANCELADA,
+            motivo_cancelacion=motivo,
+            cancelado_por="replanificada",
+            actualizado_en=ahora,
+        )
+        # update() y bulk_create no disparan señales: reservas y franjas se
+        # mantienen a mano, igual que en la expiracion.
+        ReservaSlot.objects.filter(cita_id__in=ids).delete()
+        nuevas = Cita.objects.bulk_create(
+            [
+                Cita(
+                    cliente_id=p["cita"].cliente_id,
+                    mascota_id=p["cita"].mascota_id,
+                    servicio_id=p["cita"].servicio_id,
+                    veterinario_id=p["veterinario_id"],
+                    fecha=p["fecha"],
+                    hora=p["hora"],
+                    hora_fin=p["hora_fin"],
+                    notas=p["cita"].notas,
+                    estado=Cita.Estado.PENDIENTE,
+                )
+                for p in asignadas
+            ]
+        )
+        try:
+            with transaction.atomic():
+                ReservaSlot.objects.bulk_create(
+                    [
+                        ReservaSlot(veterinario_id=n.veterinario_id, fecha=n.fecha, slot=slot, cita=n)
+                        for n in nuevas
+                        for slot in slots_de_cita(n.hora, n.hora_fin)
+                    ]
+                )
+        except IntegrityError as exc:
+            if not choca_con_reserva(exc):
+                raise
+            raise SlotOcupado("Uno de los horarios propuestos ya fue tomado por otra cita.") from exc
+        pares = {(p["cita"].veterinario_id, p["cita"].fecha) for p in asignadas} | {
+            (n.veterinario_id, n.fecha) for n in nuevas
+        }
+        recalcular_franjas(pares)
+        notificar_cambios(pares)
+
+    for propuesta, nueva in zip(asignadas, nuevas):
+        cita = propuesta["cita"]
+        cita.estado = Cita.Estado.CANCELADA
+        cita.motivo_cancelacion = motivo
+        cita.cancelado_por = "replanificada"
+        cita.actualizado_en = ahora
+        propuesta["nueva"] = nueva
+    return nuevas
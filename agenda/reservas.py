@@ -0,0 +1,75 @@
+"""
+Reserva atomica de horarios.
+
+Cada cita activa toma una fila ReservaSlot por slot que ocupa. Como la tabla
+tiene una restriccion unica por (veterinario, fecha, slot), guardar una cita
+que pisa a otra falla en la base de datos aunque ambas hayan pasado la
+validacion de disponibilidad al mismo tiempo.
+"""
+
+from django.db import IntegrityError, transaction
+
+from .franjas import fin_cita_min
+from .models import Cita, ReservaSlot
+from .slots import DiaSlots, a_minutos
+
+RESTRICCION_RESERVA = "agenda_reserva_slot_unica"
+
+
+class SlotOcupado(Exception):
+    """El horario pedido ya esta tomado por otra cita."""
+
+
+def choca_con_reserva(exc):
+    """
+    True si el IntegrityError ``exc`` viene de la restriccion unica de
+    ReservaSlot. SQLite nombra las columnas y no la restriccion; otros
+    motores nombran la restriccion.
+    """
+    mensaje = str(exc)
+    tabla = ReservaSlot._meta.db_table
+    return (
+        RESTRICCION_RESERVA in mensaje
+        or f"UNIQUE constraint failed: {tabla}.veterinario_id, {tabla}.fecha, {tabla}.slot"
+        in mensaje
+    )
+
+
+def slots_de_cita(hora, hora_fin, duracion_min=None):
+    inicio = a_minutos(hora)
+    return [
+        slot
+        for slot_inicio, slot_fin in DiaSlots.ocupados_por(
+            [(inicio, fin_cita_min(hora, hora_fin, duracion_min))]
+        ).corridas()
+        for slot in range(slot_inicio, slot_fin)
+    ]
+
+
+def sincronizar_reservas(cita):
+    """Reemplaza las reservas de la cita segun su estado y horario actual."""
+    ReservaSlot.objects.filter(cita=cita).delete()
+    if cita.estado == Cita.Estado.CANCELADA:
+        return
+    duracion = getattr(cita.servicio, "duracion_min", None) if cita.servicio_id else None
+    ReservaSlot.objects.bulk_create(
+        [
+            ReservaSlot(veterinario_id=cita.veterinario_id, fecha=cita.fecha, slot=slot, cita=cita)
+            for slot in slots_de_cita(cita.hora, cita.hora_fin, duracion)
+        ]
+    )
+
+
+def guardar_cita(cita, **save_kwargs):
+    """
+    Guarda la cita y sus reservas como una sola operacion. Lanza SlotOcupado
+    si otra cita activa ya tiene alguno de los slots; en ese caso no queda
+    nada escrito. Cualquier otro IntegrityError se relanza tal cual.
+    """
+    try:
+        with transaction.atomic():
+            cita.save(**save_kwargs)
+    except IntegrityError as exc:
+        if not choca_con_reserva(exc):
+            raise
+        raise SlotOcupado("El horario ya fue tomado por otra cita.") from exc
@@ -0,0 +1,92 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from veterinarios.models import DiaBloqueadoVeterinario, DisponibilidadVeterinario
+
+from .eventos import notificar_cambios
+from .franjas import recalcular_franjas
+from .models import Cita, Eliminacion
+from .reservas import sincronizar_reservas
+
+MODELOS_AGENDA = (Cita, DisponibilidadVeterinario, DiaBloqueadoVeterinario)
+LAPIDAS = {
+    Cita: Eliminacion.Modelo.CITA,
+    DisponibilidadVeterinario: Eliminacion.Modelo.BLOQUE,
+    DiaBloqueadoVeterinario: Eliminacion.Modelo.DIA_BLOQUEADO,
+}
+CAMPOS_HORARIO_CITA = {"estado", "fecha", "hora", "hora_fin", "veterinario"}
+
+
+def _par(instance):
+    fecha = instance._meta.get_field("fecha").to_python(instance.fecha)
+    return (instance.veterinario_id, fecha)
+
+
+def recordar_par_anterior(sender, instance, update_fields=None, **kwargs):
+    """
+    Guarda el (veterinario, fecha) previo para recalcular tambien el dia de
+    origen cuando una cita o bloque se mueve.
+    """
+    instance._par_agenda_anterior = None
+    if not instance.pk:
+        return
+    if update_fields is not None and not {"fecha", "veterinario"} & set(update_fields):
+        return
+    instance._par_agenda_anterior = (
+        sender.objects.filter(pk=instance.pk).values_list("veterinario_id", "fecha").first()
+    )
+
+
+def actualizar_franjas(sender, instance, **kwargs):
+    pares = {_par(instance)}
+    anterior = getattr(instance, "_par_agenda_anterior", None)
+    if anterior:
+        pares.add(anterior)
+    recalcular_franjas(pares)
+    notificar_cambios(pares)
+
+
+def actualizar_reservas(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not CAMPOS_HORARIO_CITA & set(update_fields):
+        return
+    sincronizar_reservas(instance)
+
+
+def registrar_traslado(sender, instance, created, **kwargs):
+    """
+    Una fila que cambia de veterinario o de fecha deja una lapida en su
+    (veterinario, fecha) anterior: quien sincroniza solo ese alcance ya no la
+    encuentra entre los cambios y debe saber que tiene que quitarla.
+    """
+    anterior = getattr(instance, "_par_agenda_anterior", None)
+    if created or not anterior or anterior == _par(instance):
+        return
+    Eliminacion.objects.create(
+        modelo=LAPIDAS[sender], objeto_id=instance.pk, veterinario_id=anterior[0], fecha=anterior[1]
+    )
+
+
+def registrar_eliminacion(sender, instance, **kwargs):
+    vet_id, fecha = _par(instance)
+    Eliminacion.objects.create(
+        modelo=LAPIDAS[sender], objeto_id=instance.pk, veterinario_id=vet_id, fecha=fecha
+    )
+
+
+post_save.connect(actualizar_reservas, sender=Cita, dispatch_uid="reservas_save_cita")
+
+for _modelo in MODELOS_AGENDA:
+    pre_save.connect(
+        recordar_par_anterior, sender=_modelo, dispatch_uid=f"franjas_pre_{_modelo.__name__}"
+    )
+    post_save.connect(
+        actualizar_franjas, sender=_modelo, dispatch_uid=f"franjas_save_{_modelo.__name__}"
+    )
+    post_delete.connect(
+        actualizar_franjas, sender=_modelo, dispatch_uid=f"franjas_delete_{_modelo.__name__}"
+    )
+    post_save.connect(
+        registrar_traslado, sender=_modelo, dispatch_uid=f"lapida_traslado_{_modelo.__name__}"
+    )
+    post_delete.connect(
+        registrar_eliminacion, sender=_modelo, dispatch_uid=f"lapida_{_modelo.__name__}"
+    )
@@ -0,0 +1,143 @@
+"""
+Representacion compacta de la agenda diaria de un veterinario.
+
+Cada dia se divide en bloques de SLOT_MINUTES minutos y se guarda como un
+entero donde el bit ``i`` indica si el slot ``i`` (contado desde las 00:00)
+esta marcado. Restar, intersectar y buscar huecos se resuelve con operaciones
+de bits sobre el entero completo en vez de recorrer listas de intervalos.
+"""
+
+from datetime import time
+
+SLOT_MINUTES = 15
+SLOTS_POR_DIA = 24 * 60 // SLOT_MINUTES
+
+
+def a_minutos(t):
+    return t.hour * 60 + t.minute
+
+
+def a_hora(minutos):
+    return time(*divmod(int(minutos), 60))
+
+
+def _ceil_slot(minutos):
+    return -(-int(minutos) // SLOT_MINUTES)
+
+
+def _floor_slot(minutos):
+    return int(minutos) // SLOT_MINUTES
+
+
+def _rango_bits(slot_inicio, slot_fin):
+    slot_inicio = max(slot_inicio, 0)
+    slot_fin = min(slot_fin, SLOTS_POR_DIA)
+    if slot_fin <= slot_inicio:
+        return 0
+    return ((1 << (slot_fin - slot_inicio)) - 1) << slot_inicio
+
+
+class DiaSlots:
+    """
+    Conjunto de slots de un dia. Es inmutable: las operaciones devuelven
+    instancias nuevas.
+    """
+
+    __slots__ = ("bits",)
+
+    def __init__(self, bits=0):
+        self.bits = bits
+
+    @classmethod
+    def desde_rango(cls, inicio_min, fin_min):
+        """
+        Slots contenidos por completo en [inicio_min, fin_min). Un bloque que
+        parte o termina a mitad de slot pierde ese slot parcial.
+        """
+        return cls(_rango_bits(_ceil_slot(inicio_min), _floor_slot(fin_min)))
+
+    @classmethod
+    def ocupados_por(cls, intervalos):
+        """
+        Slots tocados por alguno de los intervalos (inicio_min, fin_min). Un
+        intervalo que ocupa parte de un slot lo inutiliza completo.
+        """
+        bits = 0
+        for inicio, fin in intervalos:
+            if fin <= inicio:
+                continue
+            bits |= _rango_bits(_floor_slot(inicio), _ceil_slot(fin))
+        return cls(bits)
+
+    def __bool__(self):
+        return bool(self.bits)
+
+    def __eq__(self, other):
+        return isinstance(other, DiaSlots) and self.bits == other.bits
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def __repr__(self):
+        return f"DiaSlots({self.intervalos()!r})"
+
+    def __or__(self, other):
+        return DiaSlots(self.bits | other.bits)
+
+    def __and__(self, other):
+        return DiaSlots(self.bits & other.bits)
+
+    def __sub__(self, other):
+        return DiaSlots(self.bits & ~other.bits)
+
+    def contiene(self, other):
+        return not (other.bits & ~self.bits)
+
+    def corridas(self):
+        """Tramos continuos como pares (slot_inicio, slot_fin) con fin exclusivo."""
+        bits = self.bits
+        tramos = []
+        while bits:
+            menor = bits & -bits
+            inicio = menor.bit_length() - 1
+            # Sumar el bit menor arrastra el acarreo hasta el primer cero del tramo.
+            fin = ((bits + menor) & ~bits).bit_length() - 1
+            tramos.append((inicio, fin))
+            bits &= ~((1 << fin) - 1)
+        return tramos
+
+    def intervalos(self):
+        """Tramos continuos en minutos desde las 00:00."""
+        return [(ini * SLOT_MINUTES, fin * SLOT_MINUTES) for ini, fin in self.corridas()]
+
+    def inicios_posibles(self, duracion_min):
+        """
+        Slots donde puede comenzar un bloque de ``duracion_min`` minutos sin
+        salir del conjunto.
+        """
+        largo = max(_ceil_slot(duracion_min), 1)
+        bits = self.bits
+        cubiertos = 1
+        # Tras cada paso, el bit i indica que hay 'cubiertos' slots libres desde i.
+        while cubiertos < largo and bits:
+            paso = min(cubiertos, largo - cubiertos)
+            bits &= bits >> paso
+            cubiertos += paso
+        return DiaSlots(bits)
+
+    def primer_inicio(self, duracion_min, desde_min=0):
+        """Minuto del primer inicio posible en o despues de ``desde_min``; None si no hay."""
+        bits = self.inicios_posibles(duracion_min).bits & ~((1 << _ceil_slot(desde_min)) - 1)
+        if not bits:
+            return None
+        return ((bits & -bits).bit_length() - 1) * SLOT_MINUTES
+
+    def minutos_inicio(self):
+        """Minuto de inicio de cada slot marcado, en orden."""
+        bits = self.bits
+        minutos = []
+        while bits:
+            menor = bits & -bits
+            minutos.append((menor.bit_length() - 1) * SLOT_MINUTES)
+            bits ^= menor
+        return minutos
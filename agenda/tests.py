@@ -1,3 +1,450 @@
-from django.test import TestCase
+import json
+import threading
+from datetime import datetime, time, timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from usuarios.models import Cliente, Mascota, Perfil, Recepcionista, Servicio, Veterinario
+from veterinarios.models import DiaBloqueadoVeterinario, DisponibilidadVeterinario
+
+from .expiracion import MOTIVO_EXPIRACION, expirar_citas_vencidas
+from .franjas import reconstruir_franjas
+from .models import Cita, FranjaLibre, MarcaExpiracion, ReservaSlot
+from .replanificacion import aplicar_replanificacion, proponer_replanificacion
+from .reservas import SlotOcupado, guardar_cita
+from .sincronizacion import cambios_desde, emitir_token, leer_token
+from .slots import SLOTS_POR_DIA, DiaSlots
+
+
+class DiaSlotsTests(SimpleTestCase):
+    def test_desde_rango_descarta_slots_parciales(self):
+        # 09:10-10:20 solo contiene completos los slots de 09:15 a 10:15.
+        self.assertEqual(DiaSlots.desde_rango(9 * 60 + 10, 10 * 60 + 20).intervalos(), [(555, 615)])
+        self.assertFalse(DiaSlots.desde_rango(600, 610))
+        self.assertFalse(DiaSlots.desde_rango(600, 600))
+
+    def test_ocupados_por_redondea_hacia_afuera(self):
+        ocupados = DiaSlots.ocupados_por([(600, 610), (700, 700), (720, 721)])
+        self.assertEqual(ocupados.intervalos(), [(600, 615), (720, 735)])
+
+    def test_bordes_del_dia(self):
+        dia = DiaSlots.desde_rango(-30, 24 * 60 + 30)
+        self.assertEqual(dia.intervalos(), [(0, 24 * 60)])
+        self.assertEqual(dia.bits, (1 << SLOTS_POR_DIA) - 1)
+        self.assertEqual(dia.primer_inicio(15, desde_min=24 * 60 - 15), 24 * 60 - 15)
+        self.assertIsNone(dia.primer_inicio(30, desde_min=24 * 60 - 15))
+
+    def test_resta_y_corridas(self):
+        libre = DiaSlots.desde_rango(540, 720) - DiaSlots.ocupados_por([(600, 630)])
+        self.assertEqual(libre.corridas(), [(36, 40), (42, 48)])
+        self.assertEqual(libre.intervalos(), [(540, 600), (630, 720)])
+        self.assertTrue(libre.contiene(DiaSlots.desde_rango(630, 660)))
+        self.assertFalse(libre.contiene(DiaSlots.desde_rango(585, 645)))
+
+    def test_inicios_posibles_respeta_duracion(self):
+        libre = DiaSlots.desde_rango(540, 600) | DiaSlots.desde_rango(630, 720)
+        # 45 min caben desde 09:00 y 09:15 en el primer tramo, y 10:30-11:15 en el segundo.
+        self.assertEqual(
+            libre.inicios_posibles(45).minutos_inicio(), [540, 555, 630, 645, 660, 675]
+        )
+        # Una duracion que no es multiplo del slot ocupa el slot parcial completo.
+        self.assertEqual(libre.inicios_posibles(50), libre.inicios_posibles(60))
+        self.assertEqual(libre.primer_inicio(60, desde_min=550), 630)
+        self.assertIsNone(libre.primer_inicio(120))
+
+
+class ProyeccionFranjasTests(TestCase):
+    """Las señales mantienen FranjaLibre igual a un recalculo desde cero."""
+
+    def setUp(self):
+        vet_user = User.objects.create_user("vet")
+        self.vet = Veterinario.objects.create(perfil=vet_user.perfil, rut="2-7", telefono="2")
+        cliente_user = User.objects.create_user("cliente")
+        self.cliente = Cliente.objects.create(
+            perfil=cliente_user.perfil, rut="3-5", direccion="x", telefono="3"
+        )
+        self.mascota = Mascota.objects.create(cliente=self.cliente, nombre="Toby", tipo="perro")
+        self.servicio = Servicio.objects.create(nombre="Consulta", duracion_min=30)
+        self.dia = timezone.localdate() + timedelta(days=1)
+        self.otro_dia = self.dia + timedelta(days=1)
+        for fecha in (self.dia, self.otro_dia):
+            DisponibilidadVeterinario.objects.create(
+                veterinario=self.vet, fecha=fecha, hora_inicio=time(9), hora_fin=time(12)
+            )
+
+    def _franjas(self, fecha):
+        return list(
+            FranjaLibre.objects.filter(veterinario=self.vet, fecha=fecha)
+            .order_by("hora_inicio")
+            .values_list("hora_inicio", "hora_fin")
+        )
+
+    def _proyeccion(self):
+        return sorted(FranjaLibre.objects.values_list("fecha", "hora_inicio", "hora_fin", "estado"))
+
+    def _assert_igual_a_reconstruir(self):
+        actual = self._proyeccion()
+        reconstruir_franjas()
+        self.assertEqual(actual, self._proyeccion())
+
+    def test_crear_mover_y_cancelar_cita(self):
+        self.assertEqual(self._franjas(self.dia), [(time(9), time(12))])
+        cita = Cita.objects.create(
+            veterinario=self.vet,
+            cliente=self.cliente,
+            mascota=self.mascota,
+            servicio=self.servicio,
+            fecha=self.dia,
+            hora=time(10),
+        )
+        self.assertEqual(
+            self._franjas(self.dia), [(time(9), time(10)), (time(10, 30), time(12))]
+        )
+        self._assert_igual_a_reconstruir()
+
+        # Moverla rehace el dia de origen y el de destino.
+        cita.fecha = self.otro_dia
+        cita.hora, cita.hora_fin = time(11, 30), None
+        cita.save()
+        self.assertEqual(self._franjas(self.dia), [(time(9), time(12))])
+        self.assertEqual(self._franjas(self.otro_dia), [(time(9), time(11, 30))])
+        self._assert_igual_a_reconstruir()
+
+        cita.estado = Cita.Estado.CANCELADA
+        cita.save(update_fields=["estado", "actualizado_en"])
+        self.assertEqual(self._franjas(self.otro_dia), [(time(9), time(12))])
+        self._assert_igual_a_reconstruir()
+
+    def test_dia_bloqueado_y_bloque_eliminado(self):
+        bloqueo = DiaBloqueadoVeterinario.objects.create(veterinario=self.vet, fecha=self.dia)
+        self.assertEqual(self._franjas(self.dia), [])
+        bloqueo.delete()
+        self.assertEqual(self._franjas(self.dia), [(time(9), time(12))])
+        DisponibilidadVeterinario.objects.filter(fecha=self.dia).get().delete()
+        self.assertEqual(self._franjas(self.dia), [])
+        self._assert_igual_a_reconstruir()
+
+
+class GuardarCitaTests(TestCase):
+    def setUp(self):
+        vet_user = User.objects.create_user("vet")
+        self.vet = Veterinario.objects.create(perfil=vet_user.perfil, rut="2-7", telefono="2")
+        cliente_user = User.objects.create_user("cliente")
+        cliente = Cliente.objects.create(
+            perfil=cliente_user.perfil, rut="3-5", direccion="x", telefono="3"
+        )
+        mascota = Mascota.objects.create(cliente=cliente, nombre="Toby", tipo="perro")
+        self.datos = {
+            "veterinario": self.vet,
+            "cliente": cliente,
+            "mascota": mascota,
+            "servicio": Servicio.objects.create(nombre="Consulta", duracion_min=30),
+            "fecha": timezone.localdate() + timedelta(days=1),
+        }
+
+    def test_slot_tomado_es_slot_ocupado(self):
+        guardar_cita(Cita(hora=time(10), **self.datos))
+        with self.assertRaises(SlotOcupado):
+            guardar_cita(Cita(hora=time(10, 15), **self.datos))
+        self.assertEqual(Cita.objects.count(), 1)
+
+    def test_otra_restriccion_se_relanza(self):
+        cita = Cita(hora=time(10), **{**self.datos, "cliente": None})
+        with self.assertRaisesMessage(IntegrityError, "NOT NULL"):
+            guardar_cita(cita)
+        self.assertFalse(ReservaSlot.objects.exists())
+
+
+class ExpiracionTests(TestCase):
+    def setUp(self):
+        vet_user = User.objects.create_user("vet")
+        self.vet = Veterinario.objects.create(perfil=vet_user.perfil, rut="2-7", telefono="2")
+        cliente_user = User.objects.create_user("cliente")
+        self.cliente = Cliente.objects.create(
+            perfil=cliente_user.perfil, rut="3-5", direccion="x", telefono="3"
+        )
+        self.mascota = Mascota.objects.create(cliente=self.cliente, nombre="Toby", tipo="perro")
+        self.hoy = timezone.localdate()
+        self.vencidas = [
+            self._cita(self.hoy - timedelta(days=dias), time(9 + n))
+            for dias in (1, 2, 3)
+            for n in range(2 if dias < 3 else 1)
+        ]
+        self.cancelada = self._cita(self.hoy - timedelta(days=1), time(15))
+        self.cancelada.estado = Cita.Estado.CANCELADA
+        self.cancelada.save()
+        self.futura = self._cita(self.hoy + timedelta(days=1), time(9))
+
+    def _cita(self, fecha, hora):
+        return Cita.objects.create(
+            veterinario=self.vet, cliente=self.cliente, mascota=self.mascota, fecha=fecha, hora=hora
+        )
+
+    def _estados(self):
+        return dict(Cita.objects.values_list("id", "estado"))
+
+    def test_expira_por_lotes_y_devuelve_el_total(self):
+        with CaptureQueriesContext(connection) as consultas:
+            total = expirar_citas_vencidas(tamano_lote=2)
+        self.assertEqual(total, 5)
+        actualizaciones = [q for q in consultas if q["sql"].startswith('UPDATE "agenda_cita"')]
+        self.assertEqual(len(actualizaciones), 3)
+        for cita in self.vencidas:
+            cita.refresh_from_db()
+            self.assertEqual(cita.estado, Cita.Estado.CANCELADA)
+            self.assertEqual(cita.motivo_cancelacion, MOTIVO_EXPIRACION)
+            self.assertEqual(cita.cancelado_por, "sistema")
+        self.assertFalse(ReservaSlot.objects.filter(cita__in=self.vencidas).exists())
+        self.futura.refresh_from_db()
+        self.assertEqual(self.futura.estado, Cita.Estado.PENDIENTE)
+        marca = MarcaExpiracion.objects.get()
+        self.assertEqual((marca.procesado_hasta, marca.citas_expiradas), (self.hoy, 5))
+
+    def test_la_marca_salta_lo_ya_revisado(self):
+        expirar_citas_vencidas()
+        # Una cita anterior a la marca (por ejemplo cargada a mano) no se
+        # vuelve a revisar salvo con ``completo``.
+        antigua = self._cita(self.hoy - timedelta(days=10), time(9))
+        estados = self._estados()
+        self.assertEqual(expirar_citas_vencidas(), 0)
+        self.assertEqual(self._estados(), estados)
+        self.assertEqual(expirar_citas_vencidas(completo=True), 1)
+        antigua.refresh_from_db()
+        self.assertEqual(antigua.estado, Cita.Estado.CANCELADA)
+        self.assertEqual(MarcaExpiracion.objects.get().citas_expiradas, 6)
+
+    def test_disponibilidad_de_recepcion_no_escribe(self):
+        recep_user = User.objects.create_user("recep")
+        Recepcionista.objects.create(perfil=recep_user.perfil, rut="5-1", telefono="5")
+        client = Client()
+        client.force_login(recep_user)
+        ayer = self.hoy - timedelta(days=1)
+        with CaptureQueriesContext(connection) as consultas:
+            response = client.get(
+                reverse("usuarios:recep_disponibilidad_api"),
+                {"year": ayer.year, "month": ayer.month},
+            )
+        self.assertEqual(response.status_code, 200)
+        escrituras = [
+            q["sql"]
+            for q in consultas
+            if q["sql"].startswith(("INSERT", "UPDATE", "DELETE"))
+            and "django_session" not in q["sql"]
+        ]
+        self.assertEqual(escrituras, [])
+        self.assertFalse(MarcaExpiracion.objects.exists())
+        vencidas = Cita.objects.filter(pk__in=[c.pk for c in self.vencidas])
+        self.assertEqual(set(vencidas.values_list("estado", flat=True)), {Cita.Estado.PENDIENTE})
+
+
+class ReplanificacionTests(TestCase):
+    """Reasignacion en lote de las citas de un veterinario que no atendera."""
+
+    def setUp(self):
+        self.vet_a, self.vet_b = (
+            Veterinario.objects.create(
+                perfil=User.objects.create_user(f"vet{n}").perfil, rut=f"{n}-1", telefono=str(n)
+            )
+            for n in range(2)
+        )
+        cliente_user = User.objects.create_user("cliente")
+        self.cliente = Cliente.objects.create(
+            perfil=cliente_user.perfil, rut="3-5", direccion="x", telefono="3"
+        )
+        self.mascota = Mascota.objects.create(cliente=self.cliente, nombre="Toby", tipo="perro")
+        self.consulta = Servicio.objects.create(nombre="Consulta", duracion_min=30)
+        # 50 minutos ocupan cuatro slots completos.
+        self.cirugia = Servicio.objects.create(nombre="Cirugia", duracion_min=50)
+        self.dia = timezone.localdate() + timedelta(days=2)
+        self.siguiente = self.dia + timedelta(days=1)
+        for vet, fecha, fin in (
+            (self.vet_a, self.dia, time(12)),
+            (self.vet_b, self.dia, time(11)),
+            (self.vet_b, self.siguiente, time(12)),
+        ):
+            DisponibilidadVeterinario.objects.create(
+                veterinario=vet, fecha=fecha, hora_inicio=time(9), hora_fin=fin
+            )
+        self._cita(self.vet_b, self.dia, time(9), self.consulta)
+        self.citas = [
+            self._cita(self.vet_a, self.dia, time(9), self.consulta),
+            self._cita(self.vet_a, self.dia, time(10), self.cirugia),
+            self._cita(self.vet_a, self.dia, time(11), self.consulta),
+        ]
+
+    def _cita(self, vet, fecha, hora, servicio):
+        return Cita.objects.create(
+            veterinario=vet,
+            cliente=self.cliente,
+            mascota=self.mascota,
+            servicio=servicio,
+            fecha=fecha,
+            hora=hora,
+        )
+
+    def _proponer(self, **kwargs):
+        return proponer_replanificacion(self.vet_a.id, self.dia, self.dia, **kwargs)
+
+    def test_propone_el_inicio_mas_cercano_sin_reusar_slots(self):
+        destinos = [
+            (p["cita"], p["veterinario_id"], p["fecha"], p["hora"], p["hora_fin"])
+            for p in self._proponer()
+        ]
+        self.assertEqual(
+            destinos,
+            [
+                (self.citas[0], self.vet_b.id, self.dia, time(9, 30), time(10)),
+                # La cirugia dura una hora completa y toma el hueco que quedo.
+                (self.citas[1], self.vet_b.id, self.dia, time(10), time(11)),
+                (self.citas[2], self.vet_b.id, self.siguiente, time(11), time(11, 30)),
+            ],
+        )
+        # Proponer no escribe nada.
+        self.assertEqual(Cita.objects.count(), 4)
+
+    def test_citas_ya_empezadas_no_se_mueven(self):
+        ahora = timezone.make_aware(datetime.combine(self.dia, time(10, 30)))
+        propuestas = self._proponer(ahora=ahora)
+        self.assertEqual([p["cita"] for p in propuestas], [self.citas[2]])
+        # El destino tampoco puede quedar antes de ``ahora``.
+        destino = (propuestas[0]["fecha"], propuestas[0]["hora"])
+        self.assertEqual(destino, (self.siguiente, time(11)))
+
+    def test_sin_lugar_dentro_del_horizonte(self):
+        propuestas = self._proponer(horizonte_dias=0)
+        self.assertIsNone(propuestas[2]["veterinario_id"])
+        self.assertIsNone(propuestas[2]["hora"])
+        nuevas = aplicar_replanificacion(propuestas)
+        self.assertEqual(len(nuevas), 2)
+        self.citas[2].refresh_from_db()
+        self.assertEqual(self.citas[2].estado, Cita.Estado.PENDIENTE)
+
+    def test_aplicar_reasigna_y_avisa_a_la_sincronizacion(self):
+        token = emitir_token()
+        propuestas = self._proponer()
+        nuevas = aplicar_replanificacion(propuestas)
+        self.assertEqual([p["nueva"] for p in propuestas], nuevas)
+        for cita in self.citas:
+            cita.refresh_from_db()
+            self.assertEqual(cita.estado, Cita.Estado.CANCELADA)
+            self.assertEqual(cita.cancelado_por, "replanificada")
+        self.assertEqual(
+            sorted(ReservaSlot.objects.filter(cita__in=nuevas).values_list("fecha", "slot")),
+            # 09:30-11:00 y 11:00-11:30 en slots de 15 minutos.
+            [(self.dia, slot) for slot in range(38, 44)]
+            + [(self.siguiente, 44), (self.siguiente, 45)],
+        )
+        self.assertFalse(ReservaSlot.objects.filter(cita__in=self.citas).exists())
+        libres_a = FranjaLibre.objects.filter(veterinario=self.vet_a, fecha=self.dia)
+        self.assertEqual(
+            list(libres_a.values_list("hora_inicio", "hora_fin")), [(time(9), time(12))]
+        )
+        cambios = cambios_desde(leer_token(token))
+        cambiadas = {clave[1] for clave, _ in cambios if clave[0] == "cita"}
+        self.assertLessEqual({c.id for c in self.citas} | {n.id for n in nuevas}, cambiadas)
+
+    def test_horario_tomado_despues_de_proponer_no_escribe_nada(self):
+        propuestas = self._proponer()
+        self._cita(self.vet_b, self.dia, time(10, 30), self.consulta)
+        total = Cita.objects.count()
+        with self.assertRaises(SlotOcupado):
+            aplicar_replanificacion(propuestas)
+        self.assertEqual(Cita.objects.count(), total)
+        for cita in self.citas:
+            cita.refresh_from_db()
+            self.assertEqual(cita.estado, Cita.Estado.PENDIENTE)
+        self.assertEqual(ReservaSlot.objects.filter(cita__in=self.citas).count(), 2 + 4 + 2)
+        self.assertNotIn("nueva", propuestas[0])
+
+
+class ReservaConcurrenteTests(TransactionTestCase):
+    """Muchas recepcionistas intentando agendar el mismo horario a la vez."""
+
+    HILOS = 12
+
+    def setUp(self):
+        user = User.objects.create_user("recepcion", password="clave")
+        Perfil.objects.filter(user=user).update(rol=Perfil.Roles.RECEPCIONISTA)
+        Recepcionista.objects.create(perfil=user.perfil, rut="1-9", telefono="1")
+        self.recep_user = user
+
+        vet_user = User.objects.create_user("vet", password="clave")
+        self.vet = Veterinario.objects.create(perfil=vet_user.perfil, rut="2-7", telefono="2")
+        cliente_user = User.objects.create_user("cliente", password="clave")
+        self.cliente = Cliente.objects.create(
+            perfil=cliente_user.perfil, rut="3-5", direccion="x", telefono="3"
+        )
+        self.mascota = Mascota.objects.create(cliente=self.cliente, nombre="Toby", tipo="perro")
+        self.servicio = Servicio.objects.create(nombre="Consulta", duracion_min=30)
+        self.fecha = timezone.localdate() + timedelta(days=1)
+        DisponibilidadVeterinario.objects.create(
+            veterinario=self.vet, fecha=self.fecha, hora_inicio=time(9), hora_fin=time(12)
+        )
+
+    def _agendar(self, hora, resultados):
+        client = Client()
+        client.force_login(self.recep_user)
+        payload = {
+            "cliente_id": self.cliente.id,
+            "mascota_id": self.mascota.id,
+            "servicio_id": self.servicio.id,
+            "veterinario_id": self.vet.id,
+            "fecha": self.fecha.isoformat(),
+            "hora": hora,
+        }
+        try:
+            resp = client.post(
+                reverse("usuarios:recep_cita_create_api"),
+                json.dumps(payload),
+                content_type="application/json",
+            )
+            resultados.append(resp.status_code)
+        finally:
+            connection.close()
+
+    def _rafaga(self, horas):
+        resultados = []
+        barrera = threading.Barrier(len(horas))
+
+        def tarea(hora):
+            barrera.wait()
+            self._agendar(hora, resultados)
+
+        hilos = [threading.Thread(target=tarea, args=(hora,)) for hora in horas]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return resultados
+
+    def test_mismo_slot_se_agenda_una_sola_vez(self):
+        resultados = self._rafaga(["10:00"] * self.HILOS)
+        self.assertEqual(resultados.count(201), 1, resultados)
+        self.assertEqual(len(resultados), self.HILOS)
+        self.assertTrue(all(codigo in (201, 400, 409) for codigo in resultados), resultados)
+        activas = Cita.objects.filter(veterinario=self.vet, fecha=self.fecha).exclude(
+            estado=Cita.Estado.CANCELADA
+        )
+        self.assertEqual(activas.count(), 1)
+        self.assertEqual(ReservaSlot.objects.count(), 2)
+
+    def test_slots_traslapados_no_se_duplican(self):
+        # 10:00 y 10:15 comparten el slot de 10:15 con una duracion de 30 min.
+        resultados = self._rafaga(["10:00", "10:15"] * (self.HILOS // 2))
+        self.assertEqual(resultados.count(201), 1, resultados)
+        slots = list(ReservaSlot.objects.values_list("slot", flat=True))
+        self.assertEqual(len(slots), len(set(slots)))
+
+    def test_cancelar_libera_el_horario(self):
+        resultados = self._rafaga(["10:00"])
+        self.assertEqual(resultados, [201])
+        cita = Cita.objects.get()
+        cita.estado = Cita.Estado.CANCELADA
+        cita.save(update_fields=["estado", "actualizado_en"])
+        self.assertFalse(ReservaSlot.objects.exists())
+        self.assertEqual(self._rafaga(["10:00"]), [201])
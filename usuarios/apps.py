@@ -8,3 +8,5 @@ class UsuariosConfig(AppConfig):
     def ready(self):
         # Importa señales para crear Perfil automático al crear usuarios.
         from . import models  # noqa: F401
+        # Mantiene el indice de busqueda de clientes.
+        from . import signals  # noqa: F401
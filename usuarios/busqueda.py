@@ -0,0 +1,175 @@
+"""
+Indice de busqueda de clientes para recepcion.
+
+En SQLite se usa una tabla virtual FTS5 con una fila por cliente (rowid =
+Cliente.id) que junta nombre, email, RUT, telefono y nombres de mascotas.
+La consulta busca cada palabra como prefijo y ordena por bm25, asi la caja de
+busqueda no recorre auth_user, Cliente y Mascota con LIKE en cada tecla.
+
+El indice se mantiene desde usuarios.signals y se puede rehacer con
+``manage.py reconstruir_busqueda``. En otros motores ``disponible()`` es
+False y las vistas vuelven a la busqueda con icontains.
+"""
+
+import re
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from .models import Cliente, Mascota
+
+TABLA = "usuarios_busqueda_cliente"
+COLUMNAS = ("nombre", "email", "rut", "telefono", "mascotas")
+# Peso de cada columna en bm25, en el mismo orden de COLUMNAS.
+PESOS = (10.0, 2.0, 6.0, 6.0, 4.0)
+TAMANO_LOTE = 2000
+
+CREAR_TABLA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA} USING fts5("
+    f"{', '.join(COLUMNAS)}, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+
+
+def disponible():
+    return connection.vendor == "sqlite"
+
+
+def _digitos(valor):
+    return re.sub(r"\D", "", valor or "")
+
+
+def _variantes_telefono(telefono):
+    digitos = _digitos(telefono)
+    variantes = [telefono or "", digitos]
+    # Se indexa tambien sin el codigo de pais para encontrar "9 1234 5678".
+    if digitos.startswith("56"):
+        variantes.append(digitos[2:])
+    return " ".join(variantes)
+
+
+def _documentos(cliente_ids):
+    """Filas (rowid, nombre, email, rut, telefono, mascotas) de los clientes."""
+    mascotas = {}
+    for cliente_id, nombre in Mascota.objects.filter(cliente_id__in=cliente_ids).values_list(
+        "cliente_id", "nombre"
+    ):
+        mascotas.setdefault(cliente_id, []).append(nombre)
+    filas = Cliente.objects.filter(id__in=cliente_ids).values_list(
+        "id",
+        "perfil__user__first_name",
+        "perfil__user__last_name",
+        "perfil__user__username",
+        "perfil__user__email",
+        "rut",
+        "telefono",
+    )
+    return [
+        (
+            cliente_id,
+            f"{first} {last} {username}",
+            email or "",
+            f"{rut} {_digitos(rut)}",
+            _variantes_telefono(telefono),
+            " ".join(mascotas.get(cliente_id, [])),
+        )
+        for cliente_id, first, last, username, email, rut, telefono in filas
+    ]
+
+
+def indexar_clientes(cliente_ids):
+    """Reescribe las filas del indice de los clientes indicados."""
+    cliente_ids = [cliente_id for cliente_id in set(cliente_ids) if cliente_id]
+    if not cliente_ids or not disponible():
+        return
+    marcas = ", ".join(["%s"] * len(cliente_ids))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLA} WHERE rowid IN ({marcas})", cliente_ids)
+        cursor.executemany(
+            f"INSERT INTO {TABLA} (rowid, {', '.join(COLUMNAS)}) VALUES (%s, %s, %s, %s, %s, %s)",
+            _documentos(cliente_ids),
+        )
+
+
+def quitar_cliente(cliente_id):
+    if not disponible():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLA} WHERE rowid = %s", [cliente_id])
+
+
+def reconstruir_indice():
+    """
+    Vacia y vuelve a llenar el indice por lotes. Devuelve cuantos clientes
+    indexo.
+    """
+    if not disponible():
+        return 0
+    total = 0
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(CREAR_TABLA)
+            cursor.execute(f"DELETE FROM {TABLA}")
+        ids = list(Cliente.objects.order_by("id").values_list("id", flat=True))
+        for inicio in range(0, len(ids), TAMANO_LOTE):
+            lote = ids[inicio : inicio + TAMANO_LOTE]
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f"INSERT INTO {TABLA} (rowid, {', '.join(COLUMNAS)}) "
+                    "VALUES (%s, %s, %s, %s, %s, %s)",
+                    _documentos(lote),
+                )
+            total += len(lote)
+    return total
+
+
+def expresion(q):
+    """
+    Consulta FTS5 donde cada palabra de ``q`` debe aparecer como prefijo.
+    Devuelve "" si ``q`` no tiene palabras.
+    """
+    palabras = re.findall(r"\w+", q.lower())
+    return " ".join(f'"{palabra}"*' for palabra in palabras)
+
+
+def buscar(q, limite, despues=None):
+    """
+    Clientes que calzan con ``q`` como pares ``(id, puntaje)``, del mas al
+    menos relevante (puntaje bm25 ascendente, id para desempatar). Con
+    ``despues=(puntaje, id)`` sigue desde esa fila sin OFFSET.
+    """
+    consulta = expresion(q)
+    if not consulta:
+        return []
+    # bm25() solo se puede calcular en la consulta que hace el MATCH.
+    sql = (
+        f"SELECT rowid, puntaje FROM (SELECT rowid, bm25({TABLA}, {', '.join(map(str, PESOS))}) "
+        f"AS puntaje FROM {TABLA} WHERE {TABLA} MATCH %s)"
+    )
+    params = [consulta]
+    if despues is not None:
+        sql += " WHERE puntaje > %s OR (puntaje = %s AND rowid > %s)"
+        params += [despues[0], despues[0], despues[1]]
+    with connection.cursor() as cursor:
+        cursor.execute(f"{sql} ORDER BY puntaje, rowid LIMIT %s", [*params, limite])
+        return cursor.fetchall()
+
+
+def contar(q, tope):
+    """Cantidad de clientes que calzan con ``q``, cortada en ``tope + 1``."""
+    consulta = expresion(q)
+    if not consulta:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT COUNT(*) FROM (SELECT rowid FROM {TABLA} WHERE {TABLA} MATCH %s LIMIT %s)",
+            [consulta, tope + 1],
+        )
+        return cursor.fetchone()[0]
+
+
+def filtro_ids(q):
+    """Expresion para ``id__in`` con los clientes que calzan con ``q``."""
+    consulta = expresion(q)
+    if not consulta:
+        return RawSQL(f"SELECT rowid FROM {TABLA} WHERE 0", [])
+    return RawSQL(f"SELECT rowid FROM {TABLA} WHERE {TABLA} MATCH %s", [consulta])
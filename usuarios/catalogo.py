@@ -0,0 +1,117 @@
+"""
+Catalogo de servicios (secciones y servicios) en cache.
+
+Lo leen los dashboards de cliente, recepcion y administrador y la API de
+servicios de recepcion, pero solo cambia cuando un administrador lo edita.
+Se guarda ya serializado (dicts y listas) en la cache ``default`` bajo una
+clave con numero de version; guardar o eliminar un Servicio o una
+ServicioSeccion sube la version (ver usuarios.signals), y las entradas
+viejas quedan sin uso hasta que expiran. Leerlo cuesta dos lecturas de
+cache y ninguna consulta.
+
+La version vive en la cache ``catalogo`` si esta definida en CACHES. Con
+``default`` en memoria local cada proceso tiene su copia del catalogo, pero
+todos leen la misma version: un cambio hecho en un worker se ve en los
+demas en su siguiente lectura. Sin ese alias la version queda en
+``default`` y, por proceso, otro worker puede tardar hasta
+``CATALOGO_SERVICIOS_TIMEOUT`` en verlo.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import transaction
+
+from .models import Servicio, ServicioSeccion
+
+ALIAS_VERSION = "catalogo"
+CLAVE_VERSION = "usuarios:catalogo:version"
+CAMPOS_SECCION = ("id", "nombre", "descripcion", "orden", "activo")
+CAMPOS_SERVICIO = (
+    "id",
+    "nombre",
+    "descripcion",
+    "seccion_id",
+    "precio_referencial",
+    "unidad_precio",
+    "duracion_minutos",
+    "duracion_min",
+    "destacado",
+    "etiquetas",
+    "activo",
+)
+
+
+def _timeout():
+    return getattr(settings, "CATALOGO_SERVICIOS_TIMEOUT", 300)
+
+
+def _cache_version():
+    return caches[ALIAS_VERSION] if ALIAS_VERSION in settings.CACHES else cache
+
+
+def _construir():
+    secciones = [dict(s, servicios=[]) for s in ServicioSeccion.objects.values(*CAMPOS_SECCION)]
+    por_id = {s["id"]: s for s in secciones}
+    sin_seccion = []
+    for servicio in Servicio.objects.order_by("id").values(*CAMPOS_SERVICIO):
+        seccion = por_id.get(servicio["seccion_id"])
+        servicio["seccion"] = seccion["nombre"] if seccion else ""
+        servicio["seccion_activa"] = bool(seccion and seccion["activo"])
+        (seccion["servicios"] if seccion else sin_seccion).append(servicio)
+    sin_seccion.sort(key=_por_nombre)
+    return {"secciones": secciones, "sin_seccion": sin_seccion}
+
+
+def _por_nombre(servicio):
+    return (servicio["nombre"], servicio["id"])
+
+
+def catalogo():
+    """
+    ``{"secciones": [...], "sin_seccion": [...]}`` con todas las secciones
+    (en el orden del modelo) y todos los servicios, activos o no. Cada
+    servicio trae ademas ``seccion`` (nombre) y ``seccion_activa``.
+    """
+    # Una version nueva parte del reloj: nunca reusa una entrada antigua.
+    version = _cache_version().get_or_set(CLAVE_VERSION, time.time_ns, None)
+    clave = f"usuarios:catalogo:{version}"
+    datos = cache.get(clave)
+    if datos is None:
+        datos = _construir()
+        cache.set(clave, datos, _timeout())
+    return datos
+
+
+def secciones_activas():
+    return [s for s in catalogo()["secciones"] if s["activo"]]
+
+
+def servicios_activos():
+    """Servicios activos de secciones activas, por nombre."""
+    datos = catalogo()
+    return sorted(
+        (
+            servicio
+            for seccion in datos["secciones"]
+            if seccion["activo"]
+            for servicio in seccion["servicios"]
+            if servicio["activo"]
+        ),
+        key=_por_nombre,
+    )
+
+
+def _subir_version():
+    versiones = _cache_version()
+    try:
+        versiones.incr(CLAVE_VERSION)
+    except ValueError:
+        # La version ya no estaba en cache: la proxima lectura empieza otra.
+        versiones.delete(CLAVE_VERSION)
+
+
+def invalidar():
+    """Descarta el catalogo en cache al confirmarse la transaccion en curso."""
+    transaction.on_commit(_subir_version)
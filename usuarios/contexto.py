@@ -0,0 +1,125 @@
+"""
+Contexto de rol del usuario logueado: perfil, rol y objeto del rol
+(Cliente, Veterinario, Recepcionista o Administrador).
+
+Las guardas de las APIs y los mixins de dashboards lo piden en cada
+peticion. ``ContextoRolMiddleware`` lo resuelve una sola vez por peticion
+y ademas lo guarda en la sesion, asi las peticiones siguientes no vuelven
+a consultar Perfil ni la tabla del rol. El objeto del rol se arma solo con
+su id y el del perfil; el resto de sus campos se carga si una vista los
+lee.
+
+La entrada de sesion se borra cuando cambia el rol del perfil o cuando se
+elimina el objeto del rol (ver usuarios.signals). Solo se guarda en
+sesion con el backend de sesiones en base de datos, el unico donde se
+pueden buscar y limpiar las sesiones de otro usuario.
+"""
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
+
+from .models import Administrador, Cliente, Perfil, Recepcionista, Veterinario
+
+CLAVE_SESION = "_contexto_rol"
+MODELOS_ROL = {
+    Perfil.Roles.CLIENTE: Cliente,
+    Perfil.Roles.VETERINARIO: Veterinario,
+    Perfil.Roles.RECEPCIONISTA: Recepcionista,
+    Perfil.Roles.ADMINISTRADOR: Administrador,
+}
+BACKEND_SESION_BASE = "django.contrib.sessions.backends.db"
+
+
+class ContextoRol:
+    """Ids del usuario, su perfil y su objeto de rol; todos None si es anonimo."""
+
+    def __init__(self, user_id=None, perfil_id=None, rol=None, objeto_id=None):
+        self.user_id = user_id
+        self.perfil_id = perfil_id
+        self.rol = rol
+        self.objeto_id = objeto_id
+        self._objeto = None
+
+    @property
+    def objeto(self):
+        """Instancia del rol con solo id y perfil cargados, o None."""
+        if self.objeto_id is None:
+            return None
+        if self._objeto is None:
+            self._objeto = MODELOS_ROL[self.rol].from_db(
+                DEFAULT_DB_ALIAS, ["id", "perfil_id"], [self.objeto_id, self.perfil_id]
+            )
+        return self._objeto
+
+    def como_sesion(self):
+        return [self.user_id, self.perfil_id, self.rol, self.objeto_id]
+
+
+def _sesion_guarda_contexto():
+    return settings.SESSION_ENGINE == BACKEND_SESION_BASE
+
+
+def _resolver(request):
+    user = request.user
+    if not user.is_authenticated:
+        return ContextoRol()
+    sesion = getattr(request, "session", None)
+    guardado = sesion.get(CLAVE_SESION) if sesion is not None else None
+    if guardado and guardado[0] == user.pk:
+        return ContextoRol(*guardado)
+    perfil = Perfil.objects.filter(user=user).values_list("id", "rol").first()
+    if perfil is None:
+        contexto = ContextoRol(user.pk)
+    else:
+        perfil_id, rol = perfil
+        modelo = MODELOS_ROL.get(rol)
+        objeto_id = None
+        if modelo is not None:
+            objeto_id = modelo.objects.filter(perfil_id=perfil_id).values_list("id", flat=True).first()
+        contexto = ContextoRol(user.pk, perfil_id, rol, objeto_id)
+    # Sin perfil u objeto de rol no se guarda: asi crearlos no necesita
+    # invalidar nada.
+    if contexto.objeto_id is not None and sesion is not None and _sesion_guarda_contexto():
+        sesion[CLAVE_SESION] = contexto.como_sesion()
+    return contexto
+
+
+def contexto_rol(request):
+    """
+    ContextoRol de ``request``. Sin el middleware (peticiones armadas a mano)
+    se resuelve igual y queda guardado en el request.
+    """
+    contexto = getattr(request, "contexto_rol", None)
+    if contexto is None:
+        contexto = request.contexto_rol = _resolver(request)
+    return contexto
+
+
+class ContextoRolMiddleware(MiddlewareMixin):
+    """Deja ``request.contexto_rol`` perezoso; va despues de AuthenticationMiddleware."""
+
+    def process_request(self, request):
+        request.contexto_rol = SimpleLazyObject(lambda: _resolver(request))
+
+
+def invalidar_usuario(user_id):
+    """
+    Quita el contexto guardado en las sesiones vigentes de ``user_id``. Los
+    cambios de rol son raros (acciones de administracion), asi que recorrer
+    las sesiones abiertas es aceptable.
+    """
+    if not _sesion_guarda_contexto():
+        return
+    store = SessionStore()
+    for sesion in Session.objects.filter(expire_date__gt=timezone.now()).iterator():
+        datos = store.decode(sesion.session_data)
+        if CLAVE_SESION in datos and str(datos.get(SESSION_KEY)) == str(user_id):
+            del datos[CLAVE_SESION]
+            sesion.session_data = store.encode(datos)
+            sesion.save(update_fields=["session_data"])
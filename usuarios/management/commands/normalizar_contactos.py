@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from usuarios.models import Cliente
+from usuarios.normalizacion import rellenar_normalizados
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula las columnas normalizadas de RUT y telefono de los clientes "
+        "(por ejemplo tras cargas masivas que no pasan por save())."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=1000, help="Filas por escritura.")
+
+    def handle(self, *args, **options):
+        cambiadas = rellenar_normalizados(Cliente, options["lote"])
+        self.stdout.write(f"{Cliente._meta.verbose_name_plural}: {cambiadas}")
+        self.stdout.write(self.style.SUCCESS("Normalizacion completa."))
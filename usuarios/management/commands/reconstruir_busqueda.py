@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from usuarios.busqueda import disponible, reconstruir_indice
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye el indice de busqueda de clientes (nombre, email, RUT, "
+        "telefono y mascotas) usado por recepcion."
+    )
+
+    def handle(self, *args, **options):
+        if not disponible():
+            self.stdout.write("El motor de base de datos no usa indice de busqueda.")
+            return
+        total = reconstruir_indice()
+        self.stdout.write(self.style.SUCCESS(f"Clientes indexados: {total}"))
@@ -0,0 +1,86 @@
+import re
+
+from django.db import migrations
+
+# Copia congelada de usuarios.busqueda a la fecha de esta migracion: los
+# cambios futuros a ese modulo no deben alterarla.
+TABLA = "usuarios_busqueda_cliente"
+COLUMNAS = ("nombre", "email", "rut", "telefono", "mascotas")
+TAMANO_LOTE = 2000
+
+
+def _digitos(valor):
+    return re.sub(r"\D", "", valor or "")
+
+
+def _variantes_telefono(telefono):
+    digitos = _digitos(telefono)
+    variantes = [telefono or "", digitos]
+    if digitos.startswith("56"):
+        variantes.append(digitos[2:])
+    return " ".join(variantes)
+
+
+def _documentos(Cliente, Mascota, cliente_ids):
+    mascotas = {}
+    for cliente_id, nombre in Mascota.objects.filter(cliente_id__in=cliente_ids).values_list(
+        "cliente_id", "nombre"
+    ):
+        mascotas.setdefault(cliente_id, []).append(nombre)
+    filas = Cliente.objects.filter(id__in=cliente_ids).values_list(
+        "id",
+        "perfil__user__first_name",
+        "perfil__user__last_name",
+        "perfil__user__username",
+        "perfil__user__email",
+        "rut",
+        "telefono",
+    )
+    return [
+        (
+            cliente_id,
+            f"{first} {last} {username}",
+            email or "",
+            f"{rut} {_digitos(rut)}",
+            _variantes_telefono(telefono),
+            " ".join(mascotas.get(cliente_id, [])),
+        )
+        for cliente_id, first, last, username, email, rut, telefono in filas
+    ]
+
+
+def crear_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    Cliente = apps.get_model("usuarios", "Cliente")
+    Mascota = apps.get_model("usuarios", "Mascota")
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA} USING fts5("
+        f"{', '.join(COLUMNAS)}, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    ids = list(Cliente.objects.order_by("id").values_list("id", flat=True))
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLA}")
+        for inicio in range(0, len(ids), TAMANO_LOTE):
+            cursor.executemany(
+                f"INSERT INTO {TABLA} (rowid, {', '.join(COLUMNAS)}) "
+                "VALUES (%s, %s, %s, %s, %s, %s)",
+                _documentos(Cliente, Mascota, ids[inicio : inicio + TAMANO_LOTE]),
+            )
+
+
+def eliminar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(f"DROP TABLE IF EXISTS {TABLA}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0012_servicio_duracion_min'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
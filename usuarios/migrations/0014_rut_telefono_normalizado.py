@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:17
+
+import re
+
+from django.db import migrations, models
+
+
+# Copia congelada de usuarios.normalizacion a la fecha de esta migracion: los
+# cambios futuros a ese modulo no deben alterarla.
+CODIGO_PAIS = "56"
+
+
+def _normalizar_rut(valor):
+    return re.sub(r"[^\dK]", "", (valor or "").upper())
+
+
+def _normalizar_telefono(valor):
+    digitos = re.sub(r"\D", "", valor or "")
+    if not digitos:
+        return ""
+    if not digitos.startswith(CODIGO_PAIS) or len(digitos) <= 9:
+        digitos = CODIGO_PAIS + digitos
+    return f"+{digitos}"
+
+
+def rellenar(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        modelo = apps.get_model("usuarios", "Cliente")
+        tabla = schema_editor.quote_name(modelo._meta.db_table)
+        cursor.executemany(
+            f"UPDATE {tabla} SET rut_normalizado = %s, telefono_normalizado = %s WHERE id = %s",
+            [
+                (_normalizar_rut(rut), _normalizar_telefono(telefono), pk)
+                for pk, rut, telefono in modelo.objects.values_list("id", "rut", "telefono")
+            ],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0013_busqueda_cliente'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='rut_normalizado',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='telefono_normalizado',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.RunPython(rellenar, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,8 @@ from django.db import models
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
+from .normalizacion import completar_normalizados
+
 
 class Perfil(models.Model):
     class Roles(models.TextChoices):
@@ -28,10 +30,19 @@ class Cliente(models.Model):
     direccion = models.CharField(max_length=255)
     telefono = models.CharField(max_length=50)
     recibe_noticias = models.BooleanField(default=False)
+    # Copias normalizadas para buscar por igualdad o prefijo (usuarios.normalizacion)
+    rut_normalizado = models.CharField(max_length=20, blank=True, default="", editable=False, db_index=True)
+    telefono_normalizado = models.CharField(
+        max_length=20, blank=True, default="", editable=False, db_index=True
+    )
 
     def __str__(self):
         return f"Cliente {self.perfil.user.username}"
 
+    def save(self, *args, **kwargs):
+        kwargs["update_fields"] = completar_normalizados(self, kwargs.get("update_fields"))
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = "Cliente"
         verbose_name_plural = "Clientes"
@@ -0,0 +1,92 @@
+"""
+Formas normalizadas de RUT y telefono.
+
+El RUT queda como cuerpo mas digito verificador, sin puntos ni guion y con
+K mayuscula (``13.478.225-4`` -> ``134782254``). El telefono queda en
+formato E.164 chileno (``+56 9 1234 5678`` -> ``+56912345678``). Ambas
+columnas estan indexadas y permiten buscar por igualdad o prefijo sin
+recorrer la tabla.
+"""
+
+import re
+
+from django.db import connection, transaction
+
+CODIGO_PAIS = "56"
+
+_RUT = re.compile(r"\d{1,2}(\.?\d{1,3}){0,2}(-[\dkK]?)?|\d{1,9}[kK]?")
+_TELEFONO = re.compile(r"\+?[\d\s()-]+")
+
+
+def normalizar_rut(valor):
+    return re.sub(r"[^\dK]", "", (valor or "").upper())
+
+
+def normalizar_telefono(valor):
+    digitos = re.sub(r"\D", "", valor or "")
+    if not digitos:
+        return ""
+    if not digitos.startswith(CODIGO_PAIS) or len(digitos) <= 9:
+        digitos = CODIGO_PAIS + digitos
+    return f"+{digitos}"
+
+
+def parece_rut(q):
+    """True si ``q`` tiene forma de RUT, completo o a medio escribir."""
+    return bool(_RUT.fullmatch(q)) and len(normalizar_rut(q)) >= 5
+
+
+def parece_telefono(q):
+    """True si ``q`` tiene forma de telefono con al menos 6 digitos."""
+    return bool(_TELEFONO.fullmatch(q)) and len(re.sub(r"\D", "", q)) >= 6
+
+
+def completar_normalizados(instancia, update_fields=None):
+    """
+    Actualiza ``rut_normalizado`` y ``telefono_normalizado`` desde los campos
+    originales. Devuelve ``update_fields`` ampliado si se guardan solo
+    algunos campos.
+    """
+    instancia.rut_normalizado = normalizar_rut(instancia.rut)
+    instancia.telefono_normalizado = normalizar_telefono(instancia.telefono)
+    if update_fields is None:
+        return None
+    update_fields = set(update_fields)
+    if "rut" in update_fields:
+        update_fields.add("rut_normalizado")
+    if "telefono" in update_fields:
+        update_fields.add("telefono_normalizado")
+    return update_fields
+
+
+def rellenar_normalizados(modelo, tamano_lote=1000):
+    """
+    Recalcula las columnas normalizadas de todas las filas de ``modelo``.
+    Devuelve cuantas filas cambiaron. Lee cada lote completo (por rango de
+    id) antes de escribirlo, asi no se actualiza la tabla que se esta
+    recorriendo con un cursor abierto. Escribe con un UPDATE por id via
+    executemany: bulk_update arma un CASE por fila y con decenas de miles de
+    filas el costo se va en compilar la consulta.
+    """
+    tabla = connection.ops.quote_name(modelo._meta.db_table)
+    sql = f"UPDATE {tabla} SET rut_normalizado = %s, telefono_normalizado = %s WHERE id = %s"
+    filas = modelo.objects.order_by("id").values_list(
+        "id", "rut", "telefono", "rut_normalizado", "telefono_normalizado"
+    )
+    cambiadas = 0
+    ultimo = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        while True:
+            lote = list(filas.filter(id__gt=ultimo)[:tamano_lote])
+            if not lote:
+                break
+            ultimo = lote[-1][0]
+            pendientes = []
+            for pk, rut, telefono, rut_actual, telefono_actual in lote:
+                nuevos = (normalizar_rut(rut), normalizar_telefono(telefono))
+                if nuevos != (rut_actual, telefono_actual):
+                    pendientes.append((*nuevos, pk))
+            if pendientes:
+                cursor.executemany(sql, pendientes)
+                cambiadas += len(pendientes)
+    return cambiadas
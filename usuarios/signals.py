@@ -0,0 +1,71 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from . import catalogo
+from .busqueda import indexar_clientes, quitar_cliente
+from .contexto import MODELOS_ROL, invalidar_usuario
+from .models import Cliente, Mascota, Perfil, Servicio, ServicioSeccion
+
+
+def indexar_usuario(sender, instance, update_fields=None, **kwargs):
+    # Cada login guarda solo last_login, que no esta en el indice.
+    if update_fields is not None and set(update_fields) == {"last_login"}:
+        return
+    indexar_clientes(Cliente.objects.filter(perfil__user=instance).values_list("id", flat=True))
+
+
+def indexar_cliente(sender, instance, **kwargs):
+    indexar_clientes([instance.id])
+
+
+def desindexar_cliente(sender, instance, **kwargs):
+    quitar_cliente(instance.id)
+
+
+def indexar_mascota(sender, instance, **kwargs):
+    indexar_clientes([instance.cliente_id])
+
+
+def invalidar_catalogo(sender, **kwargs):
+    catalogo.invalidar()
+
+
+def recordar_rol_anterior(sender, instance, update_fields=None, **kwargs):
+    instance._rol_anterior = instance.rol
+    if update_fields is not None and "rol" not in update_fields:
+        return
+    if instance.pk:
+        instance._rol_anterior = (
+            Perfil.objects.filter(pk=instance.pk).values_list("rol", flat=True).first()
+        )
+
+
+def invalidar_contexto_perfil(sender, instance, created, **kwargs):
+    if not created and instance._rol_anterior != instance.rol:
+        invalidar_usuario(instance.user_id)
+
+
+def invalidar_contexto_rol(sender, instance, **kwargs):
+    user_id = Perfil.objects.filter(pk=instance.perfil_id).values_list("user_id", flat=True).first()
+    if user_id is not None:
+        invalidar_usuario(user_id)
+
+
+post_save.connect(indexar_usuario, sender=User, dispatch_uid="busqueda_usuario")
+post_save.connect(indexar_cliente, sender=Cliente, dispatch_uid="busqueda_cliente")
+post_delete.connect(desindexar_cliente, sender=Cliente, dispatch_uid="busqueda_cliente_delete")
+post_save.connect(indexar_mascota, sender=Mascota, dispatch_uid="busqueda_mascota")
+post_delete.connect(indexar_mascota, sender=Mascota, dispatch_uid="busqueda_mascota_delete")
+
+pre_save.connect(recordar_rol_anterior, sender=Perfil, dispatch_uid="contexto_rol_pre_perfil")
+post_save.connect(invalidar_contexto_perfil, sender=Perfil, dispatch_uid="contexto_rol_perfil")
+for _modelo in MODELOS_ROL.values():
+    post_delete.connect(
+        invalidar_contexto_rol, sender=_modelo, dispatch_uid=f"contexto_rol_{_modelo.__name__}"
+    )
+
+for _modelo in (Servicio, ServicioSeccion):
+    post_save.connect(invalidar_catalogo, sender=_modelo, dispatch_uid=f"catalogo_{_modelo.__name__}")
+    post_delete.connect(
+        invalidar_catalogo, sender=_modelo, dispatch_uid=f"catalogo_delete_{_modelo.__name__}"
+    )
@@ -1,3 +1,1108 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import time as reloj
+import tracemalloc
+import unittest
+import warnings
+from datetime import date, time, timedelta
+from unittest import mock
+from urllib.parse import urlencode
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.contrib.auth.models import User, update_last_login
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.db import connection
+from django.http import HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+from django.utils import timezone
+
+from agenda.eventos import broker
+from agenda.expiracion import expirar_citas_vencidas
+from agenda.models import Cita
+from agenda.sincronizacion import cambios_desde, emitir_token
+from veterinarios.models import DiaBloqueadoVeterinario, DisponibilidadVeterinario
+from webapp_pochita.asgi import application
+
+from . import busqueda, catalogo, views
+from .contexto import CLAVE_SESION
+from .normalizacion import rellenar_normalizados
+from .models import (
+    Cliente,
+    Mascota,
+    Perfil,
+    Recepcionista,
+    Servicio,
+    ServicioSeccion,
+    Veterinario,
+)
+from .views import _serialize_cita, _serialize_citas
+
+
+def _crear_base():
+    vet_user = User.objects.create_user("vet", first_name="Ana", last_name="Rojas")
+    vet = Veterinario.objects.create(perfil=vet_user.perfil, rut="2-7", telefono="2")
+    sin_nombre = User.objects.create_user("vet_sin_nombre")
+    vet_sin_nombre = Veterinario.objects.create(perfil=sin_nombre.perfil, rut="4-3", telefono="4")
+    cliente_user = User.objects.create_user("cliente", first_name="Luis")
+    cliente = Cliente.objects.create(
+        perfil=cliente_user.perfil, rut="3-5", direccion="x", telefono="+56 9 1234 5678"
+    )
+    mascotas = [
+        Mascota.objects.create(cliente=cliente, nombre="Toby", tipo="perro", edad_aproximada=4),
+        Mascota.objects.create(cliente=cliente, nombre="Michi", tipo="gato"),
+    ]
+    servicios = [
+        Servicio.objects.create(nombre="Consulta", duracion_min=30),
+        Servicio.objects.create(nombre="Cirugia", duracion_min=0, duracion_minutos=50),
+    ]
+    return [vet, vet_sin_nombre], cliente, mascotas, servicios
+
+
+class SerializacionCitasTests(TestCase):
+    """La serializacion por proyeccion debe dar el mismo JSON que la de modelos."""
+
+    def test_mismo_json_que_serialize_cita(self):
+        vets, cliente, mascotas, servicios = _crear_base()
+        fecha = date(2025, 3, 10)
+        for n, servicio in enumerate([*servicios, None]):
+            Cita.objects.create(
+                veterinario=vets[n % 2],
+                cliente=cliente,
+                mascota=mascotas[n % 2],
+                servicio=servicio,
+                fecha=fecha + timedelta(days=n),
+                hora=time(9, 15 * n),
+                notas="Control" if n else "",
+            )
+        cancelada = Cita.objects.first()
+        cancelada.estado = Cita.Estado.CANCELADA
+        cancelada.motivo_cancelacion = "Emergencia"
+        cancelada.cancelado_por = "veterinario"
+        cancelada.save()
+        # Citas antiguas sin hora_fin: se calcula desde la duracion del servicio.
+        Cita.objects.filter(servicio__isnull=False).update(hora_fin=None)
+
+        qs = Cita.objects.order_by("fecha", "hora")
+        esperado = [
+            _serialize_cita(c)
+            for c in qs.select_related(
+                "cliente__perfil__user", "mascota", "servicio", "veterinario__perfil__user"
+            )
+        ]
+        self.assertEqual(json.dumps(_serialize_citas(qs)), json.dumps(esperado))
+
+
+@unittest.skipUnless(os.environ.get("POCHITA_BENCH"), "benchmark: definir POCHITA_BENCH=1")
+class SerializacionCitasBenchmark(TestCase):
+    """Compara tiempo y memoria de ambas serializaciones con 10k citas."""
+
+    CITAS = 10_000
+
+    @classmethod
+    def setUpTestData(cls):
+        vets, cliente, mascotas, servicios = _crear_base()
+        inicio = date(2024, 1, 1)
+        Cita.objects.bulk_create(
+            Cita(
+                veterinario=vets[n % 2],
+                cliente=cliente,
+                mascota=mascotas[n % 2],
+                servicio=servicios[n % 2],
+                fecha=inicio + timedelta(days=n // 20),
+                hora=time(8 + (n % 20) // 2, 30 * (n % 2)),
+                hora_fin=time(8 + (n % 20) // 2, 30 * (n % 2) + 15),
+            )
+            for n in range(cls.CITAS)
+        )
+
+    def _medir(self, serializar):
+        # La memoria se mide en una segunda pasada: tracemalloc infla el tiempo.
+        inicio = reloj.process_time()
+        data = serializar()
+        cpu = reloj.process_time() - inicio
+        tracemalloc.start()
+        serializar()
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return data, cpu, pico
+
+    def test_comparacion(self):
+        qs = Cita.objects.order_by("fecha", "hora")
+        modelos, cpu_modelos, mem_modelos = self._medir(
+            lambda: [
+                _serialize_cita(c)
+                for c in qs.select_related(
+                    "cliente__perfil__user", "mascota", "servicio", "veterinario__perfil__user"
+                )
+            ]
+        )
+        proyeccion, cpu_proyeccion, mem_proyeccion = self._medir(lambda: _serialize_citas(qs))
+        self.assertEqual(proyeccion, modelos)
+        print(
+            f"\n{self.CITAS} citas: modelos {cpu_modelos * 1000:.0f} ms / {mem_modelos / 2**20:.1f} MiB, "
+            f"proyeccion {cpu_proyeccion * 1000:.0f} ms / {mem_proyeccion / 2**20:.1f} MiB"
+        )
+
+
+class EventosAgendaTests(TransactionTestCase):
+    """
+    Avisos en vivo por Server-Sent Events, servidos por la aplicacion ASGI.
+    El handler ASGI atiende cada peticion en su propio hilo, asi que los
+    datos del test deben estar confirmados.
+    """
+
+    def setUp(self):
+        vets, self.cliente, self.mascotas, _servicios = _crear_base()
+        self.vet = vets[0]
+        self.url = reverse("usuarios:vet_eventos_api")
+
+    def test_sin_asgi_responde_204(self):
+        self.client.force_login(self.vet.perfil.user)
+        self.assertEqual(self.client.get(self.url).status_code, 204)
+
+    def _crear_cita(self, fecha):
+        Cita.objects.create(
+            veterinario=self.vet,
+            cliente=self.cliente,
+            mascota=self.mascotas[0],
+            fecha=fecha,
+            hora=time(10, 0),
+        )
+
+    async def test_flujo_avisa_cambio_de_cita(self):
+        await sync_to_async(self.client.force_login)(self.vet.perfil.user)
+        sesion = self.client.cookies["sessionid"].value
+        comunicador = ApplicationCommunicator(
+            application,
+            {
+                "type": "http",
+                "method": "GET",
+                "path": self.url,
+                "query_string": b"",
+                "headers": [
+                    (b"host", b"testserver"),
+                    (b"cookie", f"sessionid={sesion}".encode()),
+                ],
+            },
+        )
+        await comunicador.send_input({"type": "http.request", "body": b""})
+        inicio = await comunicador.receive_output(5)
+        self.assertEqual(inicio["status"], 200)
+        self.assertIn((b"Content-Type", b"text/event-stream"), inicio["headers"])
+        retry = await comunicador.receive_output(5)
+        self.assertTrue(retry["body"].startswith(b"retry:"))
+
+        await sync_to_async(self._crear_cita)(date(2025, 3, 10))
+        mensaje = (await comunicador.receive_output(5))["body"].decode()
+        self.assertIn("event: agenda\n", mensaje)
+        data = json.loads(mensaje.split("data: ", 1)[1])
+        self.assertEqual((data["veterinario_id"], data["fecha"]), (self.vet.id, "2025-03-10"))
+
+        await comunicador.send_input({"type": "http.disconnect"})
+        await comunicador.wait(5)
+        await asyncio.sleep(0)
+        self.assertFalse(broker.hay_suscripciones())
+
+
+def _crear_agenda_recepcion():
+    """Base de _crear_base con una recepcionista y agenda desde hoy."""
+    vets, cliente, mascotas, servicios = _crear_base()
+    recep_user = User.objects.create_user("recep", first_name="Eva")
+    Recepcionista.objects.create(perfil=recep_user.perfil, rut="5-1", telefono="5")
+    hoy = timezone.now().date()
+    for n in range(6):
+        DisponibilidadVeterinario.objects.create(
+            veterinario=vets[n % 2],
+            fecha=hoy + timedelta(days=n),
+            hora_inicio=time(9, 0),
+            hora_fin=time(13, 0),
+        )
+        Cita.objects.create(
+            veterinario=vets[n % 2],
+            cliente=cliente,
+            mascota=mascotas[n % 2],
+            servicio=servicios[n % 2],
+            fecha=hoy + timedelta(days=n),
+            hora=time(9 + n % 3, 0),
+        )
+    DiaBloqueadoVeterinario.objects.create(veterinario=vets[0], fecha=hoy + timedelta(days=7))
+    return recep_user, vets, cliente
+
+
+class SincronizacionTrasladoTests(TestCase):
+    """Una cita que pasa a otro veterinario sale de la sincronizacion del primero."""
+
+    def setUp(self):
+        self.vets, cliente, mascotas, servicios = _crear_base()
+        self.cita = Cita.objects.create(
+            veterinario=self.vets[0],
+            cliente=cliente,
+            mascota=mascotas[0],
+            servicio=servicios[0],
+            fecha=timezone.localdate() + timedelta(days=1),
+            hora=time(10, 0),
+        )
+        self.token = emitir_token(timezone.now() - timedelta(seconds=5))
+
+    def _cambios(self, vet):
+        self.client.force_login(vet.perfil.user)
+        response = self.client.get(reverse("usuarios:vet_citas_api"), {"since": self.token})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return [c["id"] for c in data["citas"]], data["eliminados"]["citas"]
+
+    def test_cambio_de_veterinario_deja_lapida_en_el_anterior(self):
+        self.cita.veterinario = self.vets[1]
+        self.cita.save()
+        self.assertEqual(self._cambios(self.vets[0]), ([], [self.cita.id]))
+        self.assertEqual(self._cambios(self.vets[1]), ([self.cita.id], []))
+
+    def test_cambio_de_fecha_dentro_del_alcance_no_es_baja(self):
+        self.cita.fecha += timedelta(days=1)
+        self.cita.save()
+        self.assertEqual(self._cambios(self.vets[0]), ([self.cita.id], []))
+
+
+class PaginacionCursorTests(TestCase):
+    """Las paginas por cursor recorren todo sin repetir ni saltar filas."""
+
+    def setUp(self):
+        recep_user = User.objects.create_user("recep")
+        Recepcionista.objects.create(perfil=recep_user.perfil, rut="5-1", telefono="5")
+        self.client.force_login(recep_user)
+        # Apellidos y nombres repetidos: el id desempata dentro de cada grupo.
+        for n in range(23):
+            user = User.objects.create_user(
+                f"vet{n:02}",
+                first_name=("Ana", "Beto")[n % 2],
+                last_name=("Rojas", "Soto", "Diaz")[n % 3],
+            )
+            Veterinario.objects.create(perfil=user.perfil, rut=f"{n}-1", telefono=str(n))
+        self.url = reverse("usuarios:recep_veterinarios_api")
+
+    def _recorrer(self, params, al_pasar_pagina=None):
+        ids = []
+        cursor = None
+        while True:
+            response = self.client.get(self.url, {**params, "cursor": cursor or ""})
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            ids.extend(fila["id"] for fila in data["results"])
+            if not data["has_more"]:
+                self.assertIsNone(data["next_cursor"])
+                return ids
+            cursor = data["next_cursor"]
+            if al_pasar_pagina:
+                al_pasar_pagina()
+
+    def test_paginas_continuas_en_orden(self):
+        ids = self._recorrer({"limite": 5})
+        esperado = list(
+            Veterinario.objects.order_by(
+                "perfil__user__last_name", "perfil__user__first_name", "perfil__user__id"
+            ).values_list("id", flat=True)
+        )
+        self.assertEqual(ids, esperado)
+
+    def test_altas_entre_paginas_no_desplazan_el_cursor(self):
+        nuevos = []
+
+        def alta():
+            # Ordena antes de todo lo ya recorrido: con OFFSET correria una fila.
+            n = len(nuevos)
+            user = User.objects.create_user(f"nuevo{n}", first_name="Aaron", last_name="Aguilar")
+            nuevos.append(
+                Veterinario.objects.create(perfil=user.perfil, rut=f"9{n}-1", telefono="9")
+            )
+
+        ids = self._recorrer({"limite": 4}, al_pasar_pagina=alta)
+        self.assertEqual(len(ids), 23)
+        self.assertEqual(len(set(ids)), 23)
+        self.assertFalse({v.id for v in nuevos} & set(ids))
+
+    def test_filtro_y_cursor_invalido(self):
+        ids = self._recorrer({"q": "soto", "limite": 3})
+        self.assertEqual(len(ids), 8)
+        for cursor in ("no-es-base64!", [1], [[1], "a", 2]):
+            if isinstance(cursor, list):
+                cursor = views._codificar_cursor(cursor)
+            with self.subTest(cursor=cursor):
+                response = self.client.get(self.url, {"cursor": cursor})
+                self.assertEqual(response.status_code, 400)
+
+
+class VentanaCitasTests(TestCase):
+    """vet_citas_api por ventana de fechas y paginas con cursor."""
+
+    def setUp(self):
+        vets, cliente, mascotas, servicios = _crear_base()
+        self.vet = vets[0]
+        self.client.force_login(self.vet.perfil.user)
+        hoy = timezone.localdate()
+        self.desde = (hoy.replace(day=1) + timedelta(days=32)).replace(day=1)
+        self.hasta = (self.desde + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        self.en_ventana = []
+        # Varias citas por dia y dias fuera de la ventana en ambos bordes.
+        fechas = (
+            self.desde - timedelta(days=1),
+            self.desde,
+            self.desde + timedelta(days=9),
+            self.hasta,
+            self.hasta + timedelta(days=1),
+        )
+        for fecha in fechas:
+            for hora in (time(9), time(10), time(11), time(12), time(15)):
+                cita = Cita.objects.create(
+                    veterinario=self.vet,
+                    cliente=cliente,
+                    mascota=mascotas[0],
+                    servicio=servicios[0],
+                    fecha=fecha,
+                    hora=hora,
+                )
+                if self.desde <= fecha <= self.hasta:
+                    self.en_ventana.append(cita.id)
+        self.url = reverse("usuarios:vet_citas_api")
+
+    def _get(self, params):
+        response = self.client.get(self.url, params)
+        if response.status_code != 200:
+            return response.status_code, None
+        return 200, json.loads(b"".join(response.streaming_content))
+
+    def test_recorre_la_ventana_por_paginas(self):
+        ventana = {"desde": self.desde.isoformat(), "hasta": self.hasta.isoformat()}
+        ids = []
+        cursor = ""
+        while True:
+            status, data = self._get({**ventana, "limite": 4, "cursor": cursor})
+            self.assertEqual(status, 200)
+            self.assertEqual((data["desde"], data["hasta"]), (ventana["desde"], ventana["hasta"]))
+            self.assertLessEqual(len(data["citas"]), 4)
+            ids.extend(c["id"] for c in data["citas"])
+            if not data["has_more"]:
+                self.assertIsNone(data["next_cursor"])
+                break
+            cursor = data["next_cursor"]
+        self.assertEqual(ids, self.en_ventana)
+
+    def test_ventana_por_omision(self):
+        status, data = self._get({})
+        hoy = timezone.localdate()
+        lunes = hoy - timedelta(days=hoy.weekday())
+        self.assertEqual(status, 200)
+        self.assertEqual(data["desde"], (lunes - timedelta(days=7)).isoformat())
+        self.assertEqual(data["hasta"], (lunes + timedelta(days=13)).isoformat())
+
+    def test_ventana_o_cursor_invalidos(self):
+        desde = self.desde.isoformat()
+        invalidos = [
+            {"desde": "2026-13-01"},
+            {"desde": desde, "hasta": (self.desde - timedelta(days=1)).isoformat()},
+            {"desde": desde, "hasta": (self.desde + timedelta(days=366)).isoformat()},
+            {"limite": "x"},
+            {"cursor": "no-es-base64!"},
+        ]
+        cursores = (
+            [desde, "09:00:00"],
+            [desde, "9h", 1],
+            [1, "09:00:00", 1],
+            [desde, "09:00:00", "x"],
+            [desde, "09:00:00", [1]],
+        )
+        invalidos += [{"cursor": views._codificar_cursor(valores)} for valores in cursores]
+        for params in invalidos:
+            with self.subTest(params=params):
+                self.assertEqual(self._get(params)[0], 400)
+
+
+class StreamingCitasTests(TransactionTestCase):
+    """
+    vet_citas_api en streaming, por el cliente de pruebas y por la aplicacion
+    ASGI. Los datos deben estar confirmados: el handler ASGI consulta desde
+    su propio hilo.
+    """
+
+    CITAS = views.MAX_LIMITE_CITAS + 10
+
+    def setUp(self):
+        vets, cliente, mascotas, servicios = _crear_base()
+        self.vet = vets[0]
+        desde = timezone.localdate() + timedelta(days=1)
+        Cita.objects.bulk_create(
+            Cita(
+                veterinario=self.vet,
+                cliente=cliente,
+                mascota=mascotas[n % 2],
+                servicio=servicios[n % 2],
+                fecha=desde + timedelta(days=n // 5),
+                hora=time(9 + n % 5),
+                notas=f"Control {n}",
+            )
+            for n in range(self.CITAS)
+        )
+        self.params = {
+            "desde": desde.isoformat(),
+            "hasta": (desde + timedelta(days=self.CITAS // 5)).isoformat(),
+            "limite": views.MAX_LIMITE_CITAS,
+        }
+        self.url = reverse("usuarios:vet_citas_api")
+
+    def _json_response(self, data):
+        """Cuerpo de JsonResponse para la misma pagina, con token y cursor de ``data``."""
+        citas = (
+            Cita.objects.filter(veterinario=self.vet)
+            .select_related("servicio", "veterinario__perfil__user")
+            .order_by("fecha", "hora", "id")[: views.MAX_LIMITE_CITAS]
+        )
+        return JsonResponse(
+            {
+                "token": data["token"],
+                "desde": self.params["desde"],
+                "hasta": self.params["hasta"],
+                "citas": [_serialize_cita(c) for c in citas],
+                "next_cursor": data["next_cursor"],
+                "has_more": data["has_more"],
+            }
+        ).content
+
+    def test_igual_a_jsonresponse(self):
+        self.client.force_login(self.vet.perfil.user)
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, 200)
+        trozos = list(response.streaming_content)
+        contenido = b"".join(trozos)
+        data = json.loads(contenido)
+        self.assertGreater(len(trozos), 1)
+        self.assertTrue(data["has_more"])
+        self.assertEqual(contenido, self._json_response(data))
+
+    async def test_asgi_no_junta_el_contenido(self):
+        await sync_to_async(self.client.force_login)(self.vet.perfil.user)
+        sesion = self.client.cookies["sessionid"].value
+        comunicador = ApplicationCommunicator(
+            application,
+            {
+                "type": "http",
+                "method": "GET",
+                "path": self.url,
+                "query_string": urlencode(self.params).encode(),
+                "headers": [
+                    (b"host", b"testserver"),
+                    (b"cookie", f"sessionid={sesion}".encode()),
+                ],
+            },
+        )
+        with warnings.catch_warnings(record=True) as avisos:
+            warnings.simplefilter("always")
+            await comunicador.send_input({"type": "http.request", "body": b""})
+            inicio = await comunicador.receive_output(5)
+            self.assertEqual(inicio["status"], 200)
+            trozos = []
+            while True:
+                mensaje = await comunicador.receive_output(5)
+                trozos.append(mensaje.get("body", b""))
+                if not mensaje.get("more_body"):
+                    break
+        # Con un iterador sincronico Django avisa que lo consume con
+        # sync_to_async(list), todo en memoria.
+        self.assertEqual([str(a.message) for a in avisos if "iterators" in str(a.message)], [])
+        contenido = b"".join(trozos)
+        self.assertGreater(len([t for t in trozos if t]), 1)
+        esperado = await sync_to_async(self._json_response)(json.loads(contenido))
+        self.assertEqual(contenido, esperado)
+
+
+class BusquedaRelevanciaTests(TestCase):
+    """Busqueda por el indice FTS5 paginada con cursor sobre (bm25, id)."""
+
+    def setUp(self):
+        recep_user = User.objects.create_user("recep")
+        Recepcionista.objects.create(perfil=recep_user.perfil, rut="5-1", telefono="5")
+        self.client.force_login(recep_user)
+        for n in range(30):
+            user = User.objects.create_user(f"cliente{n}", first_name="Luis", last_name=f"Perez{n}")
+            cliente = Cliente.objects.create(
+                perfil=user.perfil, rut=f"{n}-1", direccion="x", telefono=str(n)
+            )
+            # Algunos tambien calzan por la mascota: suben en el orden.
+            if n % 4 == 0:
+                Mascota.objects.create(cliente=cliente, nombre="Luisito", tipo="perro")
+        self.url = reverse("usuarios:recep_clientes_api")
+
+    def test_paginas_siguen_el_orden_de_relevancia(self):
+        ids = []
+        cursor = ""
+        while True:
+            data = self.client.get(self.url, {"q": "luis", "limite": 7, "cursor": cursor}).json()
+            ids.extend(fila["id"] for fila in data["results"])
+            if not data["has_more"]:
+                break
+            cursor = data["next_cursor"]
+        self.assertEqual(ids, [pk for pk, _ in busqueda.buscar("luis", 100)])
+        self.assertEqual(len(set(ids)), 30)
+        self.assertEqual(set(ids[:8]), set(Mascota.objects.values_list("cliente_id", flat=True)))
+
+    def test_cursor_invalido_es_400(self):
+        for valores in ([[1, 2]], [1], ["a", 1], [1.5, "2"], [True, 1]):
+            with self.subTest(valores=valores):
+                cursor = views._codificar_cursor(valores, views.CURSOR_RELEVANCIA)
+                response = self.client.get(self.url, {"q": "luis", "cursor": cursor})
+                self.assertEqual(response.status_code, 400)
+
+    def test_login_no_reindexa(self):
+        user = Cliente.objects.first().perfil.user
+        with CaptureQueriesContext(connection) as consultas:
+            update_last_login(None, user)
+        self.assertFalse([q for q in consultas if busqueda.TABLA in q["sql"]])
+        with CaptureQueriesContext(connection) as consultas:
+            user.save()
+        self.assertTrue([q for q in consultas if busqueda.TABLA in q["sql"]])
+
+
+class BusquedaContactoTests(TestCase):
+    """Las paginas siguientes van al camino (exacto o general) que emitio el cursor."""
+
+    def setUp(self):
+        recep_user = User.objects.create_user("recep")
+        Recepcionista.objects.create(perfil=recep_user.perfil, rut="5-1", telefono="5")
+        self.client.force_login(recep_user)
+        for n in range(30):
+            user = User.objects.create_user(f"cliente{n}", first_name="Luis")
+            Cliente.objects.create(
+                perfil=user.perfil, rut=f"{n}-1", direccion="x", telefono=f"+56 9 5555 {n:04}"
+            )
+        self.url = reverse("usuarios:recep_clientes_api")
+
+    def _recorrer(self, q):
+        ids = []
+        cursor = ""
+        while True:
+            response = self.client.get(self.url, {"q": q, "limite": 10, "cursor": cursor})
+            self.assertEqual(response.status_code, 200, response.content)
+            data = response.json()
+            ids.extend(fila["id"] for fila in data["results"])
+            if not data["has_more"]:
+                return ids
+            cursor = data["next_cursor"]
+
+    def test_telefono_sin_calce_exacto_pagina_por_el_indice(self):
+        # Parece telefono pero no es prefijo de ninguno: cae a la busqueda general.
+        ids = self._recorrer("5555 9 56")
+        self.assertEqual(len(ids), 30)
+        self.assertEqual(len(set(ids)), 30)
+
+    def test_telefono_con_calce_exacto_pagina_por_prefijo(self):
+        ids = self._recorrer("9 5555 00")
+        self.assertEqual(sorted(ids), sorted(Cliente.objects.values_list("id", flat=True)))
+
+    def test_rellenar_normalizados_por_lotes(self):
+        Cliente.objects.filter(id__in=Cliente.objects.order_by("id")[:5].values("id")).update(
+            rut_normalizado="", telefono_normalizado=""
+        )
+        self.assertEqual(rellenar_normalizados(Cliente, tamano_lote=2), 5)
+        self.assertEqual(rellenar_normalizados(Cliente, tamano_lote=2), 0)
+        self.assertFalse(Cliente.objects.filter(telefono_normalizado="").exists())
+
+    def test_cursor_de_otro_camino_es_400(self):
+        data = self.client.get(self.url, {"q": "9 5555 00", "limite": 10}).json()
+        response = self.client.get(self.url, {"q": "Luis", "cursor": data["next_cursor"]})
+        self.assertEqual(response.status_code, 400)
+
+
+class PrimerDisponibleTests(TestCase):
+    def setUp(self):
+        recep_user, self.vets, _ = _crear_agenda_recepcion()
+        self.client.force_login(recep_user)
+        self.url = reverse("usuarios:recep_primer_disponible_api")
+
+    def test_servicio_invalido_es_400(self):
+        for servicio_id in ("abc", "1.5"):
+            with self.subTest(servicio_id):
+                response = self.client.get(self.url, {"servicio_id": servicio_id})
+                self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.url, {"servicio_id": 999999})
+        self.assertEqual(response.content, b"Servicio no encontrado.")
+
+    def test_devuelve_huecos(self):
+        servicio = Servicio.objects.get(nombre="Consulta")
+        response = self.client.get(self.url, {"servicio_id": servicio.id, "limite": 3})
+        self.assertEqual(response.status_code, 200)
+        resultados = response.json()["resultados"]
+        self.assertEqual(len(resultados), 3)
+        orden = [(r["fecha"], r["hora"]) for r in resultados]
+        self.assertEqual(orden, sorted(orden))
+
+
+class LoteRecepcionTests(TestCase):
+    def setUp(self):
+        recep_user, self.vets, self.cliente = _crear_agenda_recepcion()
+        self.client.force_login(recep_user)
+        self.url = reverse("usuarios:recep_lote_api")
+        self.vets_url = reverse("usuarios:recep_veterinarios_api")
+        self.clientes_url = reverse("usuarios:recep_clientes_api")
+
+    def _lote(self, cuerpo):
+        return self.client.post(self.url, cuerpo, content_type="application/json")
+
+    def _resultados(self, llamadas):
+        response = self._lote({"llamadas": llamadas})
+        self.assertEqual(response.status_code, 200)
+        return response.json()["resultados"]
+
+    def test_cuerpo_o_params_invalidos(self):
+        self.assertEqual(self._lote([{"url": self.vets_url}]).status_code, 400)
+        self.assertEqual(self._lote({"llamadas": []}).status_code, 400)
+        resultados = self._resultados([{"id": "v", "url": self.vets_url, "params": [1]}])
+        self.assertEqual(resultados["v"]["status"], 400)
+
+    def test_parametro_none_se_omite(self):
+        resultados = self._resultados(
+            [
+                {"id": "todos", "url": self.vets_url},
+                {"id": "none", "url": self.vets_url, "params": {"q": None}},
+            ]
+        )
+        self.assertEqual(len(resultados["none"]["data"]["results"]), len(self.vets))
+        self.assertEqual(resultados["none"], resultados["todos"])
+
+    def test_solo_rutas_permitidas(self):
+        resultados = self._resultados(
+            [
+                {"id": "vet", "url": reverse("usuarios:vet_citas_api")},
+                {"id": "nada", "url": "/no/existe/"},
+                {"id": "ok", "url": self.vets_url},
+            ]
+        )
+        self.assertEqual(resultados["vet"], {"status": 400, "error": "Ruta no permitida en lote."})
+        self.assertEqual(resultados["nada"]["status"], 404)
+        self.assertEqual(resultados["ok"]["status"], 200)
+
+    def test_referencia_a_llamada_anterior(self):
+        resultados = self._resultados(
+            [
+                {"id": "c", "url": self.clientes_url, "params": {"q": "Luis"}},
+                {"id": "tel", "url": self.clientes_url, "params": {"q": "$c.results.0.telefono"}},
+                {"id": "mal", "url": self.clientes_url, "params": {"q": "$c.results.9.id"}},
+            ]
+        )
+        self.assertEqual(resultados["tel"]["data"]["results"][0]["id"], self.cliente.id)
+        self.assertEqual(resultados["mal"]["status"], 400)
+
+    def test_llamadas_repetidas_se_ejecutan_una_vez(self):
+        def consultas_vets(n):
+            llamadas = [{"id": str(i), "url": self.vets_url} for i in range(n)]
+            with CaptureQueriesContext(connection) as consultas:
+                resultados = self._resultados(llamadas)
+            self.assertEqual(len(resultados), n)
+            return sum('"usuarios_veterinario"' in q["sql"] for q in consultas)
+
+        una = consultas_vets(1)
+        self.assertGreater(una, 0)
+        self.assertEqual(consultas_vets(3), una)
+
+    def test_tope_de_llamadas(self):
+        llamadas = [{"url": self.vets_url, "params": {"q": f"v{n}"}} for n in range(21)]
+        self.assertEqual(self._lote({"llamadas": llamadas}).status_code, 400)
+        self.assertEqual(len(self._resultados(llamadas[:20])), 20)
+
+    def test_error_de_una_llamada_no_bota_el_lote(self):
+        with mock.patch.object(catalogo, "servicios_activos", side_effect=RuntimeError):
+            with self.assertLogs("usuarios.views", "ERROR"):
+                resultados = self._resultados(
+                    [
+                        {"id": "s", "url": reverse("usuarios:recep_servicios_api")},
+                        {"id": "v", "url": self.vets_url},
+                    ]
+                )
+        self.assertEqual(resultados["s"], {"status": 500, "error": "Error interno."})
+        self.assertEqual(resultados["v"]["status"], 200)
+
+
+class RespuestaCondicionalTests(TestCase):
+    """ETag y Last-Modified de recep_citas_hoy_api."""
+
+    def setUp(self):
+        recep_user, self.vets, self.cliente = _crear_agenda_recepcion()
+        self.client.force_login(recep_user)
+        self.url = reverse("usuarios:recep_citas_hoy_api")
+        # Cambios de hace una hora: el segundo ya termino y hay Last-Modified.
+        Cita.objects.update(actualizado_en=timezone.now() - timedelta(hours=1))
+
+    def _get(self, **cabeceras):
+        return self.client.get(self.url, **cabeceras)
+
+    def test_304_con_if_none_match_y_if_modified_since(self):
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._get(HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        modificada = self._get(HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(modificada.status_code, 304)
+
+    def _assert_validadores_cambian(self, cambio):
+        antes = self._get()
+        cambio()
+        despues = self._get(HTTP_IF_NONE_MATCH=antes["ETag"])
+        self.assertEqual(despues.status_code, 200)
+        self.assertNotEqual(despues["ETag"], antes["ETag"])
+        modificada = self._get(HTTP_IF_MODIFIED_SINCE=antes["Last-Modified"])
+        self.assertEqual(modificada.status_code, 200)
+
+    def test_edicion(self):
+        cita = Cita.objects.first()
+        cita.notas = "Traer examenes"
+        self._assert_validadores_cambian(cita.save)
+
+    def test_baja(self):
+        self._assert_validadores_cambian(Cita.objects.order_by("-fecha").first().delete)
+
+    def test_baja_y_alta_sin_cambiar_el_conteo(self):
+        def cambio():
+            cita = Cita.objects.order_by("fecha").first()
+            cita.delete()
+            cita.pk = None
+            cita.hora = time(15)
+            cita.save()
+
+        self._assert_validadores_cambian(cambio)
+        self.assertEqual(Cita.objects.count(), 6)
+
+    def test_sin_last_modified_en_el_segundo_en_curso(self):
+        Cita.objects.update(actualizado_en=timezone.now() + timedelta(seconds=1))
+        response = self._get()
+        self.assertNotIn("Last-Modified", response)
+        self.assertEqual(self._get(HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+
+class ContextoRolTests(TestCase):
+    """El rol se resuelve una vez por sesion y se invalida al cambiar."""
+
+    def setUp(self):
+        user = User.objects.create_user("recep", first_name="Eva")
+        self.recep = Recepcionista.objects.create(perfil=user.perfil, rut="5-1", telefono="5")
+        self.client.force_login(user)
+        self.url = reverse("usuarios:recep_servicios_api")
+        cache.clear()
+        catalogo.catalogo()
+
+    def _lecturas(self):
+        # Solo SELECT: guardar la entrada nueva en la sesion es aparte.
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return sum(q["sql"].startswith("SELECT") for q in consultas)
+
+    def test_sesion_ahorra_perfil_y_rol(self):
+        sin_contexto = self._lecturas()
+        self.assertIn(CLAVE_SESION, self.client.session)
+        self.assertEqual(self._lecturas(), sin_contexto - 2)
+        # Sin la entrada de sesion se vuelven a leer perfil y rol.
+        sesion = self.client.session
+        del sesion[CLAVE_SESION]
+        sesion.save()
+        self.assertEqual(self._lecturas(), sin_contexto)
+
+    def test_cambio_de_rol_invalida_sesion(self):
+        self.client.get(self.url)
+        perfil = Perfil.objects.get(pk=self.recep.perfil_id)
+        perfil.rol = Perfil.Roles.VETERINARIO
+        perfil.save()
+        self.assertNotIn(CLAVE_SESION, self.client.session)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.content, b"Solo disponible para recepcionistas.")
+
+    def test_eliminar_rol_invalida_sesion(self):
+        self.client.get(self.url)
+        self.recep.delete()
+        response = self.client.get(self.url)
+        self.assertEqual(response.content, b"Recepcionista no encontrado.")
+
+
+class CatalogoServiciosTests(TestCase):
+    """El catalogo se lee de cache y se renueva al editar servicios o secciones."""
+
+    def setUp(self):
+        cache.clear()
+        caches[catalogo.ALIAS_VERSION].clear()
+        self.seccion = ServicioSeccion.objects.create(nombre="Clinica")
+        self.servicio = Servicio.objects.create(
+            nombre="Consulta", seccion=self.seccion, duracion_minutos=30
+        )
+        Servicio.objects.create(nombre="Baño")
+        user = User.objects.create_user("recep", first_name="Eva")
+        Recepcionista.objects.create(perfil=user.perfil, rut="5-1", telefono="5")
+        self.client.force_login(user)
+        self.url = reverse("usuarios:recep_servicios_api")
+
+    def _servicios(self):
+        return json.loads(self.client.get(self.url).content)["servicios"]
+
+    def test_sin_consultas_con_cache_caliente(self):
+        self.assertEqual(
+            self._servicios(),
+            [
+                {
+                    "id": self.servicio.id,
+                    "nombre": "Consulta",
+                    "duracion_min": 30,
+                    "duracion_minutos": 30,
+                    "seccion": "Clinica",
+                }
+            ],
+        )
+        with self.assertNumQueries(0):
+            datos = catalogo.catalogo()
+        self.assertEqual([s["nombre"] for s in datos["sin_seccion"]], ["Baño"])
+
+    def test_guardar_y_eliminar_invalida(self):
+        self._servicios()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.servicio.nombre = "Control"
+            self.servicio.save()
+        self.assertEqual([s["nombre"] for s in self._servicios()], ["Control"])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.seccion.activo = False
+            self.seccion.save()
+        self.assertEqual(self._servicios(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.seccion.delete()
+        self.assertEqual(
+            [s["nombre"] for s in catalogo.catalogo()["sin_seccion"]], ["Baño", "Control"]
+        )
+
+    def test_version_perdida_no_reusa_entrada(self):
+        catalogo.catalogo()
+        caches[catalogo.ALIAS_VERSION].delete(catalogo.CLAVE_VERSION)
+        with self.captureOnCommitCallbacks(execute=True):
+            Servicio.objects.filter(pk=self.servicio.pk).delete()
+        self.assertEqual(self._servicios(), [])
+
+    def test_cambio_en_otro_proceso_invalida(self):
+        self.assertEqual([s["nombre"] for s in self._servicios()], ["Consulta"])
+        # El cambio lo hace otro worker: aqui no corre la señal, alla si.
+        Servicio.objects.filter(pk=self.servicio.pk).update(nombre="Control")
+        subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import django; django.setup(); "
+                "from usuarios import catalogo; catalogo._subir_version()",
+            ],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": "webapp_pochita.settings"},
+            check=True,
+            timeout=60,
+        )
+        self.assertEqual([s["nombre"] for s in self._servicios()], ["Control"])
+
+
+class PlanConsultasTests(TestCase):
+    """
+    Las consultas de las vistas de agenda sobre Cita, DisponibilidadVeterinario
+    y DiaBloqueadoVeterinario usan un indice para acotar filas: ``EXPLAIN
+    QUERY PLAN`` no debe recorrerlas enteras (SCAN). Solo se acepta un SCAN
+    que recorre un indice en orden (``USING INDEX`` o ``USING COVERING
+    INDEX``), como el de un LIMIT que lee las primeras filas.
+    """
+
+    TABLAS = (
+        Cita._meta.db_table,
+        DisponibilidadVeterinario._meta.db_table,
+        DiaBloqueadoVeterinario._meta.db_table,
+    )
+
+    def _recorridos(self, consultas):
+        escaneo = re.compile(
+            r"SCAN (%s)\b(?! USING (COVERING )?INDEX)" % "|".join(self.TABLAS)
+        )
+        recorridos = []
+        with connection.cursor() as cursor:
+            for consulta in consultas:
+                sql = consulta["sql"]
+                if not sql.startswith("SELECT"):
+                    continue
+                if not any(f'"{tabla}"' in sql for tabla in self.TABLAS):
+                    continue
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                for fila in cursor.fetchall():
+                    if escaneo.match(fila[-1]):
+                        recorridos.append(f"{fila[-1]}: {sql}")
+        return recorridos
+
+    def test_consultas_de_agenda_usan_indices(self):
+        recep_user, vets, cliente = _crear_agenda_recepcion()
+        hoy = timezone.localdate()
+        mes = {"year": hoy.year, "month": hoy.month}
+        since = {"since": emitir_token()}
+        lecturas = [
+            (vets[0].perfil.user, "dashboard_veterinario", {}, {}),
+            (vets[0].perfil.user, "vet_citas_api", {}, {}),
+            (vets[0].perfil.user, "vet_citas_api", {}, since),
+            (vets[0].perfil.user, "vet_disponibilidad_api", {}, mes),
+            (cliente.perfil.user, "dashboard_cliente", {}, {}),
+            (recep_user, "dashboard_recepcionista", {}, {}),
+            (recep_user, "recep_citas_hoy_api", {}, {}),
+            (recep_user, "recep_citas_hoy_api", {}, {"veterinario_id": vets[0].id}),
+            (recep_user, "recep_citas_hoy_api", {}, since),
+            (recep_user, "recep_disponibilidad_api", {}, mes),
+            (recep_user, "recep_disponibilidad_api", {}, {**mes, "veterinario_id": vets[0].id}),
+            (recep_user, "recep_historial_citas_cliente_api", {"cliente_id": cliente.id}, {}),
+            (recep_user, "recep_replanificar_alertas_api", {}, {}),
+        ]
+        with CaptureQueriesContext(connection) as consultas:
+            for user, nombre, kwargs, params in lecturas:
+                self.client.force_login(user)
+                response = self.client.get(reverse(f"usuarios:{nombre}", kwargs=kwargs), params)
+                self.assertEqual(response.status_code, 200, nombre)
+            cambios_desde(timezone.now())
+            expirar_citas_vencidas(completo=True)
+        recorridos = self._recorridos(consultas)
+        self.assertFalse(recorridos, "\n".join(recorridos))
+
+
+
+def _historial_sincrono(request, cliente_id):
+    """
+    Historial de un cliente como JsonResponse, para
+    CargaHistorialAsyncBenchmark; ``_historial_async`` es la misma vista
+    con el ORM async (aget, iteracion async).
+    """
+    recep = views._require_recepcionista(request)
+    if isinstance(recep, HttpResponseForbidden):
+        return recep
+    try:
+        cliente = Cliente.objects.get(id=cliente_id)
+    except Cliente.DoesNotExist:
+        return HttpResponseBadRequest("Cliente no encontrado.")
+    citas = Cita.objects.filter(cliente=cliente).order_by("-fecha", "-hora")
+    return JsonResponse({"citas": list(views._iter_filas_cita(views._filas_cita(citas)))})
+
+
+async def _historial_async(request, cliente_id):
+    recep = await sync_to_async(views._require_recepcionista)(request)
+    if isinstance(recep, HttpResponseForbidden):
+        return recep
+    try:
+        cliente = await Cliente.objects.aget(id=cliente_id)
+    except Cliente.DoesNotExist:
+        return HttpResponseBadRequest("Cliente no encontrado.")
+    citas = Cita.objects.filter(cliente=cliente).order_by("-fecha", "-hora")
+    filas = [fila async for fila in views._filas_cita(citas)]
+    return JsonResponse({"citas": list(views._iter_filas_cita(filas))})
+
+
+# URLconf de CargaHistorialAsyncBenchmark: la vista real y las dos versiones
+# que solo difieren en sync/async.
+urlpatterns = [
+    path("vista/historial/<int:cliente_id>/", views.recep_historial_citas_cliente_api),
+    path("sync/historial/<int:cliente_id>/", _historial_sincrono),
+    path("async/historial/<int:cliente_id>/", _historial_async),
+]
+
+
+@unittest.skipUnless(os.environ.get("POCHITA_BENCH"), "benchmark: definir POCHITA_BENCH=1")
+@override_settings(ROOT_URLCONF=__name__)
+class CargaHistorialAsyncBenchmark(TransactionTestCase):
+    """
+    Prueba de carga: PETICIONES lecturas del historial de un cliente con
+    CONCURRENCIA clientes simultaneos contra la aplicacion ASGI en un solo
+    proceso. Compara dos versiones que solo difieren en usar el ORM sync o
+    async, y de referencia la vista real, que ademas va en streaming.
+
+    El ORM async de Django pasa cada consulta por sync_to_async al mismo
+    hilo que atiende las vistas sync, asi que no hay mas consultas en
+    paralelo que antes: la version async queda a la par o peor, y por eso
+    las vistas de recepcion siguen siendo sync.
+    """
+
+    databases = {"default", "replica"}
+    PETICIONES = 200
+    CONCURRENCIA = 20
+    CITAS = 2_000
+
+    def setUp(self):
+        recep_user, vets, cliente = _crear_agenda_recepcion()
+        hoy = timezone.now().date()
+        mascota = cliente.mascotas.first()
+        Cita.objects.bulk_create(
+            Cita(
+                veterinario=vets[n % 2],
+                cliente=cliente,
+                mascota=mascota,
+                fecha=hoy + timedelta(days=n // 40),
+                hora=time(8 + (n % 20) // 2, 30 * (n % 2)),
+                hora_fin=time(8 + (n % 20) // 2, 30 * (n % 2) + 15),
+            )
+            for n in range(self.CITAS)
+        )
+        self.client.force_login(recep_user)
+        self.sesion = self.client.cookies["sessionid"].value
+        self.cliente_id = cliente.id
+
+    async def _pedir(self, ruta):
+        comunicador = ApplicationCommunicator(
+            application,
+            {
+                "type": "http",
+                "method": "GET",
+                "path": ruta,
+                "query_string": b"",
+                "headers": [
+                    (b"host", b"testserver"),
+                    (b"cookie", f"sessionid={self.sesion}".encode()),
+                ],
+            },
+        )
+        inicio = reloj.perf_counter()
+        await comunicador.send_input({"type": "http.request", "body": b""})
+        respuesta = await comunicador.receive_output(30)
+        self.assertEqual(respuesta["status"], 200)
+        contenido = b""
+        while True:
+            mensaje = await comunicador.receive_output(30)
+            contenido += mensaje.get("body", b"")
+            if not mensaje.get("more_body"):
+                break
+        await comunicador.wait(30)
+        return reloj.perf_counter() - inicio, contenido
+
+    async def _carga(self, ruta):
+        semaforo = asyncio.Semaphore(self.CONCURRENCIA)
+
+        async def uno():
+            async with semaforo:
+                return (await self._pedir(ruta))[0]
+
+        inicio = reloj.perf_counter()
+        latencias = sorted(await asyncio.gather(*(uno() for _ in range(self.PETICIONES))))
+        total = reloj.perf_counter() - inicio
+        return self.PETICIONES / total, latencias[int(len(latencias) * 0.95) - 1]
+
+    async def test_async_contra_sync(self):
+        rutas = {
+            modo: f"/{modo}/historial/{self.cliente_id}/" for modo in ("vista", "sync", "async")
+        }
+        cuerpos = {modo: json.loads((await self._pedir(ruta))[1]) for modo, ruta in rutas.items()}
+        self.assertEqual(cuerpos["async"], cuerpos["sync"])
+        self.assertEqual(cuerpos["vista"], cuerpos["sync"])
+        resultados = {}
+        for modo, ruta in rutas.items():
+            await self._carga(ruta)  # calentamiento
+            resultados[modo] = await self._carga(ruta)
+        print(
+            f"\n{self.PETICIONES} peticiones, {self.CONCURRENCIA} concurrentes, "
+            f"{self.CITAS} citas: "
+            + "  ".join(
+                f"{modo} {rps:6.1f} req/s p95 {p95 * 1000:6.0f} ms"
+                for modo, (rps, p95) in resultados.items()
+            )
+        )
@@ -8,7 +8,9 @@ from .views import (
     vet_disponibilidad_api,
     vet_disponibilidad_detail_api,
     vet_bloquear_dia_api,
+    vet_plantilla_api,
     vet_citas_api,
+    vet_eventos_api,
     vet_cita_estado_api,
     recep_clientes_api,
     recep_cliente_detalle_api,
@@ -16,12 +18,16 @@ from .views import (
     recep_servicios_api,
     recep_veterinarios_api,
     recep_disponibilidad_api,
+    recep_primer_disponible_api,
     recep_cita_create_api,
     recep_citas_hoy_api,
     recep_cita_estado_api,
     recep_replanificar_alertas_api,
     recep_replanificar_disponibilidad_api,
     recep_replanificar_cita_api,
+    recep_replanificar_lote_api,
+    recep_lote_api,
+    recep_eventos_api,
     recep_historial_citas_cliente_api,
     LoginSelectorView,
     PersonalLoginView,
@@ -45,7 +51,9 @@ urlpatterns = [
     path("api/veterinario/disponibilidad/", vet_disponibilidad_api, name="vet_disponibilidad_api"),
     path("api/veterinario/disponibilidad/<int:pk>/", vet_disponibilidad_detail_api, name="vet_disponibilidad_detail_api"),
     path("api/veterinario/disponibilidad/bloquear-dia/", vet_bloquear_dia_api, name="vet_bloquear_dia_api"),
+    path("api/veterinario/disponibilidad/plantilla/", vet_plantilla_api, name="vet_plantilla_api"),
     path("api/veterinario/citas/", vet_citas_api, name="vet_citas_api"),
+    path("api/veterinario/eventos/", vet_eventos_api, name="vet_eventos_api"),
     path("api/veterinario/citas/<int:pk>/estado/", vet_cita_estado_api, name="vet_cita_estado_api"),
     # API Recepcionista
     path("api/recep/clientes/", recep_clientes_api, name="recep_clientes_api"),
@@ -54,11 +62,15 @@ urlpatterns = [
     path("api/recep/servicios/", recep_servicios_api, name="recep_servicios_api"),
     path("api/recep/veterinarios/", recep_veterinarios_api, name="recep_veterinarios_api"),
     path("api/recep/disponibilidad/", recep_disponibilidad_api, name="recep_disponibilidad_api"),
+    path("api/recep/disponibilidad/primera/", recep_primer_disponible_api, name="recep_primer_disponible_api"),
     path("api/recep/citas/", recep_cita_create_api, name="recep_cita_create_api"),
     path("api/recep/citas/hoy/", recep_citas_hoy_api, name="recep_citas_hoy_api"),
     path("api/recep/citas/<int:pk>/estado/", recep_cita_estado_api, name="recep_cita_estado_api"),
     path("api/recep/replanificar/alertas/", recep_replanificar_alertas_api, name="recep_replanificar_alertas_api"),
     path("api/recep/replanificar/disponibilidad/", recep_replanificar_disponibilidad_api, name="recep_replanificar_disponibilidad_api"),
     path("api/recep/replanificar/cita/", recep_replanificar_cita_api, name="recep_replanificar_cita_api"),
+    path("api/recep/replanificar/lote/", recep_replanificar_lote_api, name="recep_replanificar_lote_api"),
     path("api/recep/clientes/<int:cliente_id>/historial/", recep_historial_citas_cliente_api, name="recep_historial_citas_cliente_api"),
+    path("api/recep/lote/", recep_lote_api, name="recep_lote_api"),
+    path("api/recep/eventos/", recep_eventos_api, name="recep_eventos_api"),
 ]
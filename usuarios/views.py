@@ -1,19 +1,40 @@
+import asyncio
+import base64
+import hashlib
 import json
+import logging
 import math
 from datetime import datetime, timedelta, date
+from urllib.parse import parse_qsl, urlsplit
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth import logout
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.views import LoginView
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.paginator import Paginator
-from django.db.models import Q
-from django.http import Http404, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, Q, Subquery, prefetch_related_objects
+from django.http import (
+    Http404,
+    HttpRequest,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    JsonResponse,
+    QueryDict,
+    StreamingHttpResponse,
+)
 from django.shortcuts import redirect, render
-from django.urls import reverse, reverse_lazy
+from django.urls import Resolver404, resolve, reverse, reverse_lazy
+from django.views.decorators.cache import cache_control
 from django.views.decorators.http import require_http_methods
 from django.views.generic import TemplateView
 from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 
 from .forms import (
     ClienteAuthenticationForm,
@@ -27,6 +48,9 @@ from .forms import (
     RecepcionistaPerfilForm,
     VeterinarioPerfilForm,
 )
+from . import busqueda, catalogo
+from .contexto import contexto_rol
+from .normalizacion import normalizar_rut, normalizar_telefono, parece_rut, parece_telefono
 from .models import (
     Administrador,
     Cliente,
@@ -37,43 +61,68 @@ from .models import (
     ServicioSeccion,
     Veterinario,
 )
-from veterinarios.models import DisponibilidadVeterinario, DiaBloqueadoVeterinario
-from agenda.models import Cita
+from veterinarios.models import (
+    DisponibilidadVeterinario,
+    DiaBloqueadoVeterinario,
+    PlantillaDisponibilidad,
+)
+from veterinarios.plantillas import MAX_DIAS_EXPANSION, expandir_plantilla, franjas_se_traslapan
+from agenda.eventos import CANAL_RECEPCION, EVENTO_REINICIO, broker, canal_veterinario
+from agenda.models import Cita, FranjaLibre
+from agenda.reservas import SlotOcupado, guardar_cita
+from agenda.disponibilidad import primeros_huecos
+from agenda.models import Eliminacion
+from agenda.sincronizacion import TokenVencido, eliminados_desde, emitir_token, leer_token
+from agenda.replanificacion import (
+    HORIZONTE_DIAS,
+    MOTIVO_REPLANIFICACION,
+    aplicar_replanificacion,
+    proponer_replanificacion,
+)
+from agenda.slots import SLOT_MINUTES, DiaSlots
+from webapp_pochita.basedatos import transaccion_lectura
+from webapp_pochita.replica import lectura_en_replica
 
+logger = logging.getLogger(__name__)
 
 
 class LoginSelectorView(TemplateView):
     template_name = "usuarios/login_selector.html"
 
 
-def _require_veterinario(request):
-    if not request.user.is_authenticated:
+def _require_rol(request, rol, solo_para, no_encontrado):
+    """
+    Objeto del rol del usuario, desde el contexto de rol de la peticion
+    (ver usuarios.contexto), o HttpResponseForbidden.
+    """
+    contexto = contexto_rol(request)
+    if contexto.user_id is None:
         return HttpResponseForbidden("No autenticado.")
-    try:
-        perfil = request.user.perfil
-    except Perfil.DoesNotExist:
+    if contexto.perfil_id is None:
         return HttpResponseForbidden("Usuario sin perfil.")
-    if perfil.rol != Perfil.Roles.VETERINARIO:
-        return HttpResponseForbidden("Solo disponible para veterinarios.")
-    try:
-        return Veterinario.objects.get(perfil=perfil)
-    except Veterinario.DoesNotExist:
-        return HttpResponseForbidden("Veterinario no encontrado.")
+    if contexto.rol != rol:
+        return HttpResponseForbidden(solo_para)
+    if contexto.objeto is None:
+        return HttpResponseForbidden(no_encontrado)
+    return contexto.objeto
+
+
+def _require_veterinario(request):
+    return _require_rol(
+        request,
+        Perfil.Roles.VETERINARIO,
+        "Solo disponible para veterinarios.",
+        "Veterinario no encontrado.",
+    )
 
 
 def _require_recepcionista(request):
-    if not request.user.is_authenticated:
-        return HttpResponseForbidden("No autenticado.")
-    try:
-        perfil = request.user.perfil
-    except Perfil.DoesNotExist:
-        return HttpResponseForbidden("Usuario sin perfil.")
-    if perfil.rol != Perfil.Roles.RECEPCIONISTA:
-        return HttpResponseForbidden("Solo disponible para recepcionistas.")
-    try:
-        return Recepcionista.objects.get(perfil=perfil)
-    except Recepcionista.DoesNotExist:
-        return HttpResponseForbidden("Recepcionista no encontrado.")
+    return _require_rol(
+        request,
+        Perfil.Roles.RECEPCIONISTA,
+        "Solo disponible para recepcionistas.",
+        "Recepcionista no encontrado.",
+    )
 
 
 class ClienteLoginView(LoginView):
@@ -120,12 +169,7 @@ class RolRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
     raise_exception = True
 
     def test_func(self):
-        user = self.request.user
-        try:
-            perfil = user.perfil
-        except Perfil.DoesNotExist:
-            return False
-        return perfil.rol == self.required_role
+        return contexto_rol(self.request).rol == self.required_role
 
 
 class PerfilDashboardMixin(RolRequiredMixin, TemplateView):
@@ -135,15 +179,19 @@ class PerfilDashboardMixin(RolRequiredMixin, TemplateView):
 
     form_class = None
     model = None
+    _instance = None
 
     def get_instance(self):
-        try:
-            return (
-                self.model.objects.select_related("perfil__user")
-                .get(perfil__user=self.request.user)
-            )
-        except self.model.DoesNotExist:
-            raise Http404("Perfil no encontrado para el usuario logueado.")
+        # get_form y get_context_data la piden varias veces por peticion.
+        if self._instance is None:
+            objeto_id = contexto_rol(self.request).objeto_id
+            try:
+                self._instance = self.model.objects.select_related("perfil__user").get(
+                    pk=objeto_id, perfil__user=self.request.user
+                )
+            except self.model.DoesNotExist:
+                raise Http404("Perfil no encontrado para el usuario logueado.")
+        return self._instance
 
     def get_initial(self, instance):
         direccion = getattr(instance, "direccion", "") or ""
@@ -218,16 +266,13 @@ class DashboardClienteView(PerfilDashboardMixin):
             .first()
         )
         context["citas_total"] = Cita.objects.filter(cliente=cliente).count()
-        context["servicio_secciones"] = (
-            ServicioSeccion.objects.filter(activo=True)
-            .prefetch_related("servicios")
-            .order_by("orden", "nombre")
-        )
-        context["servicios"] = (
-            Servicio.objects.filter(activo=True, seccion__activo=True)
-            .select_related("seccion")
-            .order_by("seccion__orden", "nombre")
-        )
+        context["servicio_secciones"] = catalogo.secciones_activas()
+        context["servicios"] = [
+            servicio
+            for seccion in context["servicio_secciones"]
+            for servicio in sorted(seccion["servicios"], key=lambda s: s["nombre"])
+            if servicio["activo"]
+        ]
         context["citas_cliente"] = (
             Cita.objects.filter(cliente=cliente)
             .select_related("mascota", "servicio", "veterinario__perfil__user")
@@ -307,15 +352,11 @@ class DashboardRecepcionistaView(PerfilDashboardMixin):
             .order_by("perfil__user__last_name", "perfil__user__first_name", "perfil__user__username")
         )
         if query:
-            clientes_qs = clientes_qs.filter(
-                Q(perfil__user__first_name__icontains=query)
-                | Q(perfil__user__last_name__icontains=query)
-                | Q(perfil__user__username__icontains=query)
-                | Q(perfil__user__email__icontains=query)
-                | Q(rut__icontains=query)
-                | Q(telefono__icontains=query)
-                | Q(mascotas__nombre__icontains=query)
-            ).distinct()
+            exacto = _filtro_contacto_exacto(query)
+            if exacto is not None and clientes_qs.filter(exacto).exists():
+                clientes_qs = clientes_qs.filter(exacto)
+            else:
+                clientes_qs = clientes_qs.filter(_filtro_busqueda_clientes(query))
         paginator = Paginator(clientes_qs, 10)
         page_number = self.request.GET.get("page")
         page_obj = paginator.get_page(page_number)
@@ -341,11 +382,7 @@ class DashboardRecepcionistaView(PerfilDashboardMixin):
             .order_by("-actualizado_en")[:5]
         )
         context["alertas_canceladas"] = recientes
-        context["servicio_secciones"] = (
-            ServicioSeccion.objects.filter(activo=True)
-            .prefetch_related("servicios")
-            .order_by("orden", "nombre")
-        )
+        context["servicio_secciones"] = catalogo.secciones_activas()
         return context
 
     def post(self, request, *args, **kwargs):
@@ -389,50 +426,41 @@ class DashboardVeterinarioView(PerfilDashboardMixin):
         return base
 
     def get_context_data(self, **kwargs):
+        """
+        Solo se incrusta la semana visible; el resto de la agenda lo pide el
+        navegador a las APIs con ventana de fechas a medida que se navega.
+        """
         context = super().get_context_data(**kwargs)
         vet = self.get_instance()
-        bloques = (
-            DisponibilidadVeterinario.objects.filter(veterinario=vet)
-            .order_by("fecha", "hora_inicio")
+        hoy = timezone.now().date()
+        desde = hoy - timedelta(days=hoy.weekday())
+        hasta = desde + timedelta(days=6)
+        bloques = DisponibilidadVeterinario.objects.filter(
+            veterinario=vet, fecha__range=(desde, hasta)
+        ).order_by("fecha", "hora_inicio")
+        dias_bloqueados = DiaBloqueadoVeterinario.objects.filter(
+            veterinario=vet, fecha__range=(desde, hasta)
+        ).order_by("fecha")
+        citas = Cita.objects.filter(veterinario=vet).select_related(
+            "cliente__perfil__user",
+            "mascota",
+            "servicio",
+            "veterinario__perfil__user",
         )
-        dias_bloqueados = DiaBloqueadoVeterinario.objects.filter(veterinario=vet)
-        citas = (
-            Cita.objects.filter(veterinario=vet)
-            .select_related(
-                "cliente__perfil__user",
-                "mascota",
-                "servicio",
-            )
-            .order_by("fecha", "hora")
+        proxima = (
+            citas.filter(fecha__gte=hoy)
+            .exclude(estado=Cita.Estado.CANCELADA)
+            .order_by("fecha", "hora", "id")
+            .first()
         )
         data = {
-            "disponibilidad": [
-                {
-                    "id": b.id,
-                    "fecha": b.fecha.isoformat(),
-                    "inicio": b.hora_inicio.strftime("%H:%M"),
-                    "fin": b.hora_fin.strftime("%H:%M"),
-                    "estado": b.estado,
-                }
-                for b in bloques
-            ],
+            "ventana": {"desde": desde.isoformat(), "hasta": hasta.isoformat()},
+            "disponibilidad": [_serialize_bloque(b) for b in bloques],
             "dias_bloqueados": [d.fecha.isoformat() for d in dias_bloqueados],
-            "citas": [
-                {
-                    "id": c.id,
-                    "fecha": c.fecha.isoformat(),
-                    "hora": c.hora.strftime("%H:%M"),
-                    "cliente": c.cliente.perfil.user.get_full_name() or c.cliente.perfil.user.username,
-                    "contacto": c.cliente.telefono,
-                    "mascota": c.mascota.nombre,
-                    "especie": c.mascota.tipo,
-                    "edad": f"{c.mascota.edad_aproximada or ''}".strip(),
-                    "servicio": c.servicio.nombre if c.servicio else "",
-                    "estado": c.estado,
-                    "notas": c.notas or "",
-                }
-                for c in citas
-            ],
+            "citas": _serialize_citas(
+                citas.filter(fecha__range=(desde, hasta)).order_by("fecha", "hora", "id")
+            ),
+            "proxima_cita": proxima and _serialize_cita(proxima),
         }
         context["vet_data_json"] = json.dumps(data)
         return context
@@ -456,17 +484,13 @@ class DashboardAdministradorView(PerfilDashboardMixin):
             "servicio_seccion_form", ServicioSeccionForm()
         )
         context["servicio_form"] = kwargs.get("servicio_form", ServicioForm())
-        context["servicio_secciones"] = (
-            ServicioSeccion.objects.all()
-            .prefetch_related("servicios")
-            .order_by("orden", "nombre")
-        )
-        context["servicios"] = Servicio.objects.select_related("seccion").all()
-        context["servicios_sin_seccion"] = (
-            Servicio.objects.filter(seccion__isnull=True)
-            .select_related("seccion")
-            .order_by("nombre")
-        )
+        datos = catalogo.catalogo()
+        context["servicio_secciones"] = datos["secciones"]
+        context["servicios"] = [
+            *(servicio for seccion in datos["secciones"] for servicio in seccion["servicios"]),
+            *datos["sin_seccion"],
+        ]
+        context["servicios_sin_seccion"] = datos["sin_seccion"]
         return context
 
     def post(self, request, *args, **kwargs):
@@ -572,8 +596,6 @@ def _parse_json(request):
     except json.JSONDecodeError:
         return {}
 
-SLOT_MINUTES = 15
-
 
 def _slot_minutes():
     return SLOT_MINUTES
@@ -593,9 +615,10 @@ def _ceil_to_slot(minutes: int) -> int:
     return int(math.ceil(minutes / base) * base)
 
 
-def _floor_to_slot(minutes: int) -> int:
-    base = _slot_minutes()
-    return int(math.floor(minutes / base) * base)
+def _rango_mes(year, month):
+    primero = date(year, month, 1)
+    siguiente = date(year + month // 12, month % 12 + 1, 1)
+    return primero, siguiente - timedelta(days=1)
 
 
 def _servicio_duracion_min(servicio):
@@ -619,33 +642,7 @@ def _cita_hora_fin(cita):
     return _hora_fin_desde_inicio(cita.hora, _servicio_duracion_min(cita.servicio))
 
 
-def _restar_intervalos(disponible_inicio, disponible_fin, ocupados):
-    intervalos = [(disponible_inicio, disponible_fin)]
-    for o_inicio, o_fin in ocupados:
-        if o_fin <= disponible_inicio or o_inicio >= disponible_fin:
-            continue
-        nuevos = []
-        for inicio, fin in intervalos:
-            if o_fin <= inicio or o_inicio >= fin:
-                nuevos.append((inicio, fin))
-                continue
-            if o_inicio > inicio:
-                nuevos.append((inicio, o_inicio))
-            if o_fin < fin:
-                nuevos.append((o_fin, fin))
-        intervalos = nuevos
-        if not intervalos:
-            break
-    alineados = []
-    for inicio, fin in intervalos:
-        ini_slot = _ceil_to_slot(inicio)
-        fin_slot = _floor_to_slot(fin)
-        if ini_slot < fin_slot:
-            alineados.append((ini_slot, fin_slot))
-    return alineados
-
-
-def _build_busy_intervals(vet, fecha, exclude_cita_id=None):
+def _build_busy_slots(vet, fecha, exclude_cita_id=None):
     qs = (
         Cita.objects.filter(veterinario=vet, fecha=fecha)
         .exclude(estado=Cita.Estado.CANCELADA)
@@ -653,17 +650,17 @@ def _build_busy_intervals(vet, fecha, exclude_cita_id=None):
     )
     if exclude_cita_id:
         qs = qs.exclude(id=exclude_cita_id)
-    ocupados = []
-    for c in qs:
-        inicio = _time_to_minutes(c.hora)
-        fin = _time_to_minutes(_cita_hora_fin(c))
-        ocupados.append((inicio, fin))
-    return ocupados
+    return DiaSlots.ocupados_por(
+        (_time_to_minutes(c.hora), _time_to_minutes(_cita_hora_fin(c))) for c in qs
+    )
 
 
-def _intervalos_disponibles_para_bloque(bloque, ocupados):
-    return _restar_intervalos(
-        _time_to_minutes(bloque.hora_inicio), _time_to_minutes(bloque.hora_fin), ocupados
+def _slots_libres_bloque(bloque, ocupados):
+    return (
+        DiaSlots.desde_rango(
+            _time_to_minutes(bloque.hora_inicio), _time_to_minutes(bloque.hora_fin)
+        )
+        - ocupados
     )
 
 
@@ -674,18 +671,183 @@ def _rango_disponible(vet, fecha, inicio, fin, exclude_cita_id=None):
     end_min = _time_to_minutes(fin)
     if end_min <= start_min:
         return False
-    ocupados = _build_busy_intervals(vet, fecha, exclude_cita_id)
+    pedido = DiaSlots.ocupados_por([(start_min, end_min)])
+    ocupados = _build_busy_slots(vet, fecha, exclude_cita_id)
     bloques = DisponibilidadVeterinario.objects.filter(
         veterinario=vet,
         fecha=fecha,
         estado=DisponibilidadVeterinario.Estado.DISPONIBLE,
     )
-    for bloque in bloques:
-        libres = _intervalos_disponibles_para_bloque(bloque, ocupados)
-        for libre_inicio, libre_fin in libres:
-            if start_min >= libre_inicio and end_min <= libre_fin:
-                return True
-    return False
+    return any(_slots_libres_bloque(bloque, ocupados).contiene(pedido) for bloque in bloques)
+
+
+def _respuesta_conflicto(exc):
+    return HttpResponse(str(exc), status=409, content_type="text/plain; charset=utf-8")
+
+
+TAMANO_LOTE_STREAMING = 500
+TAMANO_TROZO_STREAMING = 64 * 1024
+
+
+def _validadores(*alcances):
+    """
+    ETag y Last-Modified baratos para una respuesta de solo lectura. Cada
+    alcance es ``(queryset, campo_fecha)``; se resume con un COUNT y un MAX
+    del campo, sin traer filas. Un alta o edicion dentro del alcance cambia
+    la fecha maxima. Una baja solo baja el conteo y no mueve Last-Modified,
+    por eso los alcances incluyen las lapidas de lo borrado (``_lapidas``).
+    """
+    partes = []
+    ultimo = None
+    for qs, campo in alcances:
+        resumen = qs.order_by().aggregate(total=Count("id"), ultimo=Max(campo))
+        partes.append(f"{resumen['total']}:{resumen['ultimo'] and resumen['ultimo'].isoformat()}")
+        if resumen["ultimo"] and (ultimo is None or resumen["ultimo"] > ultimo):
+            ultimo = resumen["ultimo"]
+    etag = '"%s"' % hashlib.md5("|".join(partes).encode()).hexdigest()
+    # Last-Modified tiene resolucion de segundos: si el ultimo cambio es del
+    # segundo en curso, otro cambio dentro del mismo segundo no lo moveria y
+    # un If-Modified-Since responderia 304 con datos viejos. Hasta que ese
+    # segundo termine solo se valida con el ETag.
+    if ultimo and int(ultimo.timestamp()) >= int(timezone.now().timestamp()):
+        ultimo = None
+    return etag, ultimo and int(ultimo.timestamp())
+
+
+def _lapidas(modelos, veterinario_id=None, **filtro_fecha):
+    """Alcance con las lapidas (agenda.Eliminacion) de ``modelos`` para ``_validadores``."""
+    lapidas = Eliminacion.objects.filter(modelo__in=modelos, **filtro_fecha)
+    if veterinario_id:
+        lapidas = lapidas.filter(veterinario_id=veterinario_id)
+    return lapidas, "eliminado_en"
+
+
+def _respuesta_condicional(request, alcances, construir):
+    """
+    Devuelve 304 si la copia del cliente sigue vigente; si no, la respuesta
+    de ``construir()`` con los validadores puestos.
+    """
+    etag, last_modified = _validadores(*alcances)
+    no_modificada = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if no_modificada is not None:
+        return no_modificada
+    response = construir()
+    response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+def _json_streaming(request, data, status=200):
+    """
+    StreamingHttpResponse con el JSON de ``data``, un dict cuyos valores
+    pueden ser iteradores (se escriben como arreglo elemento a elemento) o
+    callables (se evaluan al llegar a su clave, despues de consumir los
+    anteriores). El texto sale en trozos de TAMANO_TROZO_STREAMING, asi la
+    memoria no depende del largo de los arreglos. Produce el mismo JSON que
+    ``JsonResponse``.
+
+    Bajo ASGI el contenido es un iterador asincrono: a uno sincronico Django
+    lo consume con ``sync_to_async(list)`` y lo juntaria entero en memoria
+    antes de enviar el primer byte.
+    """
+
+    def trozos():
+        buffer = []
+        largo = 0
+        for texto in _partes_json(data):
+            buffer.append(texto)
+            largo += len(texto)
+            if largo >= TAMANO_TROZO_STREAMING:
+                yield "".join(buffer)
+                buffer = []
+                largo = 0
+        yield "".join(buffer)
+
+    contenido = trozos()
+    if isinstance(request, ASGIRequest):
+        contenido = _trozos_asincronos(contenido)
+    return StreamingHttpResponse(contenido, content_type="application/json", status=status)
+
+
+async def _trozos_asincronos(iterador):
+    """
+    Recorre ``iterador`` pidiendo cada trozo con ``sync_to_async``. Las
+    consultas corren asi en el hilo de la vista, el que tiene abierta la
+    conexion a la base.
+    """
+    siguiente = sync_to_async(next)
+    try:
+        while True:
+            trozo = await siguiente(iterador, None)
+            if trozo is None:
+                return
+            yield trozo
+    finally:
+        # Si el cliente corta, el cursor se cierra en su hilo.
+        await sync_to_async(iterador.close)()
+
+
+def _partes_json(data):
+    yield "{"
+    for n, (clave, valor) in enumerate(data.items()):
+        yield f"{', ' if n else ''}{json.dumps(clave)}: "
+        if callable(valor):
+            valor = valor()
+        if isinstance(valor, (dict, list, tuple, str)) or not hasattr(valor, "__iter__"):
+            yield json.dumps(valor, cls=DjangoJSONEncoder)
+            continue
+        yield "["
+        for i, item in enumerate(valor):
+            yield f"{', ' if i else ''}{json.dumps(item, cls=DjangoJSONEncoder)}"
+        yield "]"
+    yield "}"
+
+
+def _respuesta_cambios(since, citas, bloques, dias, veterinario_id=None, fecha_desde=None):
+    """
+    Modo ``?since=<token>``: citas, bloques y dias bloqueados creados o
+    modificados desde el token, ids eliminados y un token nuevo. Las citas
+    canceladas se informan como cambio con su estado; el cliente decide si
+    las muestra.
+    """
+    try:
+        instante = leer_token(since)
+    except TokenVencido as exc:
+        return HttpResponse(str(exc), status=410, content_type="text/plain; charset=utf-8")
+    except (TypeError, ValueError, OverflowError):
+        return HttpResponseBadRequest("Token invalido.")
+    token = emitir_token()
+    lapidas = {"veterinario_id": veterinario_id, "fecha_desde": fecha_desde}
+    citas = _serialize_citas(citas.filter(actualizado_en__gte=instante).order_by("fecha", "hora"))
+    bloques = [
+        {**_serialize_bloque(b), "veterinario_id": b.veterinario_id}
+        for b in bloques.filter(actualizado_en__gte=instante).order_by("fecha", "hora_inicio")
+    ]
+    dias = [
+        {"id": d.id, "veterinario_id": d.veterinario_id, "fecha": d.fecha.isoformat()}
+        for d in dias.filter(creado_en__gte=instante).order_by("fecha")
+    ]
+
+    def eliminados(modelo, vigentes):
+        # Una fila trasladada deja lapida en su lugar anterior; si el traslado
+        # la dejo dentro del alcance, llega como cambio y no como baja.
+        ids = {fila["id"] for fila in vigentes}
+        return [pk for pk in eliminados_desde(instante, modelo, **lapidas) if pk not in ids]
+
+    return JsonResponse(
+        {
+            "token": token,
+            "citas": citas,
+            "bloques": bloques,
+            "dias_bloqueados": dias,
+            "eliminados": {
+                "citas": eliminados(Eliminacion.Modelo.CITA, citas),
+                "bloques": eliminados(Eliminacion.Modelo.BLOQUE, bloques),
+                "dias_bloqueados": eliminados(Eliminacion.Modelo.DIA_BLOQUEADO, dias),
+            },
+        }
+    )
 
 
 def _serialize_bloque(b):
@@ -728,21 +890,148 @@ def _serialize_cita(c):
     }
 
 
+CAMPOS_CITA = (
+    "id",
+    "fecha",
+    "hora",
+    "hora_fin",
+    "estado",
+    "notas",
+    "motivo_cancelacion",
+    "cancelado_por",
+    "cliente__telefono",
+    "cliente__perfil__user__first_name",
+    "cliente__perfil__user__last_name",
+    "cliente__perfil__user__username",
+    "mascota__nombre",
+    "mascota__tipo",
+    "mascota__edad_aproximada",
+    "servicio_id",
+    "servicio__nombre",
+    "servicio__duracion_min",
+    "servicio__duracion_minutos",
+    "veterinario__perfil__user__first_name",
+    "veterinario__perfil__user__last_name",
+    "veterinario__perfil__user__username",
+)
+
+
+def _filas_cita(qs):
+    """Tuplas con las columnas de CAMPOS_CITA, en el orden de ``qs``."""
+    return qs.values_list(*CAMPOS_CITA)
+
+
+def _iter_filas_cita(filas):
+    """
+    Mismo JSON que ``_serialize_cita`` pero desde tuplas de ``_filas_cita``:
+    sin instanciar Cita, Cliente, Mascota, Servicio ni usuarios. Fechas y
+    horas se formatean una vez por valor distinto. Es un generador, asi que
+    puede alimentar una respuesta en streaming sin armar la lista.
+    """
+    fechas = {}
+    horas = {}
+
+    def fmt_fecha(valor):
+        if valor not in fechas:
+            fechas[valor] = valor.isoformat()
+        return fechas[valor]
+
+    def fmt_hora(valor):
+        if valor not in horas:
+            horas[valor] = valor.strftime("%H:%M")
+        return horas[valor]
+
+    for (
+        pk,
+        fecha,
+        hora,
+        hora_fin,
+        estado,
+        notas,
+        motivo_cancelacion,
+        cancelado_por,
+        telefono,
+        cliente_first,
+        cliente_last,
+        cliente_username,
+        mascota_nombre,
+        mascota_tipo,
+        edad,
+        servicio_id,
+        servicio_nombre,
+        duracion_min,
+        duracion_minutos,
+        vet_first,
+        vet_last,
+        vet_username,
+    ) in filas:
+        duracion = (duracion_min or duracion_minutos or _slot_minutes()) if servicio_id else _slot_minutes()
+        yield {
+            "id": pk,
+            "fecha": fmt_fecha(fecha),
+            "hora": fmt_hora(hora),
+            "hora_fin": fmt_hora(hora_fin or _hora_fin_desde_inicio(hora, duracion)),
+            "duracion_min": duracion,
+            "cliente": f"{cliente_first} {cliente_last}".strip() or cliente_username,
+            "contacto": telefono,
+            "mascota": mascota_nombre,
+            "especie": mascota_tipo,
+            "edad": f"{edad or ''}".strip(),
+            "servicio": servicio_nombre if servicio_id else "",
+            "estado": estado,
+            "notas": notas or "",
+            "veterinario": f"{vet_first} {vet_last}".strip() or vet_username,
+            "motivo_cancelacion": motivo_cancelacion or "",
+            "cancelado_por": cancelado_por or "",
+        }
+
+
+def _iter_citas(qs):
+    """Citas de ``qs`` serializadas de a una, leyendo la base por lotes."""
+    return _iter_filas_cita(_filas_cita(qs).iterator(chunk_size=TAMANO_LOTE_STREAMING))
+
+
+def _serialize_citas(qs):
+    """Version por proyeccion de ``[_serialize_cita(c) for c in qs]``."""
+    return list(_iter_filas_cita(_filas_cita(qs)))
+
+
 @require_http_methods(["GET", "POST"])
+@cache_control(private=True, no_cache=True)
 def vet_disponibilidad_api(request):
     vet = _require_veterinario(request)
     if isinstance(vet, HttpResponseForbidden):
         return vet
     if request.method == "GET":
-        bloques = DisponibilidadVeterinario.objects.filter(veterinario=vet).order_by(
-            "fecha", "hora_inicio"
+        try:
+            desde, hasta = _ventana_citas(request)
+        except (TypeError, ValueError):
+            return HttpResponseBadRequest("Rango de fechas invalido.")
+        bloques = DisponibilidadVeterinario.objects.filter(
+            veterinario=vet, fecha__range=(desde, hasta)
         )
-        dias = DiaBloqueadoVeterinario.objects.filter(veterinario=vet).order_by("fecha")
-        return JsonResponse(
-            {
-                "bloques": [_serialize_bloque(b) for b in bloques],
-                "dias_bloqueados": [d.fecha.isoformat() for d in dias],
-            }
+        dias = DiaBloqueadoVeterinario.objects.filter(veterinario=vet, fecha__range=(desde, hasta))
+        return _respuesta_condicional(
+            request,
+            [
+                (bloques, "actualizado_en"),
+                (dias, "creado_en"),
+                _lapidas(
+                    [Eliminacion.Modelo.BLOQUE, Eliminacion.Modelo.DIA_BLOQUEADO],
+                    vet.id,
+                    fecha__range=(desde, hasta),
+                ),
+            ],
+            lambda: JsonResponse(
+                {
+                    "desde": desde.isoformat(),
+                    "hasta": hasta.isoformat(),
+                    "bloques": [
+                        _serialize_bloque(b) for b in bloques.order_by("fecha", "hora_inicio")
+                    ],
+                    "dias_bloqueados": [d.fecha.isoformat() for d in dias.order_by("fecha")],
+                }
+            ),
         )
 
     data = _parse_json(request)
@@ -813,8 +1102,27 @@ def vet_bloquear_dia_api(request):
         citas_existentes = Cita.objects.filter(
             veterinario=vet, fecha=fecha_obj
         ).exclude(estado=Cita.Estado.CANCELADA)
-        if citas_existentes.exists():
+        if citas_existentes.exists() and not (
+            accion == "bloquear" and data.get("replanificar")
+        ):
             return HttpResponseBadRequest("No puedes bloquear un dia con citas agendadas.")
+        if citas_existentes.exists():
+            propuestas = proponer_replanificacion(
+                vet.id, fecha_obj, fecha_obj, ahora=timezone.localtime()
+            )
+            sin_destino = sum(1 for p in propuestas if not p["veterinario_id"])
+            if sin_destino:
+                return HttpResponseBadRequest(
+                    f"No hay horario disponible para replanificar {sin_destino} cita(s)."
+                )
+            try:
+                with transaction.atomic():
+                    aplicar_replanificacion(propuestas)
+                    DisponibilidadVeterinario.objects.filter(veterinario=vet, fecha=fecha_obj).delete()
+                    DiaBloqueadoVeterinario.objects.get_or_create(veterinario=vet, fecha=fecha_obj)
+            except SlotOcupado as exc:
+                return _respuesta_conflicto(exc)
+            return JsonResponse({"bloqueado": True, "replanificadas": len(propuestas)})
         # eliminar bloques de disponibilidad del dia
         DisponibilidadVeterinario.objects.filter(veterinario=vet, fecha=fecha_obj).delete()
     try:
@@ -830,17 +1138,303 @@ def vet_bloquear_dia_api(request):
     return JsonResponse({"bloqueado": True})
 
 
+def _serialize_plantilla(p):
+    return {
+        "id": p.id,
+        "dia_semana": p.dia_semana,
+        "dia": p.get_dia_semana_display(),
+        "inicio": p.hora_inicio.strftime("%H:%M"),
+        "fin": p.hora_fin.strftime("%H:%M"),
+    }
+
+
+def _parse_franjas_plantilla(data):
+    """
+    Franjas (dia_semana, inicio, fin) desde el payload. Acepta una lista en
+    ``franjas`` o ``dias`` + ``inicio`` + ``fin`` para un mismo horario en
+    varios dias. Lanza ValueError con el mensaje para el usuario.
+    """
+    crudas = data.get("franjas")
+    if crudas is None:
+        crudas = [
+            {"dia_semana": dia, "inicio": data.get("inicio"), "fin": data.get("fin")}
+            for dia in data.get("dias") or []
+        ]
+    franjas = []
+    for item in crudas:
+        dia = item.get("dia_semana", item.get("dia"))
+        inicio = item.get("inicio") or item.get("hora_inicio")
+        fin = item.get("fin") or item.get("hora_fin")
+        try:
+            dia = int(dia)
+            inicio = datetime.strptime(str(inicio), "%H:%M").time()
+            fin = datetime.strptime(str(fin), "%H:%M").time()
+        except (TypeError, ValueError):
+            raise ValueError("Franja invalida.")
+        if dia not in PlantillaDisponibilidad.DiaSemana.values:
+            raise ValueError("Dia de semana invalido.")
+        if fin <= inicio:
+            raise ValueError("La hora fin debe ser mayor que la hora inicio.")
+        franjas.append((dia, inicio, fin))
+    if franjas_se_traslapan(franjas):
+        raise ValueError("La plantilla tiene franjas que se traslapan.")
+    return franjas
+
+
+@require_http_methods(["GET", "POST"])
+def vet_plantilla_api(request):
+    vet = _require_veterinario(request)
+    if isinstance(vet, HttpResponseForbidden):
+        return vet
+    plantilla = PlantillaDisponibilidad.objects.filter(veterinario=vet)
+    if request.method == "GET":
+        return JsonResponse({"plantilla": [_serialize_plantilla(p) for p in plantilla]})
+
+    data = _parse_json(request)
+    hoy = timezone.now().date()
+    try:
+        desde = datetime.strptime(str(data.get("desde") or hoy), "%Y-%m-%d").date()
+        hasta = datetime.strptime(
+            str(data.get("hasta") or desde + timedelta(days=90)), "%Y-%m-%d"
+        ).date()
+    except ValueError:
+        return HttpResponseBadRequest("Fecha invalida.")
+    desde = max(desde, hoy)
+    if hasta < desde:
+        return HttpResponseBadRequest("Rango de fechas invalido.")
+    if (hasta - desde).days >= MAX_DIAS_EXPANSION:
+        return HttpResponseBadRequest(f"El rango no puede superar {MAX_DIAS_EXPANSION} dias.")
+
+    if "franjas" in data or "dias" in data:
+        try:
+            franjas = _parse_franjas_plantilla(data)
+        except ValueError as exc:
+            return HttpResponseBadRequest(str(exc))
+        if not franjas:
+            return HttpResponseBadRequest("La plantilla no tiene franjas.")
+        with transaction.atomic():
+            plantilla.delete()
+            PlantillaDisponibilidad.objects.bulk_create(
+                PlantillaDisponibilidad(
+                    veterinario=vet, dia_semana=dia, hora_inicio=inicio, hora_fin=fin
+                )
+                for dia, inicio, fin in franjas
+            )
+    else:
+        franjas = list(plantilla.values_list("dia_semana", "hora_inicio", "hora_fin"))
+        if not franjas:
+            return HttpResponseBadRequest("No hay plantilla guardada.")
+
+    try:
+        creados, omitidos = expandir_plantilla(vet, franjas, desde, hasta)
+    except IntegrityError as exc:
+        # Otro request creo un bloque traslapado entre la lectura y el insert.
+        return HttpResponseBadRequest(str(exc))
+    return JsonResponse(
+        {
+            "plantilla": [
+                _serialize_plantilla(p)
+                for p in PlantillaDisponibilidad.objects.filter(veterinario=vet)
+            ],
+            "desde": desde.isoformat(),
+            "hasta": hasta.isoformat(),
+            "bloques": [_serialize_bloque(b) for b in creados],
+            "omitidos": [
+                {
+                    "fecha": fecha.isoformat(),
+                    "inicio": inicio.strftime("%H:%M"),
+                    "fin": fin.strftime("%H:%M"),
+                    "motivo": motivo,
+                }
+                for fecha, inicio, fin, motivo in omitidos
+            ],
+        },
+        status=201,
+    )
+
+
+VENTANA_CITAS_DIAS = 7
+MAX_DIAS_VENTANA_CITAS = 366
+
+
+def _ventana_citas(request):
+    """
+    Rango ``desde``/``hasta`` (alias ``from``/``to``) de la agenda del
+    veterinario, para sus citas y su disponibilidad. Sin parametros es la
+    semana actual con VENTANA_CITAS_DIAS de margen a cada lado. Lanza
+    ValueError si las fechas no son validas o el rango supera
+    MAX_DIAS_VENTANA_CITAS.
+    """
+    hoy = timezone.now().date()
+    lunes = hoy - timedelta(days=hoy.weekday())
+    desde = request.GET.get("desde") or request.GET.get("from")
+    hasta = request.GET.get("hasta") or request.GET.get("to")
+    desde = (
+        datetime.strptime(desde, "%Y-%m-%d").date()
+        if desde
+        else lunes - timedelta(days=VENTANA_CITAS_DIAS)
+    )
+    hasta = (
+        datetime.strptime(hasta, "%Y-%m-%d").date()
+        if hasta
+        else max(desde, lunes + timedelta(days=6 + VENTANA_CITAS_DIAS))
+    )
+    if hasta < desde or (hasta - desde).days >= MAX_DIAS_VENTANA_CITAS:
+        raise ValueError("Rango de fechas invalido.")
+    return desde, hasta
+
+
+LIMITE_CITAS = 200
+MAX_LIMITE_CITAS = 500
+
+
+def _pagina_por_horario(request, qs):
+    """
+    Paginacion por cursor (keyset) sobre (fecha, hora, id), la misma clave
+    del indice de citas por veterinario: cada pagina sigue el recorrido del
+    indice desde la ultima fila vista, sin OFFSET. Lanza ValueError con un
+    cursor o limite invalidos.
+    """
+    limite = _limite_pagina(request, defecto=LIMITE_CITAS, maximo=MAX_LIMITE_CITAS)
+    cursor = request.GET.get("cursor")
+    if cursor:
+        fecha, hora, pk = _leer_cursor(cursor, 3)
+        fecha = datetime.strptime(fecha, "%Y-%m-%d").date()
+        hora = datetime.strptime(hora, "%H:%M:%S").time()
+        qs = qs.filter(
+            Q(fecha__gt=fecha)
+            | Q(fecha=fecha, hora__gt=hora)
+            | Q(fecha=fecha, hora=hora, id__gt=int(pk))
+        )
+    return qs.order_by("fecha", "hora", "id"), limite
+
+
+def _pagina_citas(qs, limite):
+    """
+    ``(citas, paginacion)`` de una pagina. ``citas`` es un generador y
+    ``paginacion`` queda completa recien al terminar de recorrerlo.
+    """
+    paginacion = {"next_cursor": None, "has_more": False}
+
+    def filas():
+        ultima = None
+        for n, fila in enumerate(
+            _filas_cita(qs)[: limite + 1].iterator(chunk_size=TAMANO_LOTE_STREAMING)
+        ):
+            if n == limite:
+                pk, fecha, hora = ultima[:3]
+                paginacion["has_more"] = True
+                paginacion["next_cursor"] = _codificar_cursor(
+                    [fecha.isoformat(), hora.strftime("%H:%M:%S"), pk]
+                )
+                break
+            ultima = fila
+            yield fila
+
+    return _iter_filas_cita(filas()), paginacion
+
+
 @require_http_methods(["GET"])
+@cache_control(private=True, no_cache=True)
 def vet_citas_api(request):
+    """
+    Citas del veterinario en una ventana de fechas, por paginas. Con
+    ``?since=<token>`` devuelve solo los cambios desde el token.
+    """
     vet = _require_veterinario(request)
     if isinstance(vet, HttpResponseForbidden):
         return vet
-    citas = (
-        Cita.objects.filter(veterinario=vet)
-        .select_related("cliente__perfil__user", "mascota", "servicio")
-        .order_by("fecha", "hora")
+    citas = Cita.objects.filter(veterinario=vet)
+    if request.GET.get("since"):
+        return _respuesta_cambios(
+            request.GET["since"],
+            citas,
+            DisponibilidadVeterinario.objects.filter(veterinario=vet),
+            DiaBloqueadoVeterinario.objects.filter(veterinario=vet),
+            veterinario_id=vet.id,
+        )
+    try:
+        desde, hasta = _ventana_citas(request)
+        pagina, limite = _pagina_por_horario(request, citas.filter(fecha__range=(desde, hasta)))
+    except (TypeError, ValueError):
+        return HttpResponseBadRequest("Parametros de ventana o paginacion invalidos.")
+
+    def construir():
+        data, paginacion = _pagina_citas(pagina, limite)
+        return _json_streaming(
+            request,
+            {
+                "token": emitir_token(),
+                "desde": desde.isoformat(),
+                "hasta": hasta.isoformat(),
+                "citas": data,
+                "next_cursor": lambda: paginacion["next_cursor"],
+                "has_more": lambda: paginacion["has_more"],
+            }
+        )
+
+    return _respuesta_condicional(
+        request,
+        [
+            (pagina, "actualizado_en"),
+            _lapidas([Eliminacion.Modelo.CITA], vet.id, fecha__range=(desde, hasta)),
+        ],
+        construir,
     )
-    return JsonResponse({"citas": [_serialize_cita(c) for c in citas]})
+
+
+LATIDO_EVENTOS = 15
+DURACION_MAX_EVENTOS = 300
+REINTENTO_EVENTOS_MS = 3000
+
+
+def _mensaje_evento(evento):
+    nombre = evento["tipo"]
+    lineas = [f"id: {evento['token']}"] if evento.get("token") else []
+    lineas += [f"event: {nombre}", f"data: {json.dumps(evento)}"]
+    return "\n".join(lineas) + "\n\n"
+
+
+def _respuesta_eventos(request, canales):
+    """
+    Flujo Server-Sent Events con los avisos de agenda de ``canales``. Envia
+    un comentario cada LATIDO_EVENTOS segundos para que proxies y
+    navegador no corten la conexion, y la cierra tras DURACION_MAX_EVENTOS
+    para repartir las reconexiones entre procesos. Sin servidor ASGI
+    responde 204 y el navegador no reintenta.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    async def flujo():
+        suscripcion = broker.suscribir(canales)
+        limite = asyncio.get_running_loop().time() + DURACION_MAX_EVENTOS
+        try:
+            yield f"retry: {REINTENTO_EVENTOS_MS}\n\n"
+            while asyncio.get_running_loop().time() < limite:
+                evento = await suscripcion.siguiente(LATIDO_EVENTOS)
+                if evento is None:
+                    yield ": latido\n\n"
+                    continue
+                yield _mensaje_evento(evento)
+                if evento is EVENTO_REINICIO:
+                    return
+        finally:
+            broker.cancelar(suscripcion)
+
+    response = StreamingHttpResponse(flujo(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@require_http_methods(["GET"])
+async def vet_eventos_api(request):
+    """Avisos en vivo de cambios en la agenda del veterinario."""
+    vet = await sync_to_async(_require_veterinario)(request)
+    if isinstance(vet, HttpResponseForbidden):
+        return vet
+    return _respuesta_eventos(request, [canal_veterinario(vet.id)])
 
 
 @require_http_methods(["POST"])
@@ -866,7 +1460,10 @@ def vet_cita_estado_api(request, pk):
     update_fields = ["estado", "actualizado_en"]
     if estado == Cita.Estado.CANCELADA:
         update_fields += ["motivo_cancelacion", "cancelado_por"]
-    cita.save(update_fields=update_fields)
+    try:
+        guardar_cita(cita, update_fields=update_fields)
+    except SlotOcupado as exc:
+        return _respuesta_conflicto(exc)
     return JsonResponse({"cita": _serialize_cita(cita)})
 
 
@@ -895,6 +1492,173 @@ def _serialize_mascota(m):
     }
 
 
+TOPE_TOTAL_APROXIMADO = 1000
+
+
+# Modo que emitio un cursor de recep_clientes_api; la pagina siguiente
+# debe seguir por el mismo camino.
+CURSOR_CONTACTO = "c"
+CURSOR_RELEVANCIA = "r"
+CURSOR_NOMBRE = "n"
+
+
+def _codificar_cursor(valores, modo=None):
+    if modo is not None:
+        valores = [modo, *valores]
+    return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode().rstrip("=")
+
+
+def _decodificar_cursor(cursor):
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception as exc:
+        raise ValueError("Cursor invalido.") from exc
+    if not isinstance(valores, list):
+        raise ValueError("Cursor invalido.")
+    return valores
+
+
+def _leer_cursor(cursor, largo, modo=None):
+    """
+    Los ``largo`` valores del cursor opaco; lanza ValueError si no es valido.
+    Con ``modo`` el cursor debe haber sido emitido con ese mismo modo.
+    """
+    valores = _decodificar_cursor(cursor)
+    if modo is not None:
+        if not valores or valores[0] != modo:
+            raise ValueError("Cursor invalido.")
+        valores = valores[1:]
+    if len(valores) != largo:
+        raise ValueError("Cursor invalido.")
+    return valores
+
+
+def _modo_cursor(cursor):
+    """Modo con que se emitio ``cursor``; None sin cursor."""
+    if not cursor:
+        return None
+    valores = _decodificar_cursor(cursor)
+    if not valores or valores[0] not in (CURSOR_CONTACTO, CURSOR_RELEVANCIA, CURSOR_NOMBRE):
+        raise ValueError("Cursor invalido.")
+    return valores[0]
+
+
+def _rango_prefijo(campo, prefijo):
+    # En SQLite un LIKE 'x%' no usa el indice (compara sin distinguir
+    # mayusculas); el rango equivalente si.
+    return Q(**{f"{campo}__gte": prefijo, f"{campo}__lt": prefijo + "~"})
+
+
+def _filtro_contacto_exacto(q):
+    """
+    Camino rapido para busquedas que parecen RUT o telefono: prefijo sobre
+    las columnas normalizadas e indexadas. None si ``q`` no tiene esa forma.
+    """
+    filtro = Q()
+    if parece_rut(q):
+        filtro |= _rango_prefijo("rut_normalizado", normalizar_rut(q))
+    if parece_telefono(q):
+        filtro |= _rango_prefijo("telefono_normalizado", normalizar_telefono(q))
+    return filtro or None
+
+
+def _filtro_busqueda_clientes(q):
+    """
+    Clientes que calzan con ``q``: por el indice de busqueda si existe, si no
+    con icontains sobre usuario, cliente y mascotas. Las mascotas van en una
+    subconsulta para no repetir filas ni necesitar DISTINCT.
+    """
+    if busqueda.disponible():
+        return Q(id__in=busqueda.filtro_ids(q))
+    return (
+        Q(perfil__user__first_name__icontains=q)
+        | Q(perfil__user__last_name__icontains=q)
+        | Q(perfil__user__username__icontains=q)
+        | Q(perfil__user__email__icontains=q)
+        | Q(rut__icontains=q)
+        | Q(telefono__icontains=q)
+        | Q(id__in=Subquery(Mascota.objects.filter(nombre__icontains=q).values("cliente_id")))
+    )
+
+
+def _limite_pagina(request, defecto=10, maximo=50):
+    return min(max(int(request.GET.get("limite") or defecto), 1), maximo)
+
+
+def _pagina_por_relevancia(request, q, modo=None):
+    """
+    Pagina de clientes ordenada por relevancia en el indice de busqueda. El
+    cursor guarda el puntaje bm25 y el id de la ultima fila (keyset): la
+    pagina siguiente filtra despues de ella en vez de saltar filas con
+    OFFSET.
+    """
+    limite = _limite_pagina(request)
+    despues = None
+    cursor = request.GET.get("cursor")
+    if cursor:
+        puntaje, pk = _leer_cursor(cursor, 2, modo)
+        if type(puntaje) not in (int, float) or type(pk) is not int:
+            raise ValueError("Cursor invalido.")
+        despues = (puntaje, pk)
+    encontrados = busqueda.buscar(q, limite + 1, despues)
+    has_more = len(encontrados) > limite
+    encontrados = encontrados[:limite]
+    por_id = Cliente.objects.select_related("perfil__user").in_bulk(
+        [pk for pk, _ in encontrados]
+    )
+    filas = [por_id[pk] for pk, _ in encontrados if pk in por_id]
+    paginacion = {"next_cursor": None, "has_more": has_more}
+    if has_more:
+        pk, puntaje = encontrados[-1]
+        paginacion["next_cursor"] = _codificar_cursor([puntaje, pk], modo)
+    if request.GET.get("total"):
+        total = busqueda.contar(q, TOPE_TOTAL_APROXIMADO)
+        paginacion["total"] = min(total, TOPE_TOTAL_APROXIMADO)
+        paginacion["total_aproximado"] = total > TOPE_TOTAL_APROXIMADO
+    return filas, paginacion
+
+
+def _pagina_por_nombre(request, qs, modo=None):
+    """
+    Paginacion por cursor (keyset) ordenada por apellido, nombre e id del
+    usuario. Cada pagina filtra "despues de la ultima fila vista" en vez de
+    usar OFFSET, y no cuenta filas salvo que se pida ``total=1``; en ese caso
+    el conteo se corta en TOPE_TOTAL_APROXIMADO. Lanza ValueError con un
+    cursor o limite invalidos.
+    """
+    limite = _limite_pagina(request)
+    base = qs
+    qs = qs.order_by("perfil__user__last_name", "perfil__user__first_name", "perfil__user__id")
+    cursor = request.GET.get("cursor")
+    if cursor:
+        apellido, nombre, pk = _leer_cursor(cursor, 3, modo)
+        if not (isinstance(apellido, str) and isinstance(nombre, str) and type(pk) is int):
+            raise ValueError("Cursor invalido.")
+        qs = qs.filter(
+            Q(perfil__user__last_name__gt=apellido)
+            | Q(perfil__user__last_name=apellido, perfil__user__first_name__gt=nombre)
+            | Q(
+                perfil__user__last_name=apellido,
+                perfil__user__first_name=nombre,
+                perfil__user__id__gt=pk,
+            )
+        )
+    filas = list(qs[: limite + 1])
+    has_more = len(filas) > limite
+    filas = filas[:limite]
+    paginacion = {"next_cursor": None, "has_more": has_more}
+    if has_more:
+        user = filas[-1].perfil.user
+        paginacion["next_cursor"] = _codificar_cursor(
+            [user.last_name, user.first_name, user.id], modo
+        )
+    if request.GET.get("total"):
+        total = base.order_by().values("id")[: TOPE_TOTAL_APROXIMADO + 1].count()
+        paginacion["total"] = min(total, TOPE_TOTAL_APROXIMADO)
+        paginacion["total_aproximado"] = total > TOPE_TOTAL_APROXIMADO
+    return filas, paginacion
+
+
 @require_http_methods(["GET"])
 def recep_clientes_api(request):
     recep = _require_recepcionista(request)
@@ -902,35 +1666,45 @@ def recep_clientes_api(request):
         return recep
     q = (request.GET.get("q") or "").strip()
     if len(q) < 2:
-        return JsonResponse({"results": [], "count": 0, "page": 1, "pages": 0})
-    page_number = int(request.GET.get("page") or 1)
-    qs = (
-        Cliente.objects.select_related("perfil__user")
-        .prefetch_related("mascotas")
-        .order_by("perfil__user__last_name", "perfil__user__first_name")
-    )
-    qs = qs.filter(
-        Q(perfil__user__first_name__icontains=q)
-        | Q(perfil__user__last_name__icontains=q)
-        | Q(perfil__user__username__icontains=q)
-        | Q(perfil__user__email__icontains=q)
-        | Q(rut__icontains=q)
-        | Q(telefono__icontains=q)
-        | Q(mascotas__nombre__icontains=q)
-    ).distinct()
-    paginator = Paginator(qs, 10)
-    page_obj = paginator.get_page(page_number)
+        return JsonResponse({"results": [], "next_cursor": None, "has_more": False})
+    try:
+        clientes = []
+        # La primera pagina prueba el camino exacto y, si no encuentra nada,
+        # cae a la busqueda general; las siguientes van al camino que emitio
+        # el cursor.
+        modo = _modo_cursor(request.GET.get("cursor"))
+        exacto = _filtro_contacto_exacto(q)
+        if modo == CURSOR_CONTACTO or (modo is None and exacto is not None):
+            if exacto is None:
+                raise ValueError("Cursor invalido.")
+            clientes, paginacion = _pagina_por_nombre(
+                request,
+                Cliente.objects.select_related("perfil__user").filter(exacto),
+                CURSOR_CONTACTO,
+            )
+        if not clientes and modo != CURSOR_CONTACTO:
+            if busqueda.disponible():
+                clientes, paginacion = _pagina_por_relevancia(request, q, CURSOR_RELEVANCIA)
+            else:
+                clientes, paginacion = _pagina_por_nombre(
+                    request,
+                    Cliente.objects.select_related("perfil__user").filter(
+                        _filtro_busqueda_clientes(q)
+                    ),
+                    CURSOR_NOMBRE,
+                )
+    except ValueError:
+        return HttpResponseBadRequest("Parametros de paginacion invalidos.")
+    prefetch_related_objects(clientes, "mascotas")
     data = []
-    for cliente in page_obj:
+    for cliente in clientes:
         data.append(
             {
                 **_serialize_cliente(cliente),
                 "mascotas": [_serialize_mascota(m) for m in cliente.mascotas.all()],
             }
         )
-    return JsonResponse(
-        {"results": data, "count": paginator.count, "page": page_obj.number, "pages": paginator.num_pages}
-    )
+    return JsonResponse({"results": data, **paginacion})
 
 
 @require_http_methods(["GET"])
@@ -946,16 +1720,13 @@ def recep_cliente_detalle_api(request, cliente_id):
         )
     except Cliente.DoesNotExist:
         return HttpResponseBadRequest("Cliente no encontrado.")
-    citas = (
-        Cita.objects.filter(cliente=cliente)
-        .select_related("mascota", "servicio", "veterinario__perfil__user")
-        .order_by("-fecha", "-hora")
-    )
-    return JsonResponse(
+    citas = Cita.objects.filter(cliente=cliente).order_by("-fecha", "-hora")
+    return _json_streaming(
+        request,
         {
             "cliente": _serialize_cliente(cliente),
             "mascotas": [_serialize_mascota(m) for m in cliente.mascotas.all()],
-            "citas": [_serialize_cita(c) for c in citas],
+            "citas": _iter_citas(citas),
         }
     )
 
@@ -974,18 +1745,17 @@ def recep_servicios_api(request):
     recep = _require_recepcionista(request)
     if isinstance(recep, HttpResponseForbidden):
         return recep
-    servicios = Servicio.objects.filter(activo=True, seccion__activo=True).order_by("nombre")
     return JsonResponse(
         {
             "servicios": [
                 {
-                    "id": s.id,
-                    "nombre": s.nombre,
-                    "duracion_min": getattr(s, "duracion_min", None),
-                    "duracion_minutos": s.duracion_minutos,
-                    "seccion": s.seccion.nombre if s.seccion else "",
+                    "id": s["id"],
+                    "nombre": s["nombre"],
+                    "duracion_min": s["duracion_min"],
+                    "duracion_minutos": s["duracion_minutos"],
+                    "seccion": s["seccion"],
                 }
-                for s in servicios
+                for s in catalogo.servicios_activos()
             ]
         }
     )
@@ -998,11 +1768,8 @@ def recep_veterinarios_api(request):
         return recep
     q = (request.GET.get("q") or "").strip()
     if q and len(q) < 2:
-        return JsonResponse({"results": [], "count": 0, "page": 1, "pages": 0})
-    page_number = int(request.GET.get("page") or 1)
-    qs = Veterinario.objects.select_related("perfil__user").order_by(
-        "perfil__user__last_name", "perfil__user__first_name"
-    )
+        return JsonResponse({"results": [], "next_cursor": None, "has_more": False})
+    qs = Veterinario.objects.select_related("perfil__user")
     if q:
         qs = qs.filter(
             Q(perfil__user__first_name__icontains=q)
@@ -1010,10 +1777,12 @@ def recep_veterinarios_api(request):
             | Q(perfil__user__email__icontains=q)
             | Q(perfil__user__username__icontains=q)
         )
-    paginator = Paginator(qs, 10)
-    page_obj = paginator.get_page(page_number)
+    try:
+        vets, paginacion = _pagina_por_nombre(request, qs)
+    except ValueError:
+        return HttpResponseBadRequest("Parametros de paginacion invalidos.")
     data = []
-    for vet in page_obj:
+    for vet in vets:
         user = vet.perfil.user
         data.append(
             {
@@ -1023,86 +1792,124 @@ def recep_veterinarios_api(request):
                 "especialidad": vet.especialidad or "",
             }
         )
-    return JsonResponse(
-        {"results": data, "count": paginator.count, "page": page_obj.number, "pages": paginator.num_pages}
-    )
+    return JsonResponse({"results": data, **paginacion})
 
 
 @require_http_methods(["GET"])
+@cache_control(private=True, no_cache=True)
 def recep_disponibilidad_api(request):
     recep = _require_recepcionista(request)
     if isinstance(recep, HttpResponseForbidden):
         return recep
-    # Marcar como "no atendida" (cancelada con motivo) citas vencidas sin atender
-    hoy = timezone.now().date()
-    vencidas = Cita.objects.filter(
-        fecha__lt=hoy, estado__in=[Cita.Estado.PENDIENTE, Cita.Estado.CONFIRMADA]
-    )
-    vencidas.update(
-        estado=Cita.Estado.CANCELADA,
-        motivo_cancelacion="No atendida (expiró)",
-        cancelado_por="sistema",
-        actualizado_en=timezone.now(),
-    )
+    # Solo lectura: las citas vencidas se expiran en agenda.expiracion
     vet_id = request.GET.get("veterinario_id")
     year = int(request.GET.get("year") or timezone.now().year)
     month = int(request.GET.get("month") or timezone.now().month)
-    qs = DisponibilidadVeterinario.objects.filter(fecha__year=year, fecha__month=month)
-    bloqueados_qs = DiaBloqueadoVeterinario.objects.filter(fecha__year=year, fecha__month=month)
-    citas_qs = (
-        Cita.objects.filter(fecha__year=year, fecha__month=month)
-        .exclude(estado=Cita.Estado.CANCELADA)
-        .select_related("cliente__perfil__user", "mascota", "servicio", "veterinario__perfil__user")
-    )
+    rango = _rango_mes(year, month)
+    franjas_qs = FranjaLibre.objects.filter(fecha__range=rango)
+    bloqueados_qs = DiaBloqueadoVeterinario.objects.filter(fecha__range=rango)
+    citas_qs = Cita.objects.filter(fecha__range=rango).exclude(estado=Cita.Estado.CANCELADA)
+    # FranjaLibre no tiene fechas de cambio; se valida contra sus fuentes.
+    alcance_citas = Cita.objects.filter(fecha__range=rango)
+    alcance_bloques = DisponibilidadVeterinario.objects.filter(fecha__range=rango)
     if vet_id:
-        qs = qs.filter(veterinario_id=vet_id)
+        franjas_qs = franjas_qs.filter(veterinario_id=vet_id)
         bloqueados_qs = bloqueados_qs.filter(veterinario_id=vet_id)
         citas_qs = citas_qs.filter(veterinario_id=vet_id)
+        alcance_citas = alcance_citas.filter(veterinario_id=vet_id)
+        alcance_bloques = alcance_bloques.filter(veterinario_id=vet_id)
+    return _respuesta_condicional(
+        request,
+        [
+            (alcance_bloques, "actualizado_en"),
+            (alcance_citas, "actualizado_en"),
+            (bloqueados_qs, "creado_en"),
+            _lapidas(Eliminacion.Modelo.values, vet_id, fecha__range=rango),
+        ],
+        lambda: _recep_disponibilidad_respuesta(request, franjas_qs, bloqueados_qs, citas_qs),
+    )
 
-    busy_map = {}
-    for c in citas_qs:
-        key = (c.veterinario_id, c.fecha)
-        busy_map.setdefault(key, []).append(
-            (_time_to_minutes(c.hora), _time_to_minutes(_cita_hora_fin(c)))
-        )
-    for key in busy_map:
-        busy_map[key].sort()
 
-    bloques = []
-    for b in qs.order_by("fecha", "hora_inicio"):
-        if b.estado != DisponibilidadVeterinario.Estado.DISPONIBLE:
-            bloques.append(
-                {
-                    "id": b.id,
-                    "veterinario_id": b.veterinario_id,
-                    "fecha": b.fecha.isoformat(),
-                    "inicio": b.hora_inicio.strftime("%H:%M"),
-                    "fin": b.hora_fin.strftime("%H:%M"),
-                    "estado": b.estado,
-                }
-            )
-            continue
-        libres = _intervalos_disponibles_para_bloque(b, busy_map.get((b.veterinario_id, b.fecha), []))
-        for idx, (ini, fin) in enumerate(libres):
-            bloques.append(
-                {
-                    "id": f"{b.id}-{idx}" if idx else b.id,
-                    "veterinario_id": b.veterinario_id,
-                    "fecha": b.fecha.isoformat(),
-                    "inicio": _minutes_to_hhmm(ini),
-                    "fin": _minutes_to_hhmm(fin),
-                    "estado": b.estado,
-                }
-            )
-    bloqueados = [
+def _recep_disponibilidad_respuesta(request, franjas_qs, bloqueados_qs, citas_qs):
+    bloques = (
         {
-            "id": d.id,
-            "veterinario_id": d.veterinario_id,
-            "fecha": d.fecha.isoformat(),
+            "id": f"{bloque_id}-{orden}" if orden else bloque_id,
+            "veterinario_id": veterinario_id,
+            "fecha": fecha.isoformat(),
+            "inicio": inicio.strftime("%H:%M"),
+            "fin": fin.strftime("%H:%M"),
+            "estado": estado,
         }
-        for d in bloqueados_qs.order_by("fecha")
-    ]
-    return JsonResponse({"bloques": bloques, "dias_bloqueados": bloqueados, "citas": [_serialize_cita(c) for c in citas_qs]})
+        for bloque_id, orden, veterinario_id, fecha, inicio, fin, estado in franjas_qs.order_by(
+            "fecha", "hora_inicio"
+        )
+        .values_list(
+            "bloque_id", "orden", "veterinario_id", "fecha", "hora_inicio", "hora_fin", "estado"
+        )
+        .iterator(chunk_size=TAMANO_LOTE_STREAMING)
+    )
+    bloqueados = (
+        {
+            "id": pk,
+            "veterinario_id": veterinario_id,
+            "fecha": fecha.isoformat(),
+        }
+        for pk, veterinario_id, fecha in bloqueados_qs.order_by("fecha")
+        .values_list("id", "veterinario_id", "fecha")
+        .iterator(chunk_size=TAMANO_LOTE_STREAMING)
+    )
+    return _json_streaming(
+        request,
+        {"bloques": bloques, "dias_bloqueados": bloqueados, "citas": _iter_citas(citas_qs)},
+    )
+
+
+@require_http_methods(["GET"])
+def recep_primer_disponible_api(request):
+    """
+    Primeras horas libres para un servicio considerando a todos los
+    veterinarios, dentro de los proximos ``dias`` (por defecto 30).
+    """
+    recep = _require_recepcionista(request)
+    if isinstance(recep, HttpResponseForbidden):
+        return recep
+    if not request.GET.get("servicio_id"):
+        return HttpResponseBadRequest("Se requiere servicio.")
+    try:
+        servicio_id = int(request.GET["servicio_id"])
+        dias = min(max(int(request.GET.get("dias") or 30), 1), 90)
+        limite = min(max(int(request.GET.get("limite") or 5), 1), 50)
+    except ValueError:
+        return HttpResponseBadRequest("Parametros invalidos.")
+    servicio = Servicio.objects.filter(id=servicio_id).first()
+    if not servicio:
+        return HttpResponseBadRequest("Servicio no encontrado.")
+    ahora = timezone.localtime()
+    duracion_min = _servicio_duracion_min(servicio)
+    huecos = primeros_huecos(
+        duracion_min, ahora.date(), ahora.date() + timedelta(days=dias - 1), limite, ahora=ahora
+    )
+    vets = {
+        v.id: v
+        for v in Veterinario.objects.select_related("perfil__user").filter(
+            id__in={vet_id for _, _, vet_id in huecos}
+        )
+    }
+    resultados = []
+    for fecha, minuto, vet_id in huecos:
+        user = vets[vet_id].perfil.user
+        resultados.append(
+            {
+                "veterinario_id": vet_id,
+                "veterinario": f"{user.first_name} {user.last_name}".strip() or user.username,
+                "fecha": fecha.isoformat(),
+                "hora": _minutes_to_hhmm(minuto),
+                "hora_fin": _minutes_to_hhmm(minuto + _ceil_to_slot(duracion_min)),
+            }
+        )
+    return JsonResponse(
+        {"servicio_id": servicio.id, "duracion_min": duracion_min, "resultados": resultados}
+    )
 
 
 @require_http_methods(["POST"])
@@ -1131,8 +1938,6 @@ def recep_cita_create_api(request):
         return HttpResponseBadRequest("Formato de fecha invalido.")
     duracion_min = _servicio_duracion_min(servicio)
     hora_fin = _hora_fin_desde_inicio(hora_obj, duracion_min)
-    if not _rango_disponible(vet, fecha_obj, hora_obj, hora_fin):
-        return HttpResponseBadRequest("No hay disponibilidad para ese horario y duracion.")
     cita = Cita(
         cliente=cliente,
         mascota=mascota,
@@ -1144,11 +1949,22 @@ def recep_cita_create_api(request):
         notas=data.get("notas") or "",
         estado=Cita.Estado.PENDIENTE,
     )
-    cita.save()
+    # La cita y sus reservas se escriben antes de validar: la escritura toma el
+    # lock de la base y la restriccion unica de ReservaSlot rechaza a quien
+    # llegue segundo al mismo horario.
+    try:
+        with transaction.atomic():
+            guardar_cita(cita)
+            if not _rango_disponible(vet, fecha_obj, hora_obj, hora_fin, exclude_cita_id=cita.id):
+                transaction.set_rollback(True)
+                return HttpResponseBadRequest("No hay disponibilidad para ese horario y duracion.")
+    except SlotOcupado as exc:
+        return _respuesta_conflicto(exc)
     return JsonResponse({"cita": _serialize_cita(cita)}, status=201)
 
 
 @require_http_methods(["GET"])
+@cache_control(private=True, no_cache=True)
 def recep_citas_hoy_api(request):
     recep = _require_recepcionista(request)
     if isinstance(recep, HttpResponseForbidden):
@@ -1157,7 +1973,6 @@ def recep_citas_hoy_api(request):
     qs = (
         Cita.objects.filter(fecha__gte=today)
         .exclude(estado=Cita.Estado.CANCELADA)
-        .select_related("cliente__perfil__user", "mascota", "servicio", "veterinario__perfil__user")
         .order_by("fecha", "hora")
     )
     vet_id = request.GET.get("veterinario_id")
@@ -1166,7 +1981,34 @@ def recep_citas_hoy_api(request):
         qs = qs.filter(veterinario_id=vet_id)
     if servicio_id:
         qs = qs.filter(servicio_id=servicio_id)
-    return JsonResponse({"citas": [_serialize_cita(c) for c in qs]})
+    # El alcance incluye las canceladas: cancelar solo cambia actualizado_en.
+    alcance = Cita.objects.filter(fecha__gte=today)
+    if vet_id:
+        alcance = alcance.filter(veterinario_id=vet_id)
+    if servicio_id:
+        alcance = alcance.filter(servicio_id=servicio_id)
+    if request.GET.get("since"):
+        bloques = DisponibilidadVeterinario.objects.filter(fecha__gte=today)
+        dias = DiaBloqueadoVeterinario.objects.filter(fecha__gte=today)
+        if vet_id:
+            bloques = bloques.filter(veterinario_id=vet_id)
+            dias = dias.filter(veterinario_id=vet_id)
+        return _respuesta_cambios(
+            request.GET["since"],
+            alcance,
+            bloques,
+            dias,
+            veterinario_id=vet_id or None,
+            fecha_desde=today,
+        )
+    return _respuesta_condicional(
+        request,
+        [
+            (alcance, "actualizado_en"),
+            _lapidas([Eliminacion.Modelo.CITA], vet_id, fecha__gte=today),
+        ],
+        lambda: JsonResponse({"token": emitir_token(), "citas": _serialize_citas(qs)}),
+    )
 
 
 @require_http_methods(["POST"])
@@ -1204,11 +2046,15 @@ def recep_cita_estado_api(request, pk):
     update_fields = ["estado", "actualizado_en"]
     if estado == Cita.Estado.CANCELADA:
         update_fields += ["motivo_cancelacion", "cancelado_por"]
-    cita.save(update_fields=update_fields)
+    try:
+        guardar_cita(cita, update_fields=update_fields)
+    except SlotOcupado as exc:
+        return _respuesta_conflicto(exc)
     return JsonResponse({"cita": _serialize_cita(cita)})
 
 
 @require_http_methods(["GET"])
+@lectura_en_replica
 def recep_replanificar_alertas_api(request):
     recep = _require_recepcionista(request)
     if isinstance(recep, HttpResponseForbidden):
@@ -1221,15 +2067,9 @@ def recep_replanificar_alertas_api(request):
             motivo_cancelacion__isnull=False,
             actualizado_en__gte=reciente,
         ).exclude(cancelado_por="replanificada")
-        .select_related("cliente__perfil__user", "mascota", "servicio", "veterinario__perfil__user")
         .order_by("-fecha", "-hora")
     )
-    alertas = []
-    for c in canceladas:
-        base = _serialize_cita(c)
-        base["motivo_cancelacion"] = c.motivo_cancelacion
-        alertas.append(base)
-    return JsonResponse({"alertas": alertas})
+    return JsonResponse({"alertas": _serialize_citas(canceladas)})
 
 
 @require_http_methods(["GET"])
@@ -1245,17 +2085,23 @@ def recep_replanificar_disponibilidad_api(request):
         fecha_obj = datetime.strptime(str(fecha), "%Y-%m-%d").date()
     except Exception:
         return HttpResponseBadRequest("Fecha invalida.")
-    bloques_qs = DisponibilidadVeterinario.objects.filter(
-        veterinario_id=vet_id, fecha=fecha_obj, estado=DisponibilidadVeterinario.Estado.DISPONIBLE
-    ).order_by("hora_inicio")
-    ocupados = _build_busy_intervals(vet_id, fecha_obj)
-    bloques = []
-    for b in bloques_qs:
-        libres = _intervalos_disponibles_para_bloque(b, ocupados)
-        for idx, (ini, fin) in enumerate(libres):
-            bloques.append(
-                {"id": f"{b.id}-{idx}" if idx else b.id, "inicio": _minutes_to_hhmm(ini), "fin": _minutes_to_hhmm(fin)}
-            )
+    franjas = (
+        FranjaLibre.objects.filter(
+            veterinario_id=vet_id,
+            fecha=fecha_obj,
+            estado=DisponibilidadVeterinario.Estado.DISPONIBLE,
+        )
+        .order_by("hora_inicio")
+        .values_list("bloque_id", "orden", "hora_inicio", "hora_fin")
+    )
+    bloques = [
+        {
+            "id": f"{bloque_id}-{orden}" if orden else bloque_id,
+            "inicio": inicio.strftime("%H:%M"),
+            "fin": fin.strftime("%H:%M"),
+        }
+        for bloque_id, orden, inicio, fin in franjas
+    ]
     return JsonResponse({"bloques": bloques})
 
 
@@ -1280,29 +2126,112 @@ def recep_replanificar_cita_api(request):
         return HttpResponseBadRequest("Fecha u hora invalidas.")
     duracion_min = _servicio_duracion_min(cita.servicio)
     hora_fin = _hora_fin_desde_inicio(nueva_hora, duracion_min)
-    if not _rango_disponible(vet, nueva_fecha, nueva_hora, hora_fin, exclude_cita_id=cita.id):
-        return HttpResponseBadRequest("No hay disponibilidad para la nueva duracion.")
-    # cancelar cita original
-    cita.estado = Cita.Estado.CANCELADA
-    cita.motivo_cancelacion = data.get("motivo") or "Replanificada"
-    cita.cancelado_por = "replanificada"
-    cita.save(update_fields=["estado", "motivo_cancelacion", "cancelado_por", "actualizado_en"])
-    # crear nueva
-    nueva = Cita.objects.create(
-        cliente=cita.cliente,
-        mascota=cita.mascota,
-        servicio=cita.servicio,
-        veterinario=vet,
-        fecha=nueva_fecha,
-        hora=nueva_hora,
-        hora_fin=hora_fin,
-        notas=cita.notas,
-        estado=Cita.Estado.PENDIENTE,
-    )
+    try:
+        with transaction.atomic():
+            # cancelar cita original
+            cita.estado = Cita.Estado.CANCELADA
+            cita.motivo_cancelacion = data.get("motivo") or "Replanificada"
+            cita.cancelado_por = "replanificada"
+            cita.save(update_fields=["estado", "motivo_cancelacion", "cancelado_por", "actualizado_en"])
+            # crear nueva
+            nueva = Cita(
+                cliente=cita.cliente,
+                mascota=cita.mascota,
+                servicio=cita.servicio,
+                veterinario=vet,
+                fecha=nueva_fecha,
+                hora=nueva_hora,
+                hora_fin=hora_fin,
+                notas=cita.notas,
+                estado=Cita.Estado.PENDIENTE,
+            )
+            guardar_cita(nueva)
+            if not _rango_disponible(vet, nueva_fecha, nueva_hora, hora_fin, exclude_cita_id=nueva.id):
+                transaction.set_rollback(True)
+                return HttpResponseBadRequest("No hay disponibilidad para la nueva duracion.")
+    except SlotOcupado as exc:
+        return _respuesta_conflicto(exc)
     return JsonResponse({"cita_original": _serialize_cita(cita), "cita_nueva": _serialize_cita(nueva)})
 
 
+def _serialize_propuestas(propuestas):
+    vets = {
+        v.id: v
+        for v in Veterinario.objects.select_related("perfil__user").filter(
+            id__in={p["veterinario_id"] for p in propuestas if p["veterinario_id"]}
+        )
+    }
+    data = []
+    for p in propuestas:
+        destino = None
+        if p["veterinario_id"]:
+            user = vets[p["veterinario_id"]].perfil.user
+            destino = {
+                "veterinario_id": p["veterinario_id"],
+                "veterinario": f"{user.first_name} {user.last_name}".strip() or user.username,
+                "fecha": p["fecha"].isoformat(),
+                "hora": p["hora"].strftime("%H:%M"),
+                "hora_fin": p["hora_fin"].strftime("%H:%M"),
+            }
+        item = {"cita": _serialize_cita(p["cita"]), "destino": destino}
+        if p.get("nueva"):
+            item["cita_nueva_id"] = p["nueva"].id
+        data.append(item)
+    return data
+
+
+@require_http_methods(["POST"])
+def recep_replanificar_lote_api(request):
+    """
+    Propone (o aplica con ``aplicar``) la replanificacion de todas las citas
+    activas de un veterinario en una fecha o rango.
+    """
+    recep = _require_recepcionista(request)
+    if isinstance(recep, HttpResponseForbidden):
+        return recep
+    data = _parse_json(request)
+    vet_id = data.get("veterinario_id")
+    desde = data.get("desde") or data.get("fecha")
+    hasta = data.get("hasta") or desde
+    if not vet_id or not desde:
+        return HttpResponseBadRequest("Se requiere veterinario y fecha.")
+    try:
+        desde = datetime.strptime(str(desde), "%Y-%m-%d").date()
+        hasta = datetime.strptime(str(hasta), "%Y-%m-%d").date()
+    except Exception:
+        return HttpResponseBadRequest("Fecha invalida.")
+    if hasta < desde or (hasta - desde).days > 31:
+        return HttpResponseBadRequest("Rango de fechas invalido.")
+    try:
+        horizonte = min(max(int(data.get("horizonte_dias") or HORIZONTE_DIAS), 1), 60)
+        vet = Veterinario.objects.get(id=vet_id)
+    except (TypeError, ValueError, Veterinario.DoesNotExist):
+        return HttpResponseBadRequest("Datos invalidos.")
+
+    propuestas = proponer_replanificacion(
+        vet.id, desde, hasta, horizonte_dias=horizonte, ahora=timezone.localtime()
+    )
+    aplicar = bool(data.get("aplicar"))
+    if aplicar:
+        motivo = (data.get("motivo") or "").strip()
+        try:
+            aplicar_replanificacion(propuestas, motivo=motivo or MOTIVO_REPLANIFICACION)
+        except SlotOcupado as exc:
+            return _respuesta_conflicto(exc)
+    return JsonResponse(
+        {
+            "veterinario_id": vet.id,
+            "desde": desde.isoformat(),
+            "hasta": hasta.isoformat(),
+            "aplicada": aplicar,
+            "sin_destino": sum(1 for p in propuestas if not p["veterinario_id"]),
+            "propuestas": _serialize_propuestas(propuestas),
+        }
+    )
+
+
 @require_http_methods(["GET"])
+@lectura_en_replica
 def recep_historial_citas_cliente_api(request, cliente_id):
     recep = _require_recepcionista(request)
     if isinstance(recep, HttpResponseForbidden):
@@ -1311,15 +2240,133 @@ def recep_historial_citas_cliente_api(request, cliente_id):
         cliente = Cliente.objects.get(id=cliente_id)
     except Cliente.DoesNotExist:
         return HttpResponseBadRequest("Cliente no encontrado.")
-    citas = (
-        Cita.objects.filter(cliente=cliente)
-        .select_related("mascota", "servicio", "veterinario__perfil__user")
-        .order_by("-fecha", "-hora")
-    )
-    data = []
-    for c in citas:
-        base = _serialize_cita(c)
-        base["motivo_cancelacion"] = c.motivo_cancelacion or ""
-        base["cancelado_por"] = getattr(c, "cancelado_por", "") or ""
-        data.append(base)
-    return JsonResponse({"citas": data})
+    citas = Cita.objects.filter(cliente=cliente).order_by("-fecha", "-hora")
+    return _json_streaming(request, {"citas": _iter_citas(citas)})
+
+
+# === API lote ===
+
+# Solo lecturas de recepcion; las escrituras siguen yendo una por una.
+LOTE_PERMITIDAS = {
+    "recep_clientes_api",
+    "recep_cliente_detalle_api",
+    "recep_mascotas_api",
+    "recep_servicios_api",
+    "recep_veterinarios_api",
+    "recep_disponibilidad_api",
+    "recep_primer_disponible_api",
+    "recep_citas_hoy_api",
+    "recep_replanificar_alertas_api",
+    "recep_replanificar_disponibilidad_api",
+    "recep_historial_citas_cliente_api",
+}
+MAX_LLAMADAS_LOTE = 20
+
+
+def _valor_referencia(referencia, resultados):
+    """
+    Valor de ``$<id>.<ruta>`` (por ejemplo ``$vets.results.0.id``) dentro
+    de los datos de una llamada anterior del lote. Lanza LookupError si no
+    existe.
+    """
+    llamada_id, *ruta = referencia[1:].split(".")
+    valor = resultados[llamada_id]["data"]
+    for paso in ruta:
+        valor = valor[int(paso)] if isinstance(valor, list) else valor[paso]
+    return valor
+
+
+def _sub_request(request, path, params):
+    sub = HttpRequest()
+    sub.method = "GET"
+    sub.path = sub.path_info = path
+    sub.META = {k: v for k, v in request.META.items() if not k.startswith("HTTP_IF_")}
+    sub.META["REQUEST_METHOD"] = "GET"
+    sub.GET = QueryDict(mutable=True)
+    for clave, valor in params.items():
+        # None (o una referencia a un null) equivale a no mandar el parametro.
+        if valor is not None:
+            sub.GET[clave] = str(valor)
+    sub.META["QUERY_STRING"] = sub.GET.urlencode()
+    sub.COOKIES = request.COOKIES
+    sub.session = request.session
+    sub.user = request.user
+    sub.contexto_rol = contexto_rol(request)
+    return sub
+
+
+def _ejecutar_llamada(request, llamada, resultados):
+    url = urlsplit(str(llamada.get("url") or ""))
+    params = dict(parse_qsl(url.query))
+    extra = llamada.get("params") or {}
+    if not isinstance(extra, dict):
+        return {"status": 400, "error": "Los params deben ser un objeto."}
+    for clave, valor in extra.items():
+        if isinstance(valor, str) and valor.startswith("$"):
+            try:
+                valor = _valor_referencia(valor, resultados)
+            except (LookupError, TypeError, ValueError):
+                return {"status": 400, "error": f"Referencia sin valor: {valor}"}
+        params[clave] = valor
+    try:
+        match = resolve(url.path)
+    except Resolver404:
+        return {"status": 404, "error": "Ruta no encontrada."}
+    if match.url_name not in LOTE_PERMITIDAS:
+        return {"status": 400, "error": "Ruta no permitida en lote."}
+    sub = _sub_request(request, url.path, params)
+    sub.resolver_match = match
+    try:
+        response = match.func(sub, *match.args, **match.kwargs)
+        contenido = b"".join(response.streaming_content) if response.streaming else response.content
+    except Exception:
+        # Una llamada que falla no debe botar el resto del lote.
+        logger.exception("Fallo la llamada %s del lote.", url.path)
+        return {"status": 500, "error": "Error interno."}
+    if response.status_code != 200:
+        return {"status": response.status_code, "error": contenido.decode()}
+    return {"status": 200, "data": json.loads(contenido)}
+
+
+@require_http_methods(["POST"])
+def recep_lote_api(request):
+    """
+    Ejecuta varias APIs de lectura de recepcion en una sola ida y vuelta.
+
+    Recibe ``{"llamadas": [{"id", "url", "params"}, ...]}`` y devuelve
+    ``{"resultados": {id: {"status", "data" | "error"}}}``. La sesion y la
+    recepcionista se resuelven una vez para todo el lote, las llamadas se
+    leen dentro de una misma transaccion y las repetidas se responden una
+    sola vez. Un parametro ``$<id>.<ruta>`` toma su valor del resultado de
+    una llamada anterior, por ejemplo el primer veterinario de la lista.
+    """
+    recep = _require_recepcionista(request)
+    if isinstance(recep, HttpResponseForbidden):
+        return recep
+    payload = _parse_json(request)
+    llamadas = payload.get("llamadas") if isinstance(payload, dict) else None
+    if not isinstance(llamadas, list) or not llamadas:
+        return HttpResponseBadRequest("Se requiere la lista de llamadas.")
+    if len(llamadas) > MAX_LLAMADAS_LOTE:
+        return HttpResponseBadRequest(f"Maximo {MAX_LLAMADAS_LOTE} llamadas por lote.")
+    resultados = {}
+    vistas = {}
+    with transaccion_lectura():
+        for n, llamada in enumerate(llamadas):
+            if not isinstance(llamada, dict):
+                return HttpResponseBadRequest("Llamada invalida.")
+            llamada_id = str(llamada.get("id") or n)
+            clave = json.dumps([llamada.get("url"), llamada.get("params")], sort_keys=True, default=str)
+            if clave not in vistas:
+                vistas[clave] = _ejecutar_llamada(request, llamada, resultados)
+            resultados[llamada_id] = vistas[clave]
+    return JsonResponse({"resultados": resultados})
+
+
+@require_http_methods(["GET"])
+async def recep_eventos_api(request):
+    """Avisos en vivo de cambios en la agenda de todos los veterinarios."""
+    recep = await sync_to_async(_require_recepcionista)(request)
+    if isinstance(recep, HttpResponseForbidden):
+        return recep
+    return _respuesta_eventos(request, [CANAL_RECEPCION])
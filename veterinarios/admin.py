@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import DiaBloqueadoVeterinario, DisponibilidadVeterinario
+from .models import DiaBloqueadoVeterinario, DisponibilidadVeterinario, PlantillaDisponibilidad
 
 
 @admin.register(DisponibilidadVeterinario)
@@ -28,3 +28,16 @@ class DiaBloqueadoVeterinarioAdmin(admin.ModelAdmin):
     )
     autocomplete_fields = ("veterinario",)
     ordering = ("-fecha",)
+
+
+@admin.register(PlantillaDisponibilidad)
+class PlantillaDisponibilidadAdmin(admin.ModelAdmin):
+    list_display = ("veterinario", "dia_semana", "hora_inicio", "hora_fin")
+    list_filter = ("dia_semana", "veterinario")
+    search_fields = (
+        "veterinario__perfil__user__first_name",
+        "veterinario__perfil__user__last_name",
+        "veterinario__perfil__user__email",
+    )
+    autocomplete_fields = ("veterinario",)
+    ordering = ("veterinario", "dia_semana", "hora_inicio")
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class VeterinariosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'veterinarios'
+
+    def ready(self):
+        # Los triggers de traslape se pierden si SQLite reconstruye la tabla.
+        from .guardas import reinstalar_guardas
+
+        post_migrate.connect(reinstalar_guardas, sender=self, dispatch_uid="veterinarios_guardas")
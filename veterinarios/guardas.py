@@ -0,0 +1,66 @@
+"""
+Guardas a nivel de base de datos para DisponibilidadVeterinario.
+
+``clean()`` valida traslapes antes de guardar, pero bulk_create, update() y
+escrituras concurrentes no pasan por ahi. En SQLite no existen las
+restricciones de exclusion, asi que se emulan con triggers BEFORE INSERT y
+BEFORE UPDATE que abortan la escritura si el bloque se cruza con otro del
+mismo veterinario y fecha. El abort llega a Django como IntegrityError.
+
+SQLite descarta los triggers cuando una migracion reconstruye la tabla, por
+eso ``instalar_guardas`` es idempotente y se vuelve a ejecutar en cada
+post_migrate.
+"""
+
+TABLA = "veterinarios_disponibilidadveterinario"
+MENSAJE_TRASLAPE = "Existe otro bloque que se traslapa en la misma fecha."
+
+_CONDICION = f"""
+    SELECT 1 FROM {TABLA} AS otro
+    WHERE otro.veterinario_id = NEW.veterinario_id
+      AND otro.fecha = NEW.fecha
+      AND otro.hora_inicio < NEW.hora_fin
+      AND otro.hora_fin > NEW.hora_inicio
+"""
+
+TRIGGERS = {
+    "veterinarios_disp_sin_traslape_insert": f"""
+        CREATE TRIGGER IF NOT EXISTS veterinarios_disp_sin_traslape_insert
+        BEFORE INSERT ON {TABLA}
+        WHEN EXISTS ({_CONDICION})
+        BEGIN
+            SELECT RAISE(ABORT, '{MENSAJE_TRASLAPE}');
+        END
+    """,
+    "veterinarios_disp_sin_traslape_update": f"""
+        CREATE TRIGGER IF NOT EXISTS veterinarios_disp_sin_traslape_update
+        BEFORE UPDATE OF veterinario_id, fecha, hora_inicio, hora_fin ON {TABLA}
+        WHEN EXISTS ({_CONDICION} AND otro.id <> NEW.id)
+        BEGIN
+            SELECT RAISE(ABORT, '{MENSAJE_TRASLAPE}');
+        END
+    """,
+}
+
+
+def instalar_guardas(connection):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for sql in TRIGGERS.values():
+            cursor.execute(sql)
+
+
+def eliminar_guardas(connection):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for nombre in TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+
+
+def reinstalar_guardas(sender, using, **kwargs):
+    from django.db import connections
+
+    if TABLA in connections[using].introspection.table_names():
+        instalar_guardas(connections[using])
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0012_servicio_duracion_min'),
+        ('veterinarios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlantillaDisponibilidad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia_semana', models.PositiveSmallIntegerField(choices=[(0, 'Lunes'), (1, 'Martes'), (2, 'Miercoles'), (3, 'Jueves'), (4, 'Viernes'), (5, 'Sabado'), (6, 'Domingo')])),
+                ('hora_inicio', models.TimeField()),
+                ('hora_fin', models.TimeField()),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('veterinario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='plantillas_disponibilidad', to='usuarios.veterinario')),
+            ],
+            options={
+                'verbose_name': 'Plantilla de disponibilidad',
+                'verbose_name_plural': 'Plantillas de disponibilidad',
+                'ordering': ['dia_semana', 'hora_inicio'],
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:04
+
+from django.db import migrations, models
+
+
+# Copia congelada de veterinarios.guardas a la fecha de esta migracion. En
+# runtime guardas.reinstalar_guardas vuelve a crearlos tras cada migrate.
+TABLA = "veterinarios_disponibilidadveterinario"
+
+_CONDICION = f"""
+    SELECT 1 FROM {TABLA} AS otro
+    WHERE otro.veterinario_id = NEW.veterinario_id
+      AND otro.fecha = NEW.fecha
+      AND otro.hora_inicio < NEW.hora_fin
+      AND otro.hora_fin > NEW.hora_inicio
+"""
+
+TRIGGERS = {
+    "veterinarios_disp_sin_traslape_insert": f"""
+        CREATE TRIGGER IF NOT EXISTS veterinarios_disp_sin_traslape_insert
+        BEFORE INSERT ON {TABLA}
+        WHEN EXISTS ({_CONDICION})
+        BEGIN
+            SELECT RAISE(ABORT, 'Existe otro bloque que se traslapa en la misma fecha.');
+        END
+    """,
+    "veterinarios_disp_sin_traslape_update": f"""
+        CREATE TRIGGER IF NOT EXISTS veterinarios_disp_sin_traslape_update
+        BEFORE UPDATE OF veterinario_id, fecha, hora_inicio, hora_fin ON {TABLA}
+        WHEN EXISTS ({_CONDICION} AND otro.id <> NEW.id)
+        BEGIN
+            SELECT RAISE(ABORT, 'Existe otro bloque que se traslapa en la misma fecha.');
+        END
+    """,
+}
+
+
+def crear_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for sql in TRIGGERS.values():
+        schema_editor.execute(sql)
+
+
+def eliminar_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for nombre in TRIGGERS:
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {nombre}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0012_servicio_duracion_min'),
+        ('veterinarios', '0002_plantilladisponibilidad'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='disponibilidadveterinario',
+            index=models.Index(fields=['veterinario', 'fecha', 'hora_inicio'], name='vet_disp_vet_fecha_idx'),
+        ),
+        migrations.RunPython(crear_triggers, eliminar_triggers),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-17 15:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('usuarios', '0014_rut_telefono_normalizado'),
+        ('veterinarios', '0003_disponibilidad_sin_traslape'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='diabloqueadoveterinario',
+            index=models.Index(fields=['fecha'], name='vet_dia_bloqueado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='diabloqueadoveterinario',
+            index=models.Index(fields=['creado_en'], name='vet_dia_bloqueado_creado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='disponibilidadveterinario',
+            index=models.Index(fields=['fecha', 'hora_inicio'], name='vet_disp_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='disponibilidadveterinario',
+            index=models.Index(fields=['actualizado_en'], name='vet_disp_actualizado_idx'),
+        ),
+    ]
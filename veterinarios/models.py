@@ -28,6 +28,14 @@ class DisponibilidadVeterinario(models.Model):
         verbose_name = "Disponibilidad de Veterinario"
         verbose_name_plural = "Disponibilidades de Veterinario"
         ordering = ["fecha", "hora_inicio"]
+        indexes = [
+            models.Index(
+                fields=["veterinario", "fecha", "hora_inicio"],
+                name="vet_disp_vet_fecha_idx",
+            ),
+            models.Index(fields=["fecha", "hora_inicio"], name="vet_disp_fecha_idx"),
+            models.Index(fields=["actualizado_en"], name="vet_disp_actualizado_idx"),
+        ]
 
     def __str__(self):
         return f"{self.veterinario} {self.fecha} {self.hora_inicio}-{self.hora_fin} ({self.estado})"
@@ -38,17 +46,19 @@ class DisponibilidadVeterinario(models.Model):
             raise ValidationError(_("La hora fin debe ser mayor que la hora inicio."))
         if self.fecha < date.today():
             raise ValidationError(_("No se puede crear disponibilidad en dias pasados."))
-        # Validar traslapes
-        qs = DisponibilidadVeterinario.objects.filter(
-            veterinario=self.veterinario, fecha=self.fecha
+        # Validar traslapes con un EXISTS sobre el indice (veterinario, fecha, hora_inicio)
+        traslapes = DisponibilidadVeterinario.objects.filter(
+            veterinario_id=self.veterinario_id,
+            fecha=self.fecha,
+            hora_inicio__lt=self.hora_fin,
+            hora_fin__gt=self.hora_inicio,
         )
         if self.pk:
-            qs = qs.exclude(pk=self.pk)
-        for other in qs:
-            if self.hora_inicio < other.hora_fin and self.hora_fin > other.hora_inicio:
-                raise ValidationError(
-                    _("Existe otro bloque que se traslapa en la misma fecha.")
-                )
+            traslapes = traslapes.exclude(pk=self.pk)
+        if traslapes.exists():
+            raise ValidationError(
+                _("Existe otro bloque que se traslapa en la misma fecha.")
+            )
 
     def save(self, *args, **kwargs):
         self.full_clean()
@@ -68,6 +78,47 @@ class DiaBloqueadoVeterinario(models.Model):
         verbose_name_plural = "Dias bloqueados"
         unique_together = ("veterinario", "fecha")
         ordering = ["-fecha"]
+        indexes = [
+            models.Index(fields=["fecha"], name="vet_dia_bloqueado_fecha_idx"),
+            models.Index(fields=["creado_en"], name="vet_dia_bloqueado_creado_idx"),
+        ]
 
     def __str__(self):
         return f"{self.veterinario} bloqueado {self.fecha}"
+
+
+class PlantillaDisponibilidad(models.Model):
+    """
+    Franja semanal recurrente (ej. lunes 09:00-13:00) que se expande en
+    bloques de DisponibilidadVeterinario para un rango de fechas.
+    """
+
+    class DiaSemana(models.IntegerChoices):
+        LUNES = 0, "Lunes"
+        MARTES = 1, "Martes"
+        MIERCOLES = 2, "Miercoles"
+        JUEVES = 3, "Jueves"
+        VIERNES = 4, "Viernes"
+        SABADO = 5, "Sabado"
+        DOMINGO = 6, "Domingo"
+
+    veterinario = models.ForeignKey(
+        Veterinario, on_delete=models.CASCADE, related_name="plantillas_disponibilidad"
+    )
+    dia_semana = models.PositiveSmallIntegerField(choices=DiaSemana.choices)
+    hora_inicio = models.TimeField()
+    hora_fin = models.TimeField()
+    creado_en = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Plantilla de disponibilidad"
+        verbose_name_plural = "Plantillas de disponibilidad"
+        ordering = ["dia_semana", "hora_inicio"]
+
+    def __str__(self):
+        return f"{self.veterinario} {self.get_dia_semana_display()} {self.hora_inicio}-{self.hora_fin}"
+
+    def clean(self):
+        super().clean()
+        if self.hora_fin <= self.hora_inicio:
+            raise ValidationError(_("La hora fin debe ser mayor que la hora inicio."))
@@ -0,0 +1,114 @@
+"""
+Expansion de plantillas semanales en bloques de DisponibilidadVeterinario.
+
+Crear bloque por bloque pasa por ``full_clean`` y revisa los traslapes del dia
+en Python, una consulta por bloque. Aqui se leen una sola vez los bloques y
+dias bloqueados del rango, se marcan los minutos ocupados de cada fecha como
+bits de un entero y cada franja nueva se valida con un AND. Los bloques que
+pasan se insertan con un unico ``bulk_create``.
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+
+from agenda.eventos import notificar_cambios
+from agenda.franjas import recalcular_franjas
+
+from .models import DiaBloqueadoVeterinario, DisponibilidadVeterinario
+
+MAX_DIAS_EXPANSION = 366
+
+MOTIVO_TRASLAPE = "traslape"
+MOTIVO_DIA_BLOQUEADO = "dia_bloqueado"
+
+
+def _minutos(t):
+    return t.hour * 60 + t.minute
+
+
+def _mascara(inicio, fin):
+    """Minutos [inicio, fin) como bits de un entero (bit i = minuto i del dia)."""
+    ini, fin = _minutos(inicio), _minutos(fin)
+    if fin <= ini:
+        return 0
+    return ((1 << (fin - ini)) - 1) << ini
+
+
+def franjas_se_traslapan(franjas):
+    """True si dos franjas (dia_semana, inicio, fin) del mismo dia se cruzan."""
+    por_dia = {}
+    for dia, inicio, fin in franjas:
+        mascara = _mascara(inicio, fin)
+        if por_dia.get(dia, 0) & mascara:
+            return True
+        por_dia[dia] = por_dia.get(dia, 0) | mascara
+    return False
+
+
+def expandir_plantilla(veterinario, franjas, desde, hasta):
+    """
+    Crea bloques disponibles para cada fecha entre ``desde`` y ``hasta``
+    (ambos inclusive) cuyo dia de semana tenga franjas.
+
+    ``franjas`` es un iterable de ``(dia_semana, hora_inicio, hora_fin)`` con
+    lunes = 0. Las franjas que chocan con un bloque existente o caen en un dia
+    bloqueado se omiten sin abortar el resto. Devuelve ``(creados, omitidos)``
+    donde ``omitidos`` son tuplas ``(fecha, hora_inicio, hora_fin, motivo)``.
+    """
+    por_dia = {}
+    for dia, inicio, fin in sorted(franjas, key=lambda f: (f[0], f[1])):
+        por_dia.setdefault(dia, []).append((inicio, fin))
+    fechas = [
+        desde + timedelta(days=n)
+        for n in range((hasta - desde).days + 1)
+        if (desde + timedelta(days=n)).weekday() in por_dia
+    ]
+    if not fechas:
+        return [], []
+
+    with transaction.atomic():
+        bloqueados = set(
+            DiaBloqueadoVeterinario.objects.filter(
+                veterinario=veterinario, fecha__range=(desde, hasta)
+            ).values_list("fecha", flat=True)
+        )
+        ocupados = {}
+        for fecha, inicio, fin in DisponibilidadVeterinario.objects.filter(
+            veterinario=veterinario, fecha__range=(desde, hasta)
+        ).values_list("fecha", "hora_inicio", "hora_fin"):
+            ocupados[fecha] = ocupados.get(fecha, 0) | _mascara(inicio, fin)
+
+        nuevos = []
+        omitidos = []
+        for fecha in fechas:
+            if fecha in bloqueados:
+                omitidos.extend(
+                    (fecha, inicio, fin, MOTIVO_DIA_BLOQUEADO)
+                    for inicio, fin in por_dia[fecha.weekday()]
+                )
+                continue
+            ocupado = ocupados.get(fecha, 0)
+            for inicio, fin in por_dia[fecha.weekday()]:
+                mascara = _mascara(inicio, fin)
+                if ocupado & mascara:
+                    omitidos.append((fecha, inicio, fin, MOTIVO_TRASLAPE))
+                    continue
+                ocupado |= mascara
+                nuevos.append(
+                    DisponibilidadVeterinario(
+                        veterinario=veterinario,
+                        fecha=fecha,
+                        hora_inicio=inicio,
+                        hora_fin=fin,
+                        estado=DisponibilidadVeterinario.Estado.DISPONIBLE,
+                    )
+                )
+        creados = DisponibilidadVeterinario.objects.bulk_create(nuevos)
+
+        # bulk_create no emite post_save: la proyeccion de franjas libres se
+        # actualiza aqui para los dias tocados.
+        pares = {(veterinario.id, b.fecha) for b in creados}
+        recalcular_franjas(pares)
+        notificar_cambios(pares)
+    return creados, omitidos
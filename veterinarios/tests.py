@@ -1,3 +1,186 @@
+from datetime import time, timedelta
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from agenda.models import FranjaLibre
+from usuarios.models import Veterinario
+
+from .guardas import TRIGGERS
+from .models import DiaBloqueadoVeterinario, DisponibilidadVeterinario, PlantillaDisponibilidad
+from .plantillas import (
+    MOTIVO_DIA_BLOQUEADO,
+    MOTIVO_TRASLAPE,
+    expandir_plantilla,
+    franjas_se_traslapan,
+)
+
+
+class GuardasTraslapeTests(TestCase):
+    """Los triggers rechazan traslapes que no pasan por clean()."""
+
+    def setUp(self):
+        self.vets = [
+            Veterinario.objects.create(
+                perfil=User.objects.create_user(f"vet{n}").perfil, rut=f"{n}-1", telefono=str(n)
+            )
+            for n in range(2)
+        ]
+        self.fecha = timezone.localdate() + timedelta(days=1)
+        self.bloque = DisponibilidadVeterinario.objects.create(
+            veterinario=self.vets[0], fecha=self.fecha, hora_inicio=time(9), hora_fin=time(12)
+        )
+
+    def _nuevo(self, inicio, fin, vet=None, fecha=None):
+        return DisponibilidadVeterinario(
+            veterinario=vet or self.vets[0],
+            fecha=fecha or self.fecha,
+            hora_inicio=inicio,
+            hora_fin=fin,
+        )
+
+    def test_triggers_instalados(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+            nombres = {fila[0] for fila in cursor.fetchall()}
+        self.assertLessEqual(set(TRIGGERS), nombres)
+
+    def test_clean_rechaza_traslape(self):
+        with self.assertRaises(ValidationError):
+            self._nuevo(time(11), time(13)).save()
+
+    def test_bulk_create_traslapado_falla(self):
+        for inicio, fin in [(time(11), time(13)), (time(8), time(9, 15)), (time(10), time(11))]:
+            with self.subTest(inicio=inicio, fin=fin):
+                with self.assertRaisesMessage(IntegrityError, "se traslapa"), transaction.atomic():
+                    DisponibilidadVeterinario.objects.bulk_create([self._nuevo(inicio, fin)])
+        self.assertEqual(DisponibilidadVeterinario.objects.count(), 1)
+
+    def test_bordes_y_otro_veterinario_no_cuentan(self):
+        DisponibilidadVeterinario.objects.bulk_create(
+            [
+                self._nuevo(time(8), time(9)),
+                self._nuevo(time(12), time(13)),
+                self._nuevo(time(9), time(12), vet=self.vets[1]),
+                self._nuevo(time(9), time(12), fecha=self.fecha + timedelta(days=1)),
+            ]
+        )
+        self.assertEqual(DisponibilidadVeterinario.objects.count(), 5)
+
+    def test_update_traslapado_falla(self):
+        otro = DisponibilidadVeterinario.objects.create(
+            veterinario=self.vets[0], fecha=self.fecha, hora_inicio=time(14), hora_fin=time(16)
+        )
+        with self.assertRaisesMessage(IntegrityError, "se traslapa"), transaction.atomic():
+            DisponibilidadVeterinario.objects.filter(pk=otro.pk).update(hora_inicio=time(11))
+        # Actualizar el propio bloque sin cruzarse con otro sigue permitido.
+        DisponibilidadVeterinario.objects.filter(pk=self.bloque.pk).update(hora_fin=time(13))
+        self.bloque.refresh_from_db()
+        self.assertEqual(self.bloque.hora_fin, time(13))
+
+
+class PlantillaTests(TestCase):
+    """Expansion de la plantilla semanal en bloques de dos semanas."""
+
+    def setUp(self):
+        user = User.objects.create_user("vet")
+        self.vet = Veterinario.objects.create(perfil=user.perfil, rut="2-7", telefono="2")
+        hoy = timezone.localdate()
+        self.lunes = hoy + timedelta(days=7 - hoy.weekday())
+        self.hasta = self.lunes + timedelta(days=13)
+        self.franjas = [
+            (PlantillaDisponibilidad.DiaSemana.LUNES, time(9), time(12)),
+            (PlantillaDisponibilidad.DiaSemana.MIERCOLES, time(14), time(16)),
+        ]
+        self.client.force_login(user)
+        self.url = reverse("usuarios:vet_plantilla_api")
+
+    def _bloques(self):
+        return sorted(
+            DisponibilidadVeterinario.objects.filter(veterinario=self.vet).values_list(
+                "fecha", "hora_inicio", "hora_fin"
+            )
+        )
+
+    def test_crea_bloques_en_el_rango(self):
+        creados, omitidos = expandir_plantilla(self.vet, self.franjas, self.lunes, self.hasta)
+        self.assertEqual(len(creados), 4)
+        self.assertEqual(omitidos, [])
+        miercoles = self.lunes + timedelta(days=2)
+        self.assertEqual(
+            self._bloques(),
+            [
+                (self.lunes, time(9), time(12)),
+                (miercoles, time(14), time(16)),
+                (self.lunes + timedelta(days=7), time(9), time(12)),
+                (miercoles + timedelta(days=7), time(14), time(16)),
+            ],
+        )
+
+    def test_omite_traslapes_y_dias_bloqueados(self):
+        DisponibilidadVeterinario.objects.create(
+            veterinario=self.vet, fecha=self.lunes, hora_inicio=time(11), hora_fin=time(13)
+        )
+        miercoles = self.lunes + timedelta(days=2)
+        DiaBloqueadoVeterinario.objects.create(veterinario=self.vet, fecha=miercoles)
+        creados, omitidos = expandir_plantilla(self.vet, self.franjas, self.lunes, self.hasta)
+        self.assertEqual(len(creados), 2)
+        self.assertEqual(
+            omitidos,
+            [
+                (self.lunes, time(9), time(12), MOTIVO_TRASLAPE),
+                (miercoles, time(14), time(16), MOTIVO_DIA_BLOQUEADO),
+            ],
+        )
+
+    def test_recalcula_la_proyeccion(self):
+        creados, _ = expandir_plantilla(self.vet, self.franjas, self.lunes, self.hasta)
+        self.assertEqual(
+            sorted(
+                FranjaLibre.objects.filter(veterinario=self.vet).values_list(
+                    "bloque_id", "hora_inicio", "hora_fin"
+                )
+            ),
+            sorted((b.id, b.hora_inicio, b.hora_fin) for b in creados),
+        )
+
+    def test_api_rechaza_franjas_traslapadas(self):
+        self.assertTrue(franjas_se_traslapan([(0, time(9), time(12)), (0, time(11), time(13))]))
+        self.assertFalse(franjas_se_traslapan([(0, time(9), time(12)), (1, time(11), time(13))]))
+        response = self.client.post(
+            self.url,
+            {
+                "desde": self.lunes.isoformat(),
+                "franjas": [
+                    {"dia_semana": 0, "inicio": "09:00", "fin": "12:00"},
+                    {"dia_semana": 0, "inicio": "11:00", "fin": "13:00"},
+                ],
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.content, b"La plantilla tiene franjas que se traslapan.")
+        self.assertFalse(PlantillaDisponibilidad.objects.exists())
+        self.assertEqual(self._bloques(), [])
 
-# Create your tests here.
+    def test_api_guarda_y_expande(self):
+        response = self.client.post(
+            self.url,
+            {
+                "desde": self.lunes.isoformat(),
+                "hasta": self.hasta.isoformat(),
+                "dias": [0, 2],
+                "inicio": "09:00",
+                "fin": "10:00",
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        datos = response.json()
+        self.assertEqual(len(datos["plantilla"]), 2)
+        self.assertEqual(len(datos["bloques"]), 4)
+        self.assertEqual(PlantillaDisponibilidad.objects.filter(veterinario=self.vet).count(), 2)
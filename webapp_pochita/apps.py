@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+from django.conf import settings
+
+from .procesos import es_proceso_servidor
+
+
+class WebappPochitaConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'webapp_pochita'
+
+    def ready(self):
+        intervalo = getattr(settings, "REPLICA_INTERVALO", 0)
+        if intervalo and "replica" in settings.DATABASES and es_proceso_servidor():
+            from .replica import iniciar_refresco_periodico
+
+            iniciar_refresco_periodico(intervalo)
@@ -3,6 +3,12 @@ ASGI config for webapp_pochita project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Los avisos en vivo de agenda (``api/veterinario/eventos/`` y
+``api/recep/eventos/``) son conexiones Server-Sent Events abiertas por
+minutos; necesitan un servidor ASGI (uvicorn, daphne) para no ocupar un
+worker por pantalla. Bajo WSGI esas rutas responden 204 y las pantallas
+siguen funcionando sin avisos.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,5 +18,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'webapp_pochita.settings')
+# Antes de cargar settings: sin conexiones persistentes bajo ASGI (ver
+# webapp_pochita/basedatos.py).
+os.environ.setdefault('POCHITA_SERVIDOR', 'asgi')
 
 application = get_asgi_application()
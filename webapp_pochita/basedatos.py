@@ -0,0 +1,99 @@
+"""
+Perfiles de conexion a SQLite.
+
+settings.DATABASES arma el alias ``default`` con ``aplicar_perfil`` segun
+``POCHITA_SQLITE_PERFIL``. Cada perfil define los PRAGMA que corre Django
+al abrir cada conexion (``OPTIONS["init_command"]``), el modo de las
+transacciones y cuanto dura una conexion abierta:
+
+* ``"produccion"``: WAL, para que las lecturas de recepcion no esperen a
+  las escrituras de los veterinarios (y al reves); ``synchronous=NORMAL``,
+  que con WAL solo arriesga la ultima transaccion ante un corte de luz,
+  no la integridad del archivo; cache de paginas y ``mmap`` mas grandes;
+  espera de hasta ``busy_timeout`` ms cuando otro escribe. Las
+  transacciones empiezan como IMMEDIATE, porque en WAL una transaccion que
+  lee y despues intenta escribir falla al instante si otro escribio entre
+  medio, sin esperar. Un ``atomic()`` que solo lee tomaria igual el lock de
+  escritura: esos bloques van con ``transaccion_lectura``. Bajo WSGI las
+  conexiones se reusan entre peticiones (``CONN_MAX_AGE``) y se revisan
+  antes de reusarlas (``CONN_HEALTH_CHECKS``). Bajo ASGI cada peticion
+  corre en un hilo nuevo y una conexion persistente quedaria abierta en
+  cada hilo sin volver a usarse, asi que ahi se cierran al terminar
+  (``aplicar_perfil(..., persistente=False)``).
+* ``"basico"``: los valores por omision de Django y SQLite (journal
+  DELETE, una conexion por peticion). Sirve para comparar, o cuando la
+  base esta en un disco de red, donde WAL no funciona.
+
+``journal_mode=WAL`` queda grabado en el archivo: volver a ``"basico"``
+no lo deshace.
+"""
+
+from contextlib import contextmanager
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+PERFILES = {
+    "basico": {},
+    "produccion": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "busy_timeout": 5000,
+            # En KiB cuando es negativo: 64 MiB por conexion.
+            "cache_size": -64000,
+            "mmap_size": 256 * 1024 * 1024,
+            "temp_store": "MEMORY",
+        },
+        "transaction_mode": "IMMEDIATE",
+        "conn_max_age": 600,
+        "conn_health_checks": True,
+    },
+}
+
+
+def init_command(pragmas):
+    return ";".join(f"PRAGMA {nombre}={valor}" for nombre, valor in pragmas.items())
+
+
+def aplicar_perfil(base, perfil, persistente=True):
+    """
+    Copia de ``base`` (un alias de DATABASES con ENGINE sqlite3) con el
+    perfil ``perfil`` aplicado. Un nombre desconocido es un error: un typo
+    en la variable de entorno no debe dejar la base con otra configuracion
+    sin avisar. Con ``persistente=False`` las conexiones no se reusan
+    aunque el perfil lo pida.
+    """
+    if perfil not in PERFILES:
+        raise ImproperlyConfigured(
+            f"Perfil de SQLite desconocido: {perfil!r}. Opciones: {', '.join(sorted(PERFILES))}."
+        )
+    config = PERFILES[perfil]
+    alias = {**base, "OPTIONS": dict(base.get("OPTIONS", {}))}
+    if config.get("pragmas"):
+        alias["OPTIONS"]["init_command"] = init_command(config["pragmas"])
+    if config.get("transaction_mode"):
+        alias["OPTIONS"]["transaction_mode"] = config["transaction_mode"]
+    alias.setdefault("CONN_MAX_AGE", config.get("conn_max_age", 0) if persistente else 0)
+    alias.setdefault("CONN_HEALTH_CHECKS", config.get("conn_health_checks", False))
+    return alias
+
+
+@contextmanager
+def transaccion_lectura(using=None):
+    """
+    ``transaction.atomic()`` para un bloque que solo lee: empieza DEFERRED
+    aunque el perfil use IMMEDIATE, asi ve una foto fija de la base sin
+    tomar el lock de escritura (con WAL no frena a nadie).
+    """
+    conexion = connections[using or DEFAULT_DB_ALIAS]
+    conexion.ensure_connection()
+    modo = conexion.transaction_mode
+    conexion.transaction_mode = None
+    try:
+        with transaction.atomic(using=conexion.alias):
+            # El BEGIN ya se emitio al entrar.
+            conexion.transaction_mode = modo
+            yield
+    finally:
+        conexion.transaction_mode = modo
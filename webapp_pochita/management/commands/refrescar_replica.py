@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.utils import ConnectionDoesNotExist
+
+from webapp_pochita.replica import refrescar_replica
+
+
+class Command(BaseCommand):
+    help = "Copia la base principal sobre la replica de solo lectura."
+
+    def handle(self, *args, **options):
+        try:
+            segundos = refrescar_replica()
+        except ConnectionDoesNotExist:
+            raise CommandError("No hay un alias 'replica' en DATABASES.")
+        self.stdout.write(self.style.SUCCESS(f"Replica refrescada en {segundos:.2f} s"))
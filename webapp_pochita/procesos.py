@@ -0,0 +1,19 @@
+"""Deteccion del proceso servidor, para los hilos periodicos opcionales."""
+
+import os
+import sys
+
+
+def es_proceso_servidor():
+    """
+    False en comandos de manage.py como migrate o test. Con runserver y el
+    autoreload solo cuenta el proceso hijo. Cualquier otro programa (wsgi,
+    asgi) cuenta como servidor: por eso los hilos periodicos solo arrancan
+    si se activaron en settings, pensados para un unico proceso.
+    """
+    programa = os.path.basename(sys.argv[0]) if sys.argv else ""
+    if programa in ("manage.py", "django-admin"):
+        if sys.argv[1:2] != ["runserver"]:
+            return False
+        return os.environ.get("RUN_MAIN") == "true" or "--noreload" in sys.argv
+    return True
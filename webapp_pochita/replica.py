@@ -0,0 +1,241 @@
+"""
+Replica de solo lectura para historiales y reportes.
+
+Las vistas marcadas con ``@lectura_en_replica`` leen del alias ``replica``
+en vez de la base principal, asi una consulta grande de historial no
+compite con las reservas. La replica es una copia del archivo principal
+hecha con la API de backup en linea de SQLite (``refrescar_replica``),
+con ``manage.py refrescar_replica`` desde cron o, con un solo proceso
+servidor, cada ``REPLICA_INTERVALO`` segundos desde un hilo.
+
+Usuario, sesion y rol se leen siempre de la principal, aun dentro de una
+vista marcada: usuarios.contexto guarda en la sesion el rol que lee, y una
+copia atrasada dejaria ahi un rol viejo.
+
+Lecturas propias: si una peticion escribe en la base, ``ReplicaMiddleware``
+fija la sesion a la base principal por ``REPLICA_FIJAR_SEGUNDOS``, para
+que quien acaba de agendar o cancelar vea su cambio aunque la replica aun
+no lo tenga. Dentro de una transaccion tambien se lee la principal. Sin
+alias ``replica`` en DATABASES, o mientras la copia no existe, todo se lee
+de la principal.
+"""
+
+import contextvars
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+from django.utils.deprecation import MiddlewareMixin
+
+logger = logging.getLogger(__name__)
+
+ALIAS = "replica"
+CLAVE_SESION = "_primaria_hasta"
+_FIN = object()
+
+# Apps y modelos (``app_label.modelname``) que nunca se leen de la replica.
+SIEMPRE_PRINCIPAL = {
+    "auth",
+    "sessions",
+    "usuarios.perfil",
+    "usuarios.cliente",
+    "usuarios.veterinario",
+    "usuarios.recepcionista",
+    "usuarios.administrador",
+}
+
+_en_replica = contextvars.ContextVar("en_replica", default=False)
+# Lista de modelos escritos durante la peticion en curso; None fuera de una.
+_escrituras = contextvars.ContextVar("escrituras", default=None)
+
+
+def _intervalo():
+    return getattr(settings, "REPLICA_INTERVALO", 0)
+
+
+def _fijar_segundos():
+    return getattr(settings, "REPLICA_FIJAR_SEGUNDOS", 2 * (_intervalo() or 60))
+
+
+def replica_disponible():
+    if ALIAS not in settings.DATABASES:
+        return False
+    nombre = connections[ALIAS].settings_dict["NAME"]
+    try:
+        return os.path.getsize(nombre) > 0
+    except OSError:
+        return False
+
+
+class RouterReplica:
+    """Lecturas en la replica solo dentro de ``lectura_en_replica``; escrituras siempre en la principal."""
+
+    def db_for_read(self, model, **hints):
+        if not _en_replica.get():
+            return DEFAULT_DB_ALIAS
+        opts = model._meta
+        if opts.app_label in SIEMPRE_PRINCIPAL or opts.label_lower in SIEMPRE_PRINCIPAL:
+            return DEFAULT_DB_ALIAS
+        return ALIAS
+
+    def db_for_write(self, model, **hints):
+        escrituras = _escrituras.get()
+        # Guardar la sesion no es un cambio de datos que haya que leer.
+        if escrituras is not None and model._meta.app_label != "sessions":
+            escrituras.append(model._meta.label)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, ALIAS}:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # La replica recibe el esquema con cada copia.
+        return False if db == ALIAS else None
+
+
+def sesion_fijada(request):
+    sesion = getattr(request, "session", None)
+    return sesion is not None and sesion.get(CLAVE_SESION, 0) > time.time()
+
+
+def _usar_replica(request):
+    return (
+        not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        and replica_disponible()
+        and not sesion_fijada(request)
+    )
+
+
+def _iterar_en_replica(contenido):
+    iterador = iter(contenido)
+    while True:
+        token = _en_replica.set(True)
+        try:
+            trozo = next(iterador, _FIN)
+        finally:
+            _en_replica.reset(token)
+        if trozo is _FIN:
+            return
+        yield trozo
+
+
+async def _iterar_en_replica_async(contenido):
+    # sync_to_async copia el contexto al llamarse: las consultas de cada
+    # trozo ven la marca aunque corran en otro hilo.
+    iterador = aiter(contenido)
+    while True:
+        token = _en_replica.set(True)
+        try:
+            trozo = await anext(iterador, _FIN)
+        finally:
+            _en_replica.reset(token)
+        if trozo is _FIN:
+            return
+        yield trozo
+
+
+def _en_replica_al_iterar(response):
+    # Las respuestas en streaming consultan la base al iterarse, despues de
+    # que la vista termino.
+    if response.streaming and response.is_async:
+        response.streaming_content = _iterar_en_replica_async(response.streaming_content)
+    elif response.streaming:
+        response.streaming_content = _iterar_en_replica(response.streaming_content)
+    return response
+
+
+def lectura_en_replica(vista):
+    """Marca una vista sincronica de solo lectura para que lea de la replica."""
+
+    @functools.wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        if not _usar_replica(request):
+            return vista(request, *args, **kwargs)
+        token = _en_replica.set(True)
+        try:
+            response = vista(request, *args, **kwargs)
+        finally:
+            _en_replica.reset(token)
+        return _en_replica_al_iterar(response)
+
+    return envoltura
+
+
+class ReplicaMiddleware(MiddlewareMixin):
+    """Fija la sesion a la base principal tras una peticion que escribio; va despues de SessionMiddleware."""
+
+    def process_request(self, request):
+        _escrituras.set([])
+
+    def process_response(self, request, response):
+        escrituras = _escrituras.get()
+        _escrituras.set(None)
+        if escrituras and hasattr(request, "session"):
+            request.session[CLAVE_SESION] = time.time() + _fijar_segundos()
+        return response
+
+
+def refrescar_replica(origen=DEFAULT_DB_ALIAS, destino=ALIAS):
+    """
+    Copia la base ``origen`` sobre ``destino`` con la API de backup de
+    SQLite. La copia se hace en un solo paso: con WAL no frena a quien
+    escribe en la principal, y quien lee la replica sigue viendo la copia
+    anterior hasta que termina. Devuelve los segundos que tomo.
+    """
+    nombre_origen = connections[origen].settings_dict["NAME"]
+    nombre_destino = connections[destino].settings_dict["NAME"]
+    if str(nombre_origen) == str(nombre_destino):
+        # En pruebas la replica apunta a la misma base.
+        return 0.0
+    inicio = time.monotonic()
+    fuente = sqlite3.connect(nombre_origen)
+    try:
+        copia = sqlite3.connect(nombre_destino)
+        try:
+            fuente.backup(copia)
+        finally:
+            copia.close()
+    finally:
+        fuente.close()
+    return time.monotonic() - inicio
+
+
+def _ciclo_refresco(intervalo):
+    while True:
+        try:
+            segundos = refrescar_replica()
+        except Exception:
+            logger.exception("Fallo el refresco de la replica.")
+        else:
+            logger.debug("Replica refrescada en %.2f s.", segundos)
+        finally:
+            close_old_connections()
+        time.sleep(intervalo)
+
+
+_hilo = None
+_hilo_lock = threading.Lock()
+
+
+def iniciar_refresco_periodico(intervalo):
+    """
+    Lanza, una sola vez por proceso, un hilo que copia la base a la replica
+    al arrancar y luego cada ``intervalo`` segundos. Solo para un proceso
+    servidor; con varios, cada uno copiaria la base.
+    """
+    global _hilo
+    with _hilo_lock:
+        if _hilo is not None:
+            return _hilo
+        _hilo = threading.Thread(
+            target=_ciclo_refresco, args=(intervalo,), name="refresco-replica", daemon=True
+        )
+        _hilo.start()
+        return _hilo
@@ -2,6 +2,8 @@
 import os 
 from pathlib import Path
 
+from .basedatos import aplicar_perfil
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -40,6 +42,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'usuarios.contexto.ContextoRolMiddleware',
+    'webapp_pochita.replica.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -69,13 +73,64 @@ WSGI_APPLICATION = 'webapp_pochita.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Perfil de conexion a SQLite (ver webapp_pochita/basedatos.py): "produccion"
+# activa WAL, PRAGMA ajustados y conexiones persistentes; "basico" deja los
+# valores por omision.
+SQLITE_PERFIL = os.environ.get('POCHITA_SQLITE_PERFIL', 'produccion')
+# "asgi" cuando carga webapp_pochita/asgi.py: bajo ASGI no se guardan
+# conexiones persistentes.
+SERVIDOR = os.environ.get('POCHITA_SERVIDOR', 'wsgi')
+
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': aplicar_perfil(
+        {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            # Base de pruebas en archivo: la base en memoria compartida bloquea
+            # tablas completas y no sirve para probar escrituras concurrentes.
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
+        },
+        SQLITE_PERFIL,
+        persistente=SERVIDOR == 'wsgi',
+    ),
+    # Copia de solo lectura para historiales y reportes (ver
+    # webapp_pochita/replica.py); en pruebas apunta a la base de pruebas.
+    'replica': aplicar_perfil(
+        {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'replica.sqlite3',
+            'TEST': {
+                'MIRROR': 'default',
+            },
+        },
+        SQLITE_PERFIL,
+        persistente=SERVIDOR == 'wsgi',
+    ),
 }
 
+DATABASE_ROUTERS = ['webapp_pochita.replica.RouterReplica']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# "default" es en memoria local, por proceso. "catalogo" guarda solo la
+# version del catalogo de servicios (usuarios.catalogo) en archivos que ven
+# todos los workers de la maquina, asi un cambio invalida la copia de cada
+# proceso en su siguiente lectura. Con Redis o Memcached ambas pueden
+# apuntar ahi.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'pochita',
+    },
+    'catalogo': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'catalogo',
+    },
+}
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -122,3 +177,37 @@ LOGIN_REDIRECT_URL = '/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CSRF_FAILURE_VIEW = 'usuarios.views.csrf_failure'
+
+# Segundos entre ejecuciones del proceso que expira citas vencidas dentro del
+# servidor. Desactivado por omision: con varios workers cada uno lanzaria su
+# propio hilo, asi que en produccion se corre `manage.py expirar_citas` desde
+# cron. Para un solo proceso (runserver) se activa con la variable de entorno.
+AGENDA_EXPIRACION_INTERVALO = int(os.environ.get('POCHITA_EXPIRACION_INTERVALO', 0))
+
+# Dias que se guardan las lapidas de citas y bloques eliminados para la
+# sincronizacion con `?since=<token>`; un token mas antiguo recibe 410.
+AGENDA_SINCRONIZACION_RETENCION_DIAS = 30
+
+# Como llegan los avisos en vivo (Server-Sent Events) a las pantallas:
+# "local" publica al confirmar cada escritura (un solo proceso servidor);
+# "sondeo" hace que cada proceso lea los cambios de la base cada
+# AGENDA_EVENTOS_INTERVALO segundos (varios workers).
+AGENDA_EVENTOS_MODO = "local"
+AGENDA_EVENTOS_INTERVALO = 2
+
+# Segundos que vive en la cache de cada proceso una version del catalogo de
+# servicios. La version compartida invalida antes; esto solo acota cuanto
+# tarda en liberarse la memoria de versiones viejas.
+CATALOGO_SERVICIOS_TIMEOUT = 300
+
+# Segundos entre copias de la base principal a la replica desde un hilo del
+# servidor. Desactivado por omision: con varios workers cada uno copiaria la
+# base, asi que en produccion se corre `manage.py refrescar_replica` desde
+# cron (cada minuto). Para un solo proceso se activa con la variable de
+# entorno.
+REPLICA_INTERVALO = int(os.environ.get('POCHITA_REPLICA_INTERVALO', 0))
+
+# Segundos que una sesion lee de la base principal despues de escribir, para
+# ver sus propios cambios; debe cubrir al menos un refresco de la replica
+# (el del hilo o, sin hilo, el del cron de un minuto).
+REPLICA_FIJAR_SEGUNDOS = 2 * (REPLICA_INTERVALO or 60)
@@ -0,0 +1,495 @@
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time as reloj
+import unittest
+from datetime import time, timedelta
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.db import OperationalError, connection, connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from agenda.models import Cita
+from usuarios.contexto import CLAVE_SESION as CLAVE_CONTEXTO
+from usuarios.models import Cliente, Mascota, Perfil, Recepcionista, Servicio, Veterinario
+
+from .asgi import application
+from .basedatos import PERFILES, aplicar_perfil, transaccion_lectura
+from .replica import ALIAS, CLAVE_SESION, RouterReplica, _en_replica, refrescar_replica
+
+BASE = {"ENGINE": "django.db.backends.sqlite3", "NAME": "x.sqlite3"}
+
+
+class PerfilSqliteTests(SimpleTestCase):
+    def test_basico_deja_valores_de_django(self):
+        alias = aplicar_perfil(BASE, "basico")
+        self.assertEqual(
+            alias, {**BASE, "OPTIONS": {}, "CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False}
+        )
+
+    def test_produccion(self):
+        alias = aplicar_perfil({**BASE, "OPTIONS": {"timeout": 10}}, "produccion")
+        self.assertEqual(alias["OPTIONS"]["timeout"], 10)
+        self.assertEqual(alias["OPTIONS"]["transaction_mode"], "IMMEDIATE")
+        self.assertIn("PRAGMA journal_mode=WAL", alias["OPTIONS"]["init_command"])
+        self.assertEqual(alias["CONN_MAX_AGE"], 600)
+        self.assertTrue(alias["CONN_HEALTH_CHECKS"])
+        # La base no se modifica.
+        self.assertNotIn("OPTIONS", BASE)
+
+    def test_produccion_sin_conexiones_persistentes(self):
+        alias = aplicar_perfil(BASE, "produccion", persistente=False)
+        self.assertEqual(alias["CONN_MAX_AGE"], 0)
+        self.assertEqual(alias["OPTIONS"]["transaction_mode"], "IMMEDIATE")
+
+    def test_perfil_desconocido(self):
+        with self.assertRaises(ImproperlyConfigured):
+            aplicar_perfil(BASE, "produccon")
+
+
+class PragmasConexionTests(TestCase):
+    """La conexion de la app queda con los PRAGMA del perfil configurado."""
+
+    def test_pragmas_aplicados(self):
+        pragmas = PERFILES[settings.SQLITE_PERFIL].get("pragmas", {})
+        if not pragmas:
+            self.skipTest("el perfil configurado no define PRAGMA")
+        with connection.cursor() as cursor:
+            for nombre, valor in pragmas.items():
+                cursor.execute(f"PRAGMA {nombre}")
+                actual = cursor.fetchone()[0]
+                if nombre == "temp_store":
+                    # 2 = MEMORY.
+                    self.assertEqual(actual, 2)
+                elif nombre == "synchronous":
+                    # 1 = NORMAL.
+                    self.assertEqual(actual, 1)
+                else:
+                    self.assertEqual(str(actual).lower(), str(valor).lower(), nombre)
+
+
+class TransaccionLecturaTests(TransactionTestCase):
+    def test_empieza_deferred(self):
+        modo = connection.transaction_mode
+        with CaptureQueriesContext(connection) as consultas:
+            with transaccion_lectura():
+                Cita.objects.exists()
+        self.assertEqual(consultas[0]["sql"], "BEGIN")
+        self.assertEqual(connection.transaction_mode, modo)
+
+
+def _contenido(response):
+    if not response.streaming:
+        return response.content
+    return b"".join(response.streaming_content)
+
+
+def _alias_temporal(alias, ruta):
+    config = aplicar_perfil({"ENGINE": "django.db.backends.sqlite3", "NAME": ruta}, "produccion")
+    connections.settings[alias] = connections.configure_settings({"default": config})["default"]
+    return alias
+
+
+class ReplicaTests(TransactionTestCase):
+    """
+    Historial y alertas de recepcion se leen de la replica, salvo justo
+    despues de que la sesion escribio. En pruebas la replica apunta a la
+    misma base, por eso los datos deben estar confirmados.
+    """
+
+    databases = {"default", ALIAS}
+
+    def setUp(self):
+        user = User.objects.create_user("recep", first_name="Eva")
+        Recepcionista.objects.create(perfil=user.perfil, rut="5-1", telefono="5")
+        vet_user = User.objects.create_user("vet", first_name="Ana")
+        vet = Veterinario.objects.create(perfil=vet_user.perfil, rut="2-7", telefono="2")
+        cliente_user = User.objects.create_user("cliente", first_name="Luis")
+        self.cliente = Cliente.objects.create(
+            perfil=cliente_user.perfil, rut="3-5", direccion="x", telefono="3"
+        )
+        mascota = Mascota.objects.create(cliente=self.cliente, nombre="Toby", tipo="perro")
+        self.cita = Cita.objects.create(
+            veterinario=vet,
+            cliente=self.cliente,
+            mascota=mascota,
+            servicio=Servicio.objects.create(nombre="Consulta", duracion_min=30),
+            fecha=timezone.localdate() + timedelta(days=1),
+            hora=time(10),
+        )
+        self.cita_id = self.cita.id
+        self.client.force_login(user)
+        self.historial = reverse(
+            "usuarios:recep_historial_citas_cliente_api", kwargs={"cliente_id": self.cliente.id}
+        )
+
+    def _lecturas_de_citas(self, url):
+        """Alias que leyeron agenda_cita al pedir ``url``."""
+        with CaptureQueriesContext(connections["default"]) as principal, CaptureQueriesContext(
+            connections[ALIAS]
+        ) as replica:
+            response = self.client.get(url)
+            contenido = _contenido(response)
+        self.assertEqual(response.status_code, 200)
+        usados = set()
+        for alias, consultas in (("default", principal), (ALIAS, replica)):
+            if any('FROM "agenda_cita"' in q["sql"] for q in consultas):
+                usados.add(alias)
+        return usados, json.loads(contenido)
+
+    def test_historial_y_alertas_leen_replica(self):
+        usados, datos = self._lecturas_de_citas(self.historial)
+        self.assertEqual(usados, {ALIAS})
+        self.assertEqual([c["id"] for c in datos["citas"]], [self.cita.id])
+        usados, _datos = self._lecturas_de_citas(reverse("usuarios:recep_replanificar_alertas_api"))
+        self.assertEqual(usados, {ALIAS})
+
+    def test_escribir_fija_la_sesion_a_la_principal(self):
+        self._lecturas_de_citas(self.historial)
+        self.assertNotIn(CLAVE_SESION, self.client.session)
+        response = self.client.post(
+            reverse("usuarios:recep_cita_estado_api", kwargs={"pk": self.cita.pk}),
+            json.dumps({"estado": Cita.Estado.CONFIRMADA}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(CLAVE_SESION, self.client.session)
+        usados, datos = self._lecturas_de_citas(self.historial)
+        self.assertEqual(usados, {"default"})
+        self.assertEqual(datos["citas"][0]["estado"], Cita.Estado.CONFIRMADA)
+
+    def test_lote_lee_la_principal_en_una_transaccion(self):
+        with CaptureQueriesContext(connections["default"]) as principal:
+            response = self.client.post(
+                reverse("usuarios:recep_lote_api"),
+                {"llamadas": [{"id": "h", "url": self.historial}]},
+                content_type="application/json",
+            )
+        self.assertEqual(response.json()["resultados"]["h"]["status"], 200)
+        self.assertIn("BEGIN", [q["sql"] for q in principal])
+
+    def test_router(self):
+        router = RouterReplica()
+        self.assertEqual(router.db_for_read(Cita), "default")
+        self.assertEqual(router.db_for_write(Cita), "default")
+        self.assertIs(router.allow_migrate(ALIAS, "agenda"), False)
+        self.assertIsNone(router.allow_migrate("default", "agenda"))
+        token = _en_replica.set(True)
+        try:
+            self.assertEqual(router.db_for_read(Cita), ALIAS)
+            for modelo in (User, Perfil, Recepcionista, Cliente):
+                self.assertEqual(router.db_for_read(modelo), "default", modelo)
+        finally:
+            _en_replica.reset(token)
+
+
+class ReplicaArchivoTests(ReplicaTests):
+    """
+    La replica en un archivo aparte, copiado al empezar cada prueba: lo que
+    se escribe despues solo esta en la principal.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.carpeta = tempfile.TemporaryDirectory()
+        conexion = connections[ALIAS]
+        conexion.close()
+        self.nombre_original = conexion.settings_dict["NAME"]
+        conexion.settings_dict["NAME"] = str(Path(self.carpeta.name) / "replica.sqlite3")
+        refrescar_replica()
+
+    def tearDown(self):
+        conexion = connections[ALIAS]
+        conexion.close()
+        conexion.settings_dict["NAME"] = self.nombre_original
+        self.carpeta.cleanup()
+        super().tearDown()
+
+    def test_historial_lee_la_copia(self):
+        self.cita.delete()
+        usados, datos = self._lecturas_de_citas(self.historial)
+        self.assertEqual(usados, {ALIAS})
+        self.assertEqual([c["id"] for c in datos["citas"]], [self.cita_id])
+        refrescar_replica()
+        _usados, datos = self._lecturas_de_citas(self.historial)
+        self.assertEqual(datos["citas"], [])
+
+    async def test_historial_por_asgi_lee_la_copia(self):
+        # Bajo ASGI cada trozo del historial se consulta desde sync_to_async,
+        # fuera de la vista: la marca de replica tiene que llegar hasta ahi.
+        await sync_to_async(self.cita.delete)()
+        sesion = self.client.cookies["sessionid"].value
+        comunicador = ApplicationCommunicator(
+            application,
+            {
+                "type": "http",
+                "method": "GET",
+                "path": self.historial,
+                "query_string": b"",
+                "headers": [
+                    (b"host", b"testserver"),
+                    (b"cookie", f"sessionid={sesion}".encode()),
+                ],
+            },
+        )
+        await comunicador.send_input({"type": "http.request", "body": b""})
+        self.assertEqual((await comunicador.receive_output(5))["status"], 200)
+        contenido = b""
+        while True:
+            mensaje = await comunicador.receive_output(5)
+            contenido += mensaje.get("body", b"")
+            if not mensaje.get("more_body"):
+                break
+        self.assertEqual([c["id"] for c in json.loads(contenido)["citas"]], [self.cita_id])
+
+    def test_rol_se_lee_de_la_principal(self):
+        # La copia aun tiene a la usuaria como recepcionista.
+        perfil = Perfil.objects.get(user__username="recep")
+        perfil.rol = Perfil.Roles.VETERINARIO
+        perfil.save()
+        response = self.client.get(self.historial)
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn(CLAVE_CONTEXTO, self.client.session)
+
+
+class RefrescoReplicaTests(unittest.TestCase):
+    """Copia entre dos archivos nuevos, fuera de la base de pruebas."""
+
+    def test_refrescar_copia_la_base(self):
+        with tempfile.TemporaryDirectory() as carpeta:
+            origen = _alias_temporal("prueba_origen", Path(carpeta) / "origen.sqlite3")
+            destino = _alias_temporal("prueba_destino", Path(carpeta) / "destino.sqlite3")
+            try:
+                with connections[origen].cursor() as cursor:
+                    cursor.execute("CREATE TABLE t (n INTEGER)")
+                    cursor.execute("INSERT INTO t VALUES (1)")
+                refrescar_replica(origen, destino)
+                # La conexion abierta a la replica ve la copia siguiente.
+                with connections[destino].cursor() as cursor:
+                    cursor.execute("SELECT COUNT(*) FROM t")
+                    self.assertEqual(cursor.fetchone(), (1,))
+                with connections[origen].cursor() as cursor:
+                    cursor.execute("INSERT INTO t VALUES (2)")
+                refrescar_replica(origen, destino)
+                with connections[destino].cursor() as cursor:
+                    cursor.execute("SELECT COUNT(*) FROM t")
+                    self.assertEqual(cursor.fetchone(), (2,))
+            finally:
+                for alias in (origen, destino):
+                    connections[alias].close()
+                    del connections.settings[alias]
+
+
+@unittest.skipUnless(os.environ.get("POCHITA_BENCH"), "benchmark: definir POCHITA_BENCH=1")
+class ConcurrenciaSqliteBenchmark(unittest.TestCase):
+    """
+    LECTORES hilos leyendo la agenda de un dia y ESCRITORES hilos
+    reservando (leer y luego insertar en una transaccion) durante DURACION
+    segundos, sobre un archivo nuevo con cada perfil. Entre operaciones se
+    hace lo mismo que Django entre peticiones: cerrar la conexion si ya no
+    sirve o si CONN_MAX_AGE vencio.
+    """
+
+    LECTORES = 8
+    ESCRITORES = 2
+    DURACION = 5
+    CITAS = 20_000
+
+    def _preparar(self, perfil, ruta, alias=None):
+        alias = alias or f"bench_{perfil}"
+        config = aplicar_perfil({"ENGINE": "django.db.backends.sqlite3", "NAME": ruta}, perfil)
+        connections.settings[alias] = connections.configure_settings({"default": config})["default"]
+        with connections[alias].cursor() as cursor:
+            cursor.execute(
+                "CREATE TABLE cita (id INTEGER PRIMARY KEY, vet INTEGER, fecha TEXT, hora INTEGER)"
+            )
+            cursor.execute("CREATE INDEX cita_fecha ON cita (fecha, hora)")
+            cursor.executemany(
+                "INSERT INTO cita (vet, fecha, hora) VALUES (%s, %s, %s)",
+                [
+                    (n % 4, f"2026-{1 + n // 2000 % 12:02d}-{1 + n % 28:02d}", n % 600)
+                    for n in range(self.CITAS)
+                ],
+            )
+        connections[alias].close()
+        return alias
+
+    def _leer(self, alias, n):
+        with connections[alias].cursor() as cursor:
+            cursor.execute(
+                "SELECT vet, hora FROM cita WHERE fecha = %s ORDER BY hora",
+                [f"2026-{1 + n % 12:02d}-{1 + n % 28:02d}"],
+            )
+            cursor.fetchall()
+
+    def _escribir(self, alias, n):
+        fecha = f"2027-01-{1 + n % 28:02d}"
+        with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM cita WHERE fecha = %s AND hora = %s", [fecha, n])
+            if not cursor.fetchone()[0]:
+                cursor.execute(
+                    "INSERT INTO cita (vet, fecha, hora) VALUES (%s, %s, %s)", [n % 4, fecha, n]
+                )
+
+    def _carga(self, alias):
+        fin = reloj.perf_counter() + self.DURACION
+        conteo = {"lecturas": 0, "escrituras": 0, "bloqueos": 0}
+        lock = threading.Lock()
+
+        def trabajar(operacion, clave):
+            hechas = bloqueos = n = 0
+            try:
+                while reloj.perf_counter() < fin:
+                    n += 1
+                    try:
+                        operacion(alias, n)
+                        hechas += 1
+                    except OperationalError:
+                        # "database is locked": la peticion fallaria.
+                        bloqueos += 1
+                    connections[alias].close_if_unusable_or_obsolete()
+            finally:
+                connections[alias].close()
+                with lock:
+                    conteo[clave] += hechas
+                    conteo["bloqueos"] += bloqueos
+
+        hilos = [
+            threading.Thread(target=trabajar, args=(self._leer, "lecturas"))
+            for _ in range(self.LECTORES)
+        ] + [
+            threading.Thread(target=trabajar, args=(self._escribir, "escrituras"))
+            for _ in range(self.ESCRITORES)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return conteo
+
+    def test_perfiles(self):
+        print(
+            f"\n{self.LECTORES} lectores y {self.ESCRITORES} escritores, "
+            f"{self.DURACION} s, {self.CITAS} citas:"
+        )
+        with tempfile.TemporaryDirectory() as carpeta:
+            for perfil in ("basico", "produccion"):
+                alias = self._preparar(perfil, Path(carpeta) / f"{perfil}.sqlite3")
+                try:
+                    conteo = self._carga(alias)
+                finally:
+                    del connections.settings[alias]
+                print(
+                    f"  {perfil:10} {conteo['lecturas'] / self.DURACION:8.0f} lecturas/s "
+                    f"{conteo['escrituras'] / self.DURACION:6.0f} escrituras/s "
+                    f"{conteo['bloqueos']:5} bloqueos"
+                )
+
+
+@unittest.skipUnless(os.environ.get("POCHITA_BENCH"), "benchmark: definir POCHITA_BENCH=1")
+class HistorialEnReplicaBenchmark(ConcurrenciaSqliteBenchmark):
+    """
+    Latencia de una reserva (leer y luego insertar en una transaccion)
+    mientras HISTORIALES hilos leen el historial completo sin parar: sin
+    historial, con el historial en la base principal y con el historial en
+    una replica que se refresca cada REFRESCO segundos.
+    """
+
+    HISTORIALES = 2
+    REFRESCO = 1
+    CITAS = 100_000
+
+    def setUp(self):
+        self._reservas = itertools.count()
+
+    def _historial(self, alias):
+        with connections[alias].cursor() as cursor:
+            cursor.execute("SELECT * FROM cita ORDER BY fecha DESC, hora DESC")
+            cursor.fetchall()
+
+    def _medir(self, principal, lectura):
+        fin = reloj.perf_counter() + self.DURACION
+        latencias = []
+        bloqueos = []
+
+        def en_bucle(operacion, alias, cada=0):
+            try:
+                while reloj.perf_counter() < fin:
+                    try:
+                        operacion(alias)
+                    except OperationalError:
+                        bloqueos.append(1)
+                    reloj.sleep(cada)
+            finally:
+                connections[alias].close()
+
+        def reservar():
+            try:
+                while reloj.perf_counter() < fin:
+                    inicio = reloj.perf_counter()
+                    try:
+                        # Cada reserva es un horario nuevo: siempre inserta.
+                        self._escribir(principal, next(self._reservas))
+                    except OperationalError:
+                        bloqueos.append(1)
+                    latencias.append(reloj.perf_counter() - inicio)
+                    reloj.sleep(0.005)
+            finally:
+                connections[principal].close()
+
+        hilos = [threading.Thread(target=reservar)]
+        if lectura:
+            hilos += [
+                threading.Thread(target=en_bucle, args=(self._historial, lectura))
+                for _ in range(self.HISTORIALES)
+            ]
+            if lectura != principal:
+                hilos.append(
+                    threading.Thread(
+                        target=en_bucle,
+                        args=(lambda _alias: refrescar_replica(principal, lectura), lectura, self.REFRESCO),
+                    )
+                )
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        latencias.sort()
+        return latencias[len(latencias) // 2], latencias[int(len(latencias) * 0.95)], len(bloqueos)
+
+    def test_perfiles(self):
+        print(
+            f"\nLatencia de reserva con {self.HISTORIALES} lectores de historial, "
+            f"{self.DURACION} s, {self.CITAS} citas:"
+        )
+        with tempfile.TemporaryDirectory() as carpeta:
+            for perfil in ("basico", "produccion"):
+                principal = self._preparar(perfil, Path(carpeta) / f"{perfil}.sqlite3")
+                replica = self._preparar(
+                    perfil, Path(carpeta) / f"{perfil}_replica.sqlite3", f"bench_{perfil}_replica"
+                )
+                refrescar_replica(principal, replica)
+                try:
+                    for nombre, lectura in (
+                        ("sin historial", None),
+                        ("en principal", principal),
+                        ("en replica", replica),
+                    ):
+                        p50, p95, bloqueos = self._medir(principal, lectura)
+                        print(
+                            f"  {perfil:10} {nombre:14} p50 {p50 * 1000:6.1f} ms "
+                            f"p95 {p95 * 1000:7.1f} ms {bloqueos:4} bloqueos"
+                        )
+                finally:
+                    del connections.settings[principal]
+                    del connections.settings[replica]